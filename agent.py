@@ -1,18 +1,46 @@
-from typing import Literal, Optional, Any
+import uuid
+from typing import Literal, Optional, Any, get_args, get_origin, get_type_hints
 from langchain_core.tools import tool
 from langgraph.types import Command
 from langgraph.graph.message import add_messages
 from typing_extensions import TypedDict, Annotated
 from langchain_core.prompts.chat import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langgraph.graph import START, StateGraph, END
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, RemoveMessage, ToolMessage
 from langgraph.prebuilt import ToolNode, tools_condition
-from prompt_library.prompts import system_prompt, query_classifier_prompt
+from prompt_library.prompts import (
+    system_prompt, query_classifier_prompt, fused_router_prompt, information_node_prompt, booking_node_prompt,
+    direct_reply_templates
+)
 from utils.llms import LLMModel
 from langgraph.checkpoint.memory import MemorySaver
+from db.checkpoints import CHECKPOINT_DB_PATH, SqliteCheckpointSaver
+from utils.prefilter import DirectCall, QueryPrefilter, predict_worker
+from utils.speculation import SpeculativeExecutor, speculative_config
+from utils.history import HistoryManager
+from settings import settings
 from toolkit.tools import *
 
-memory = MemorySaver()
+def create_checkpointer():
+    if settings.CHECKPOINTER == "memory":
+        return MemorySaver()
+    if settings.CHECKPOINTER == "sqlite":
+        return SqliteCheckpointSaver(
+            settings.CHECKPOINT_DB_PATH or CHECKPOINT_DB_PATH,
+            ttl_seconds=settings.CHECKPOINT_TTL_SECONDS,
+            cache_size=settings.CHECKPOINT_CACHE_SIZE,
+            max_history=settings.CHECKPOINT_MAX_HISTORY,
+        )
+    raise ValueError(f"Unknown CHECKPOINTER: {settings.CHECKPOINTER}")
+
+
+memory = create_checkpointer()
+
+
+def _is_tool_error(result) -> bool:
+    """Tools report failures as text; those are left to the agent instead of being templated."""
+    return not isinstance(result, str) or result.startswith(("Error:", "Unexpected error:"))
 
 class Router(BaseModel):
     next: Literal["information_node", "booking_node", "FINISH"] = Field(...,
@@ -39,10 +67,27 @@ class query_classifierRoute(BaseModel):
         description="Only filled if next_node is 'end'. Contains the assistant's reply to the user"
     )
 
+class FusedRoute(BaseModel):
+    next: Literal["information_node", "booking_node", "end"] = Field(...,
+        description=(
+            "'information_node' when the user requests FAQs or doctor availability, "
+            "'booking_node' when the user wants to book, reschedule, or cancel an appointment, "
+            "'end' for small talk, identity questions, out-of-domain queries or when the query is fully resolved."
+        )
+    )
+    answer: Optional[str] = Field(
+        None,
+        description="Only filled if next is 'end'. Contains the assistant's reply to the user"
+    )
+    reasoning: str = Field(...,
+        description="Short justification for the routing decision."
+    )
+
 class AgentState(TypedDict):
     messages: Annotated[list[Any], add_messages]
     query: str
     current_reasoning: str
+    summary: str
 
 class DoctorAppointmentAgent:
     def __init__(self):
@@ -50,25 +95,144 @@ class DoctorAppointmentAgent:
         self.gemini_model=llm_model.get_gemini_model()
         self.gemini_model_latest=llm_model.get_gemini_model_latest()
         self.groq_model=llm_model.get_groq_model()
+        self.chat_model=llm_model.get_routed_model()
 
-        self.info_tools = [check_availability_by_doctor, check_availability_by_specialization, get_available_doctors, get_available_specializations, get_available_doctors_on_date]
-        self.booking_tools = [book_appointment, cancel_appointment, reschedule_appointment]
+        self.info_tools = [check_availability_by_doctor, check_availability_by_specialization, get_available_doctors, get_available_specializations, get_available_doctors_on_date, find_next_available_slot, list_availability_in_range]
+        self.booking_tools = [book_appointment, cancel_appointment, reschedule_appointment, book_appointments_batch, cancel_appointments_batch]
+        self.tools_by_name = {t.name: t for t in self.info_tools + self.booking_tools}
+        self.prefilter = QueryPrefilter(threshold=settings.PREFILTER_THRESHOLD)
+        self.routing_mode = settings.ROUTING_MODE
+        self.speculation = SpeculativeExecutor()
+        self.history = HistoryManager(
+            self.chat_model,
+            budget_tokens=settings.HISTORY_TOKEN_BUDGET,
+            recent_tokens=settings.HISTORY_RECENT_TOKENS,
+            summary_tokens=settings.HISTORY_SUMMARY_TOKENS,
+        )
 
-    def query_classifier(self,state: AgentState) -> Command[Literal['supervisor','__end__']]:
-        user_query = state['query']
+    def manage_history(self, state: AgentState, config: RunnableConfig):
+        removed, summary = self.history.compact(state.get("messages", []), state.get("summary", ""), config)
+        if not removed:
+            return {}
+        return {"messages": [RemoveMessage(id=m.id) for m in removed], "summary": summary}
+
+    async def amanage_history(self, state: AgentState, config: RunnableConfig):
+        removed, summary = await self.history.acompact(state.get("messages", []), state.get("summary", ""), config)
+        if not removed:
+            return {}
+        return {"messages": [RemoveMessage(id=m.id) for m in removed], "summary": summary}
+
+    def pre_classifier(self, state: AgentState, config: RunnableConfig) -> Command[Literal['query_classifier', 'supervisor', 'router', 'speculative_router', '__end__']]:
+        call = self.prefilter.direct(state['query']) if settings.DIRECT_TOOLS_ENABLED else None
+        if call is not None:
+            try:
+                result = self.tools_by_name[call.tool].invoke(call.args, config)
+            except ValueError:  # arguments the tool's models reject, e.g. an impossible date
+                result = None
+            if not _is_tool_error(result):
+                return self._direct_command(state['query'], call, result)
+        return self._prefilter_command(state['query'])
 
+    async def apre_classifier(self, state: AgentState, config: RunnableConfig):
+        # Rule matching is cheap enough to run inline; only a direct tool call awaits.
+        call = self.prefilter.direct(state['query']) if settings.DIRECT_TOOLS_ENABLED else None
+        if call is not None:
+            try:
+                result = await self.tools_by_name[call.tool].ainvoke(call.args, config)
+            except ValueError:
+                result = None
+            if not _is_tool_error(result):
+                return self._direct_command(state['query'], call, result)
+        return self._prefilter_command(state['query'])
+
+    def _direct_command(self, user_query: str, call: DirectCall, result: str) -> Command:
+        """Record the tool call as if a worker had made it, and answer from a template without the LLM."""
+        self.prefilter.record_direct(call)
+        tool_call_id = f"direct_{uuid.uuid4().hex}"
+        return Command(
+            update={
+                "messages": [
+                    HumanMessage(content=user_query, name="pre_classifier_node"),
+                    AIMessage(content="", name="pre_classifier_node",
+                              tool_calls=[{"name": call.tool, "args": call.args, "id": tool_call_id}]),
+                    ToolMessage(content=result, name=call.tool, tool_call_id=tool_call_id),
+                    AIMessage(content=direct_reply_templates[call.intent].format(result=result), name="pre_classifier_node"),
+                ],
+                "current_reasoning": f"Called {call.tool} directly for a fully specified {call.intent} request",
+            },
+            goto="__end__",
+        )
+
+    def _prefilter_command(self, user_query: str) -> Command:
+        result = self.prefilter.classify(user_query)
+
+        if result.route == "end":
+            return Command(
+                update={
+                    "messages": [
+                        HumanMessage(content=user_query, name="pre_classifier_node"),
+                        AIMessage(content=result.answer, name="pre_classifier_node")
+                    ],
+                    "current_reasoning": f"Answered locally as {result.intent} (confidence {result.confidence:.2f})",
+                },
+                goto="__end__",
+            )
+        if result.route == "supervisor":
+            return Command(
+                update={
+                    "messages": [
+                        HumanMessage(content=user_query, name="pre_classifier_node")
+                    ],
+                    "current_reasoning": f"Routed to {self._domain_entry} locally (confidence {result.confidence:.2f}): {user_query}",
+                },
+                goto=self._domain_entry,
+            )
+        return Command(goto=self._fallback_entry)
+
+    def _classifier_chain(self):
         prompt = ChatPromptTemplate.from_messages(
             [
                 ("system", query_classifier_prompt),
                 ("human", "User query: {user_query}")
             ]
         )
+        return prompt | self.chat_model.with_structured_output(query_classifierRoute)
+
+    def _classify(self, user_query: str, config: Optional[RunnableConfig] = None) -> query_classifierRoute:
+        return self._classifier_chain().invoke({"user_query": user_query}, config)
+
+    async def _aclassify(self, user_query: str, config: Optional[RunnableConfig] = None) -> query_classifierRoute:
+        return await self._classifier_chain().ainvoke({"user_query": user_query}, config)
+
+    def _supervisor_messages(self, messages: list, summary: Optional[str]) -> list:
+        return [{"role": "system", "content": self.history.system_text(system_prompt, summary)}] + messages
+
+    def _supervise(self, messages: list, summary: Optional[str] = None, config: Optional[RunnableConfig] = None) -> Router:
+        return self.chat_model.with_structured_output(Router).invoke(self._supervisor_messages(messages, summary), config)
+
+    async def _asupervise(self, messages: list, summary: Optional[str] = None,
+                          config: Optional[RunnableConfig] = None) -> Router:
+        return await self.chat_model.with_structured_output(Router).ainvoke(
+            self._supervisor_messages(messages, summary), config
+        )
 
-        chain= prompt | self.gemini_model_latest.with_structured_output(query_classifierRoute)
-        result:query_classifierRoute= chain.invoke({
-            "user_query": user_query
-        })
+    def _with_query(self, state: AgentState, name: str) -> tuple[list, list]:
+        """State messages plus the current query, and the messages this node must add to the state."""
+        user_query = state['query']
+        messages = state["messages"]
+        # The pre-classifier already recorded the query when it routed here as a confident domain query.
+        last_msg = messages[-1] if messages else None
+        if not (isinstance(last_msg, HumanMessage) and last_msg.name == "pre_classifier_node" and last_msg.content == user_query):
+            messages = messages + [HumanMessage(content=user_query, name=name)]
+        return messages, messages[len(state["messages"]):]
+
+    def query_classifier(self,state: AgentState) -> Command[Literal['supervisor','__end__']]:
+        return self._classifier_command(state['query'], self._classify(state['query']))
 
+    async def aquery_classifier(self, state: AgentState):
+        return self._classifier_command(state['query'], await self._aclassify(state['query']))
+
+    def _classifier_command(self, user_query: str, result: query_classifierRoute) -> Command:
         if result.next_node == "end":
             return Command(
                 update={
@@ -93,18 +257,22 @@ class DoctorAppointmentAgent:
     
 
     def supervisor_node(self, state:AgentState) -> Command[Literal['information_node', 'booking_node', '__end__']]:
-        messages = [
-            {"role": "system", "content": system_prompt},
-        ] + state["messages"]
-        
-        last_msg = state['messages'][-1] if state["messages"] else None
-        query = getattr(last_msg, "content", "nothing") if last_msg else ""
-        
-        if not query:
+        if not self._has_query(state):
             return Command(goto='__end__', update={'current_reasoning': "No user query found."})
-        
-        response = self.gemini_model_latest.with_structured_output(Router).invoke(messages)
-        
+        return self._supervisor_command(self._supervise(state["messages"], state.get("summary")))
+
+    async def asupervisor_node(self, state: AgentState):
+        if not self._has_query(state):
+            return Command(goto='__end__', update={'current_reasoning': "No user query found."})
+        return self._supervisor_command(await self._asupervise(state["messages"], state.get("summary")))
+
+    @staticmethod
+    def _has_query(state: AgentState) -> bool:
+        last_msg = state['messages'][-1] if state["messages"] else None
+        return bool(getattr(last_msg, "content", "nothing") if last_msg else "")
+
+    @staticmethod
+    def _supervisor_command(response: Router) -> Command:
         goto = response.next
             
         if goto == "FINISH":
@@ -115,34 +283,201 @@ class DoctorAppointmentAgent:
             'current_reasoning': response.reasoning
             })
 
-    def information_node(self,state:AgentState):
-        system_text = "You are specialized agent to provide information related to availability of doctors or any FAQs related to hospital based on the query. You have access to the tool.\n Make sure to ask user politely if you need any further information to execute the tool.\n For your information."
+    def fused_router(self, state: AgentState) -> Command[Literal['information_node', 'booking_node', '__end__']]:
+        """Classify the query and pick the worker in one structured call (ROUTING_MODE="fused")."""
+        messages, new_messages = self._with_query(state, "router_node")
+        response: FusedRoute = self.chat_model.with_structured_output(FusedRoute).invoke(
+            self._fused_messages(state, messages)
+        )
+        return self._fused_command(response, new_messages)
+
+    async def afused_router(self, state: AgentState):
+        messages, new_messages = self._with_query(state, "router_node")
+        response: FusedRoute = await self.chat_model.with_structured_output(FusedRoute).ainvoke(
+            self._fused_messages(state, messages)
+        )
+        return self._fused_command(response, new_messages)
 
-        model_with_tools = self.gemini_model_latest.bind_tools(self.info_tools)
-        messages = [SystemMessage(content=system_text)] + state["messages"]
-        response = model_with_tools.invoke(messages)
+    def _fused_messages(self, state: AgentState, messages: list) -> list:
+        return [SystemMessage(content=self.history.system_text(fused_router_prompt, state.get("summary")))] + messages
 
+    @staticmethod
+    def _fused_command(response: FusedRoute, new_messages: list) -> Command:
+        if response.next == "end":
+            if response.answer:
+                new_messages = new_messages + [AIMessage(content=response.answer, name="router_node")]
+            return Command(
+                update={"messages": new_messages, "current_reasoning": response.reasoning},
+                goto="__end__",
+            )
+        return Command(
+            update={"messages": new_messages, "current_reasoning": response.reasoning},
+            goto=response.next,
+        )
+
+    def speculative_router(self, state: AgentState, config: RunnableConfig) -> Command[Literal['information_node', 'booking_node', 'tools', '__end__']]:
+        """
+        Run the classifier and supervisor calls concurrently (ROUTING_MODE="speculative"),
+        optionally together with the first call of the worker the query most likely needs.
+        Branches made moot by the routing decision are discarded.
+        """
+        user_query = state['query']
+        messages, new_messages = self._with_query(state, "query_classifier_node")
+        prefiltered = not new_messages
+        spec = self.speculation
+        call_config = speculative_config(config)
+
+        classify = None if prefiltered else spec.submit(self._classify, user_query, call_config)
+        supervise = spec.submit(self._supervise, messages, state.get("summary"), call_config)
+        predicted = predict_worker(user_query) if settings.SPECULATIVE_WORKER else None
+        worker = spec.submit(getattr(self, predicted), {"messages": messages, "summary": state.get("summary")}, call_config) if predicted else None
+
+        try:
+            if classify is not None:
+                route: query_classifierRoute = spec.accept(classify)
+                if route.next_node == "end":
+                    spec.discard(supervise)
+                    spec.discard(worker)
+                    return Command(
+                        update={
+                            "messages": new_messages + [AIMessage(content=route.answer, name="query_classifier_node")],
+                            "current_reasoning": f"Routed to end because: {route.answer}",
+                        },
+                        goto="__end__",
+                    )
+
+            decision: Router = spec.accept(supervise)
+            if decision.next == "FINISH":
+                spec.discard(worker)
+                return Command(update={"messages": new_messages, "current_reasoning": decision.reasoning}, goto="__end__")
+
+            if worker is not None:
+                spec.record_worker(decision.next == predicted)
+                if decision.next == predicted:
+                    response = spec.accept(worker)["messages"][-1]
+                    return Command(
+                        update={"messages": new_messages + [response], "current_reasoning": decision.reasoning},
+                        goto="tools" if getattr(response, "tool_calls", None) else "__end__",
+                    )
+                spec.discard(worker)
+            return Command(update={"messages": new_messages, "current_reasoning": decision.reasoning}, goto=decision.next)
+        except BaseException:
+            for future in (classify, supervise, worker):
+                spec.discard(future)
+            raise
+
+    async def aspeculative_router(self, state: AgentState, config: RunnableConfig):
+        """Event-loop version of speculative_router; discarded branches are cancelled mid-request."""
+        user_query = state['query']
+        messages, new_messages = self._with_query(state, "query_classifier_node")
+        prefiltered = not new_messages
+        spec = self.speculation
+        call_config = speculative_config(config)
+
+        classify = None if prefiltered else spec.spawn(self._aclassify(user_query, call_config))
+        supervise = spec.spawn(self._asupervise(messages, state.get("summary"), call_config))
+        predicted = predict_worker(user_query) if settings.SPECULATIVE_WORKER else None
+        worker = spec.spawn(getattr(self, f"a{predicted}")({"messages": messages, "summary": state.get("summary")}, call_config)) if predicted else None
+
+        try:
+            if classify is not None:
+                route: query_classifierRoute = await spec.aaccept(classify)
+                if route.next_node == "end":
+                    spec.discard(supervise)
+                    spec.discard(worker)
+                    return Command(
+                        update={
+                            "messages": new_messages + [AIMessage(content=route.answer, name="query_classifier_node")],
+                            "current_reasoning": f"Routed to end because: {route.answer}",
+                        },
+                        goto="__end__",
+                    )
+
+            decision: Router = await spec.aaccept(supervise)
+            if decision.next == "FINISH":
+                spec.discard(worker)
+                return Command(update={"messages": new_messages, "current_reasoning": decision.reasoning}, goto="__end__")
+
+            if worker is not None:
+                spec.record_worker(decision.next == predicted)
+                if decision.next == predicted:
+                    response = (await spec.aaccept(worker))["messages"][-1]
+                    return Command(
+                        update={"messages": new_messages + [response], "current_reasoning": decision.reasoning},
+                        goto="tools" if getattr(response, "tool_calls", None) else "__end__",
+                    )
+                spec.discard(worker)
+            return Command(update={"messages": new_messages, "current_reasoning": decision.reasoning}, goto=decision.next)
+        except BaseException:
+            for task in (classify, supervise, worker):
+                spec.discard(task)
+            raise
+
+    def _worker_messages(self, state: AgentState, system_text: str) -> list:
+        return [SystemMessage(content=self.history.system_text(system_text, state.get("summary")))] + state["messages"]
+
+    def information_node(self,state:AgentState, config: Optional[RunnableConfig] = None):
+        model_with_tools = self.chat_model.bind_tools(self.info_tools)
+        response = model_with_tools.invoke(self._worker_messages(state, information_node_prompt), config)
+        return {"messages": [response]}
+
+    async def ainformation_node(self, state: AgentState, config: Optional[RunnableConfig] = None):
+        model_with_tools = self.chat_model.bind_tools(self.info_tools)
+        response = await model_with_tools.ainvoke(self._worker_messages(state, information_node_prompt), config)
         return {"messages": [response]}
     
-    def booking_node(self,state:AgentState):
-        
-        system_text = "You are specialized agent to set, cancel or reschedule appointment based on the query. You have access to the tool.\n Make sure to ask user politely if you need any further information to execute the tool.\n For your information."
-        
-        model_with_tools = self.gemini_model_latest.bind_tools(self.booking_tools)
-        messages = [SystemMessage(content=system_text)] + state["messages"]
-        response = model_with_tools.invoke(messages)
-        
+    def booking_node(self,state:AgentState, config: Optional[RunnableConfig] = None):
+        model_with_tools = self.chat_model.bind_tools(self.booking_tools)
+        response = model_with_tools.invoke(self._worker_messages(state, booking_node_prompt), config)
+        return {"messages": [response]}
+
+    async def abooking_node(self, state: AgentState, config: Optional[RunnableConfig] = None):
+        model_with_tools = self.chat_model.bind_tools(self.booking_tools)
+        response = await model_with_tools.ainvoke(self._worker_messages(state, booking_node_prompt), config)
         return {"messages": [response]}
     
-    def workflow(self):
+    def _add_node(self, name: str, func, afunc, destinations: Optional[tuple] = None):
+        """
+        Add a node with both a sync and an async implementation, so the graph
+        runs on threads under invoke()/stream() and on the event loop under
+        ainvoke()/astream(). Command destinations are read from func's return type.
+        """
+        hint = get_type_hints(func).get("return")
+        if destinations is None and get_origin(hint) is Command:
+            destinations = get_args(get_args(hint)[0])
+        self.graph.add_node(name, RunnableLambda(func, afunc, name=name), destinations=destinations)
+
+    def workflow(self, routing_mode: Optional[str] = None):
+        """
+        Build the graph. routing_mode "two_stage" runs query_classifier and then
+        supervisor; "fused" replaces both with a single router call and
+        "speculative" runs both calls (and a guess at the worker) concurrently.
+        Defaults to settings.ROUTING_MODE.
+        """
+        self.routing_mode = routing_mode or self.routing_mode
         self.graph = StateGraph(AgentState)
-        self.graph.add_node("query_classifier", self.query_classifier)
-        self.graph.add_node("supervisor", self.supervisor_node)
-        self.graph.add_node("information_node", self.information_node)
-        self.graph.add_node("booking_node", self.booking_node)
+        if self.routing_mode == "speculative":
+            self._domain_entry = self._fallback_entry = "speculative_router"
+            self._add_node("speculative_router", self.speculative_router, self.aspeculative_router)
+        elif self.routing_mode == "fused":
+            self._domain_entry = self._fallback_entry = "router"
+            self._add_node("router", self.fused_router, self.afused_router)
+        elif self.routing_mode == "two_stage":
+            self._domain_entry, self._fallback_entry = "supervisor", "query_classifier"
+            self._add_node("query_classifier", self.query_classifier, self.aquery_classifier)
+            self._add_node("supervisor", self.supervisor_node, self.asupervisor_node)
+        else:
+            raise ValueError(f"Unknown ROUTING_MODE: {self.routing_mode}")
+        self._add_node("pre_classifier", self.pre_classifier, self.apre_classifier,
+                            destinations=tuple(dict.fromkeys((self._domain_entry, self._fallback_entry, END))))
+        self._add_node("information_node", self.information_node, self.ainformation_node)
+        self._add_node("booking_node", self.booking_node, self.abooking_node)
+
+        self._add_node("history", self.manage_history, self.amanage_history)
 
         self.graph.add_node("tools", ToolNode(self.info_tools + self.booking_tools))
-        self.graph.add_edge(START, "query_classifier")
+        self.graph.add_edge(START, "history")
+        self.graph.add_edge("history", "pre_classifier" if settings.PREFILTER_ENABLED else self._fallback_entry)
         self.graph.add_conditional_edges(
             "information_node",
             tools_condition, 
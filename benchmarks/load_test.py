@@ -0,0 +1,253 @@
+"""
+Offline end-to-end load test for /execute.
+
+Starts the FastAPI app under uvicorn on localhost with LLMModel replaced by
+the scripted fake in benchmarks/scripted_llm.py and throwaway databases,
+then runs --clients concurrent patients. Each patient browses, books,
+reschedules and cancels its own slot, so runs are deterministic and never
+contend for the same slot. Reports throughput, time to first token and
+latency percentiles, and writes them with the commit and parameters to
+--output so runs on different commits can be compared with --compare.
+
+Every scripted message names all of its tool arguments, so with the direct
+tool path on none of them would reach the model. It is therefore off unless
+--direct is given; compare a --direct run against a default one to measure
+the direct path itself.
+
+    python -m benchmarks.load_test --clients 50 --output before.json
+    python -m benchmarks.load_test --clients 50 --compare before.json
+    python -m benchmarks.load_test --clients 50 --direct --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: list[float], p: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(round(p / 100 * (len(values) - 1))), len(values) - 1)]
+
+
+def summarize(values: list[float]) -> dict:
+    return {f"p{p}": round(percentile(values, p), 4) if values else None for p in PERCENTILES}
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def prepare_environment(workdir: str, args):
+    """Point the app at throwaway databases; must run before anything imports settings."""
+    os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["CHECKPOINT_DB_PATH"] = os.path.join(workdir, "checkpoints.db")
+    os.environ["ROUTING_MODE"] = args.routing_mode
+    os.environ["DIRECT_TOOLS_ENABLED"] = "true" if args.direct else "false"
+    # Scripted patients send their messages back to back, which the per-patient rate limit is meant to stop.
+    os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+    for name, value in {
+        "GOOGLE_API_KEY": "offline", "GROQ_API_KEY": "offline", "SECRET_KEY": "load-test-secret",
+        "ALGORITHM": "HS256", "COOKIE_NAME": "access_token",
+        "SMTP_SERVER": "localhost", "SMTP_PORT": "25", "SMTP_USER": "offline", "SMTP_PASSWORD": "offline",
+    }.items():
+        os.environ.setdefault(name, value)
+
+    from benchmarks.scripted_llm import ScriptedLLMModel
+    import utils.llms
+    latency, token_latency, reply_words = args.latency, args.token_latency, args.reply_words
+    utils.llms.LLMModel = lambda *a, **kw: ScriptedLLMModel(latency, token_latency, reply_words)
+
+
+def access_token(patient_id: int) -> str:
+    from utils.security import create_access_token
+    token = create_access_token({"patient_id": patient_id})
+    return token.decode() if isinstance(token, bytes) else token
+
+
+def pick_slots(count: int) -> list[tuple[str, str, str]]:
+    """(doctor, slot, new_slot) per client, two distinct free slots of one doctor each."""
+    from toolkit.slots import CSV_PATH, read_slots_csv
+    by_doctor: dict[str, list[str]] = {}
+    for s in sorted(read_slots_csv(CSV_PATH), key=lambda s: (s.doctor_name, s.ts)):
+        if s.is_available:
+            by_doctor.setdefault(s.doctor_name, []).append(s.date_slot)
+    pairs = []
+    for offset in range(0, max(len(v) for v in by_doctor.values()) - 1, 2):
+        for doctor, slots in sorted(by_doctor.items()):
+            if offset + 1 < len(slots):
+                pairs.append((doctor, slots[offset], slots[offset + 1]))
+    if len(pairs) < count:
+        raise SystemExit(f"Only {len(pairs)} free slot pairs in the availability data for {count} clients")
+    return pairs[:count]
+
+
+class Server:
+    def __init__(self, app):
+        import uvicorn
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="off"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+async def send(client, token: str, message: str, stream: dict) -> dict:
+    started = time.perf_counter()
+    first_token, events, error = None, 0, None
+    sse = stream.get("stream_format") == "sse"
+    async with client.stream("POST", "/execute", json={"message": message, **stream},
+                             headers={"Authorization": f"Bearer {token}"}) as response:
+        if response.status_code != 200:
+            error = f"HTTP {response.status_code}"
+        async for line in response.aiter_lines():
+            if sse:
+                if not line.startswith("data: "):
+                    continue
+                line = line[len("data: "):]
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            events += 1
+            if event.get("type") == "text" and first_token is None:
+                first_token = time.perf_counter() - started
+            elif event.get("type") in ("error", "fatal_error"):
+                error = event.get("message", event["type"])
+    return {"latency": time.perf_counter() - started, "ttft": first_token, "events": events, "error": error}
+
+
+async def run_client(client, token: str, messages: list[tuple[str, str]], results: list, stream: dict):
+    for scenario, message in messages:
+        result = await send(client, token, message, stream)
+        result["scenario"] = scenario
+        results.append(result)
+
+
+async def run_load(base_url: str, clients: list[tuple[str, list]], concurrency: int, stream: dict) -> tuple[list, float]:
+    import httpx
+    results = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(run_client(client, token, messages, results, stream) for token, messages in clients))
+        return results, time.perf_counter() - started
+
+
+def report(results: list, duration: float, args) -> dict:
+    ok = [r for r in results if r["error"] is None]
+    by_scenario = {}
+    for r in ok:
+        by_scenario.setdefault(r["scenario"], []).append(r["latency"])
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {
+            "clients": args.clients, "conversations": args.conversations, "routing_mode": args.routing_mode,
+            "latency": args.latency, "token_latency": args.token_latency, "reply_words": args.reply_words,
+            "stream_format": args.stream_format, "coalesce": args.coalesce, "direct": args.direct,
+        },
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_samples": sorted({r["error"] for r in results if r["error"]})[:5],
+        "duration_seconds": round(duration, 3),
+        "throughput_rps": round(len(ok) / duration, 3) if duration else 0.0,
+        "latency_seconds": summarize([r["latency"] for r in ok]),
+        "ttft_seconds": summarize([r["ttft"] for r in ok if r["ttft"] is not None]),
+        "events_per_request": round(sum(r["events"] for r in ok) / len(ok), 1) if ok else 0.0,
+        "scenario_latency_seconds": {name: summarize(values) for name, values in sorted(by_scenario.items())},
+    }
+
+
+def print_report(result: dict, baseline: dict = None):
+    def line(label: str, value, old=None, lower_is_better=True):
+        text = f"{label:<28}{value}"
+        if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            change = (value - old) / old * 100
+            better = change < 0 if lower_is_better else change > 0
+            text += f"   (was {old}, {change:+.1f}%{' better' if better and abs(change) >= 1 else ''})"
+        print(text)
+
+    base = baseline or {}
+    print(f"commit {result['commit']}" + (f" vs {base['commit']}" if baseline else ""))
+    line("requests", result["requests"])
+    line("errors", result["errors"], base.get("errors"))
+    line("duration (s)", result["duration_seconds"], base.get("duration_seconds"))
+    line("throughput (req/s)", result["throughput_rps"], base.get("throughput_rps"), lower_is_better=False)
+    line("events per request", result["events_per_request"], base.get("events_per_request"))
+    for key, label in (("latency_seconds", "latency"), ("ttft_seconds", "time to first token")):
+        for p, value in result[key].items():
+            line(f"{label} {p} (s)", value, base.get(key, {}).get(p))
+    if result["error_samples"]:
+        print("error samples:", *result["error_samples"], sep="\n  ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of /execute with a scripted fake chat model.")
+    parser.add_argument("--clients", type=int, default=50, help="Concurrent patients")
+    parser.add_argument("--conversations", type=int, default=1, help="Conversations per patient")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake model latency before the first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Fake model delay per streamed token (s)")
+    parser.add_argument("--reply-words", type=int, default=40, help="Words per scripted worker reply")
+    parser.add_argument("--routing-mode", default="two_stage", choices=("two_stage", "fused", "speculative"))
+    parser.add_argument("--stream-format", default="ndjson", choices=("ndjson", "sse"))
+    parser.add_argument("--coalesce", action="store_true", help="Ask /execute to merge text chunks into frames")
+    parser.add_argument("--direct", action="store_true",
+                        help="Leave the direct tool path on, so fully specified messages skip the model")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory(prefix="docubot-bench-") as workdir:
+        prepare_environment(workdir, args)
+        from benchmarks.scripted_llm import conversation
+        import main as app_module
+
+        slots = pick_slots(args.clients)
+        clients = []
+        for i, (doctor, slot, new_slot) in enumerate(slots):
+            clients.append((access_token(9000000 + i), conversation(doctor, slot, new_slot) * args.conversations))
+
+        stream = {"stream_format": args.stream_format, "coalesce": args.coalesce}
+        with Server(app_module.app) as base_url:
+            # One conversation to warm up imports, caches and connections before timing.
+            asyncio.run(run_load(base_url, [(access_token(8999999), clients[0][1][:1])], 1, stream))
+            results, duration = asyncio.run(run_load(base_url, clients, args.clients, stream))
+
+    result = report(results, duration, args)
+    if baseline and baseline.get("params") != result["params"]:
+        print(f"warning: parameters differ from {args.compare}: {baseline.get('params')}", file=sys.stderr)
+    print_report(result, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Deterministic stand-in for LLMModel used by the load test.
+
+Patient messages are generated from SCENARIOS and the scripted model parses
+them back, so every conversation follows the same route and tool calls on
+every run: the classifier and routers send the query to the right worker,
+the worker calls the scenario's tool, and once the tool result is in it
+streams a reply of a fixed number of words.
+"""
+import re
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from utils.fake_llm import FakeChatModel
+from utils.llm_router import RoutedChatModel
+
+DATE = r"\d{2}-\d{2}-\d{4}"
+DATETIME = r"\d{2}-\d{2}-\d{4} \d{2}:\d{2}"
+
+# name -> (message template, pattern, worker, tool, argument builder)
+SCENARIOS = {
+    "browse": (
+        "Which slots does Dr. {doctor} have on {date}?",
+        rf"Which slots does Dr\. (.+?) have on ({DATE})\?",
+        "information_node",
+        "check_availability_by_doctor",
+        lambda m: {"doctor_name": m[1], "desired_date": {"date": m[2]}},
+    ),
+    "book": (
+        "Book Dr. {doctor} on {slot}",
+        rf"Book Dr\. (.+?) on ({DATETIME})",
+        "booking_node",
+        "book_appointment",
+        lambda m: {"doctor_name": m[1], "appointment_datetime": {"datetime": m[2]}},
+    ),
+    "reschedule": (
+        "Reschedule my appointment with Dr. {doctor} from {slot} to {new_slot}",
+        rf"Reschedule my appointment with Dr\. (.+?) from ({DATETIME}) to ({DATETIME})",
+        "booking_node",
+        "reschedule_appointment",
+        lambda m: {
+            "doctor_name": m[1],
+            "old_appointment_datetime": {"datetime": m[2]},
+            "new_appointment_datetime": {"datetime": m[3]},
+        },
+    ),
+    "cancel": (
+        "Cancel my appointment with Dr. {doctor} on {new_slot}",
+        rf"Cancel my appointment with Dr\. (.+?) on ({DATETIME})",
+        "booking_node",
+        "cancel_appointment",
+        lambda m: {"doctor_name": m[1], "appointment_datetime": {"datetime": m[2]}},
+    ),
+}
+
+CONVERSATION = ("browse", "book", "reschedule", "cancel")
+
+
+def conversation(doctor: str, slot: str, new_slot: str) -> list[tuple[str, str]]:
+    """(scenario, message) pairs that book slot, move it to new_slot and cancel it again."""
+    fields = {"doctor": doctor, "date": slot.split(" ")[0], "slot": slot, "new_slot": new_slot}
+    return [(name, SCENARIOS[name][0].format(**fields)) for name in CONVERSATION]
+
+
+def _match(messages: list):
+    query = next((str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+    for name, (_, pattern, worker, tool, args) in SCENARIOS.items():
+        match = re.search(pattern, query)
+        if match:
+            return name, match, worker, tool, args
+    return None
+
+
+class ScriptedResponder:
+    def __init__(self, reply_words: int = 40):
+        self.reply_words = reply_words
+
+    def _reply(self, text: str) -> AIMessage:
+        words = text.split()
+        words = (words * (self.reply_words // max(len(words), 1) + 1))[:self.reply_words] if words else []
+        return AIMessage(content=" ".join(words))
+
+    def __call__(self, messages: list, options: dict) -> AIMessage:
+        scenario = _match(messages)
+        schema = options.get("structured_output")
+        if schema:
+            worker = scenario[2] if scenario else None
+            args = {
+                "query_classifierRoute": {"next_node": "supervisor_node"} if scenario
+                else {"next_node": "end", "answer": "I can only help with doctor appointments."},
+                "Router": {"next": worker or "FINISH", "reasoning": "scripted"},
+                "FusedRoute": {"next": worker or "end", "reasoning": "scripted",
+                               "answer": None if worker else "I can only help with doctor appointments."},
+            }[schema]
+            return AIMessage(content="", tool_calls=[{"name": schema, "args": args, "id": f"call_{schema}"}])
+
+        if isinstance(messages[-1], ToolMessage):
+            return self._reply(f"Here is the result. {messages[-1].content}")
+        bound = {t["function"]["name"] for t in options.get("tools", [])}
+        if scenario and scenario[3] in bound:
+            name, match, _, tool, args = scenario
+            return AIMessage(content="", tool_calls=[{"name": tool, "args": args(match), "id": f"call_{name}_{len(messages)}"}])
+        return self._reply("Could you tell me which doctor and time you would like?")
+
+
+class ScriptedLLMModel:
+    """Drop-in replacement for utils.llms.LLMModel backed by one scripted FakeChatModel."""
+
+    def __init__(self, latency: float = 0.05, token_latency: float = 0.01, reply_words: int = 40):
+        self.model = FakeChatModel(responder=ScriptedResponder(reply_words), latency=latency, token_latency=token_latency)
+
+    def get_gemini_model(self):
+        return self.model
+
+    def get_gemini_model_latest(self):
+        return self.model
+
+    def get_groq_model(self):
+        return self.model
+
+    def get_fake_model(self):
+        return self.model
+
+    def get_routed_model(self):
+        return RoutedChatModel({"scripted": self.model}, hedge_delay=0)
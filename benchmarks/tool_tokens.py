@@ -0,0 +1,121 @@
+"""
+Tokens per availability tool result in the verbose and compact formats.
+
+Calls check_availability_by_doctor and check_availability_by_specialization
+for every doctor/specialization and date in the availability data, and
+list_availability_in_range for every whole day, once per AVAILABILITY_FORMAT,
+and reports the size of the results the way the history manager estimates
+them. --calendar open marks every slot free, the worst case of a quiet week.
+
+    python -m benchmarks.tool_tokens
+    python -m benchmarks.tool_tokens --calendar open --output tokens.json
+"""
+import argparse
+import csv
+import json
+import os
+import tempfile
+
+from benchmarks.load_test import git_commit, summarize
+
+FORMATS = ("verbose", "compact")
+
+
+def prepare_environment(workdir: str, calendar: str):
+    """Throwaway databases and, for --calendar open, a copy of the data with every slot free."""
+    os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["SLOT_BACKEND"] = "sqlite"
+    for name, value in {
+        "GOOGLE_API_KEY": "offline", "GROQ_API_KEY": "offline", "SECRET_KEY": "tool-tokens-secret",
+        "ALGORITHM": "HS256", "COOKIE_NAME": "access_token",
+        "SMTP_SERVER": "localhost", "SMTP_PORT": "25", "SMTP_USER": "offline", "SMTP_PASSWORD": "offline",
+    }.items():
+        os.environ.setdefault(name, value)
+
+    import toolkit.slots
+    if calendar == "open":
+        path = os.path.join(workdir, "doctor_availability.csv")
+        with open(toolkit.slots.CSV_PATH, newline="") as src, open(path, "w", newline="") as dst:
+            reader = csv.DictReader(src)
+            writer = csv.DictWriter(dst, fieldnames=reader.fieldnames)
+            writer.writeheader()
+            for row in reader:
+                writer.writerow({**row, "is_available": "True", "patient_to_attend": ""})
+        toolkit.slots.CSV_PATH = path
+    return toolkit.slots.CSV_PATH
+
+
+def tool_calls(csv_path: str) -> list[tuple[str, dict]]:
+    from toolkit.slots import read_slots_csv
+    slots = read_slots_csv(csv_path)
+    dates = sorted({s.date for s in slots}, key=lambda d: d.split("-")[::-1])
+    doctors = sorted({s.doctor_name for s in slots})
+    specializations = sorted({s.specialization for s in slots})
+    calls = []
+    for date in dates:
+        calls += [("check_availability_by_doctor", {"doctor_name": d, "desired_date": {"date": date}}) for d in doctors]
+        calls += [("check_availability_by_specialization", {"specialization": s, "desired_date": {"date": date}})
+                  for s in specializations]
+        calls.append(("list_availability_in_range", {"start": {"datetime": f"{date} 00:00"}, "end": {"datetime": f"{date} 23:59"}}))
+    return calls
+
+
+def measure(calls: list[tuple[str, dict]]) -> dict:
+    from langchain_core.messages import ToolMessage
+    from langchain_core.messages.utils import count_tokens_approximately
+    import toolkit.tools as tools
+    from settings import settings
+
+    results = {}
+    for fmt in FORMATS:
+        settings.AVAILABILITY_FORMAT = fmt
+        tools.tool_cache.clear()
+        per_tool: dict[str, list[int]] = {}
+        for name, args in calls:
+            output = getattr(tools, name).invoke(args)
+            tokens = count_tokens_approximately([ToolMessage(content=output, tool_call_id="bench")])
+            per_tool.setdefault(name, []).append(tokens)
+        results[fmt] = {
+            name: {"calls": len(tokens), "mean": round(sum(tokens) / len(tokens), 1), "max": max(tokens),
+                   "total": sum(tokens), **summarize(tokens)}
+            for name, tokens in per_tool.items()
+        }
+    return results
+
+
+def print_report(result: dict):
+    print(f"commit {result['commit']}, calendar {result['calendar']}")
+    print(f"{'tool':<38}{'format':<9}{'mean':>8}{'p95':>7}{'max':>7}{'total':>9}")
+    verbose, compact = result["tokens"]["verbose"], result["tokens"]["compact"]
+    for name in verbose:
+        for fmt, stats in (("verbose", verbose[name]), ("compact", compact[name])):
+            print(f"{name:<38}{fmt:<9}{stats['mean']:>8}{stats['p95']:>7}{stats['max']:>7}{stats['total']:>9}")
+        saved = 1 - compact[name]["total"] / verbose[name]["total"] if verbose[name]["total"] else 0.0
+        print(f"{'':<38}{'saved':<9}{saved:>8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens per availability tool result, verbose vs compact format.")
+    parser.add_argument("--calendar", default="data", choices=("data", "open"),
+                        help="'data' uses the availability file as is, 'open' marks every slot free")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="docubot-tokens-") as workdir:
+        csv_path = prepare_environment(workdir, args.calendar)
+        from settings import settings
+        result = {
+            "commit": git_commit(),
+            "calendar": args.calendar,
+            "params": {"max_runs": settings.AVAILABILITY_MAX_RUNS, "max_lines": settings.AVAILABILITY_MAX_LINES},
+            "tokens": measure(tool_calls(csv_path)),
+        }
+
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
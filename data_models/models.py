@@ -1,5 +1,6 @@
 import re
 from pydantic import BaseModel, Field, field_validator, EmailStr
+from core.config import DoctorName
 
 class DateTimeModel(BaseModel):
     datetime: str = Field(..., description="A date-time string in the format DD-MM-YYYY HH:MM",pattern=r'^\d{2}-\d{2}-\d{4} \d{2}:\d{2}$')
@@ -21,6 +22,10 @@ class DateModel(BaseModel):
             raise ValueError('date must be in the format DD-MM-YYYY')
         return v
     
+class AppointmentSlotModel(BaseModel):
+    doctor_name: DoctorName = Field(..., description="Name of the doctor")
+    appointment_datetime: DateTimeModel = Field(..., description="Validated date-time of the appointment")
+
 class IdentificationNumberModel(BaseModel):
     id: int = Field(..., description="An identification number(7 or 8 digit long)")
     @field_validator('id')
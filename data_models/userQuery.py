@@ -1,4 +1,8 @@
+from typing import Literal
 from pydantic import BaseModel, Field
 
 class UserQuery(BaseModel):
-    message: str = Field(..., description="The raw query or message provided by the user")
\ No newline at end of file
+    message: str = Field(..., description="The raw query or message provided by the user")
+    timing: bool = Field(False, description="End the response stream with a latency breakdown of the request")
+    stream_format: Literal["ndjson", "sse"] = Field("ndjson", description="Newline-delimited JSON events, or server-sent events with ids and heartbeats")
+    coalesce: bool = Field(False, description="Merge text chunks into fewer, larger frames instead of one event per model chunk")
@@ -0,0 +1,295 @@
+import argparse
+import os
+from sqlalchemy import select, delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from db.database import Base, engine, SessionLocal
+from db.models import SlotBooking, SlotGeneration
+from db.slots import _bump_generation
+from toolkit.slots import (
+    Slot, CSV_PATH, DoctorSummary, ReloadGeneration, format_date_slot, parse_date_slot, read_slots_csv,
+)
+from toolkit.templates import TEMPLATES_PATH, ScheduleTemplate, load_templates
+
+# Row of the slot_generation table used by this ledger; row 1 belongs to SlotLedger.
+GENERATION_ID = 2
+
+
+def _mtime(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def import_bookings_from_csv(db: Session, templates: dict[str, ScheduleTemplate], csv_path: str = CSV_PATH) -> int:
+    """Copy the booked rows of doctor_availability.csv into the bookings overlay. Returns the number imported."""
+    rows = []
+    for s in read_slots_csv(csv_path):
+        template = templates.get(s.doctor_name.lower())
+        if s.is_available or s.patient_to_attend is None or template is None or not template.has_slot(s.ts):
+            continue
+        rows.append({
+            "doctor_key": s.doctor_name.lower(),
+            "clinic": template.clinic,
+            "slot_ts": s.ts,
+            "patient_to_attend": s.patient_to_attend,
+        })
+    db.bulk_insert_mappings(SlotBooking, rows)
+    _bump_generation(db, GENERATION_ID)
+    db.commit()
+    return len(rows)
+
+
+def _new_booking(template: ScheduleTemplate, ts: int, patient_id: int) -> SlotBooking:
+    return SlotBooking(
+        doctor_key=template.doctor_name.lower(),
+        clinic=template.clinic,
+        slot_ts=ts,
+        patient_to_attend=patient_id,
+    )
+
+
+def _insert_booking(db: Session, template: ScheduleTemplate, ts: int, patient_id: int) -> bool:
+    db.add(_new_booking(template, ts, patient_id))
+    try:
+        db.flush()
+    except IntegrityError:
+        return False
+    return True
+
+
+def _delete_booking(db: Session, doctor_name: str, ts: int, patient_id: int) -> bool:
+    result = db.execute(
+        delete(SlotBooking).where(
+            SlotBooking.doctor_key == doctor_name.lower(),
+            SlotBooking.slot_ts == ts,
+            SlotBooking.patient_to_attend == patient_id,
+        )
+    )
+    return result.rowcount == 1
+
+
+class TemplateLedger:
+    """
+    Slot ledger that generates slots from weekly schedule templates.
+
+    Only bookings are stored, one row each in the slot_bookings table, so
+    storage grows with the number of appointments rather than with the
+    calendar, and extending a doctor's horizon is an edit to the templates
+    file. load_range() expands the templates for the requested window and
+    overlays the bookings that fall inside it. Mutations insert or delete a
+    booking together with a generation bump, and the unique constraint on
+    (doctor, slot time) rules out double-booking across workers. Cancelling a
+    booking the templates no longer cover returns a ReloadGeneration, since
+    it frees no open slot.
+
+    Editing the templates file is picked up by the next version() call,
+    which bumps the generation so cached views are rebuilt.
+    """
+
+    def __init__(self, session_factory=SessionLocal, templates_path: str = TEMPLATES_PATH, csv_path: str = CSV_PATH):
+        self.session_factory = session_factory
+        self.templates_path = templates_path
+        self._templates_mtime = _mtime(templates_path)
+        self._templates = {t.doctor_name.lower(): t for t in load_templates(templates_path)}
+        Base.metadata.create_all(bind=engine, tables=[SlotBooking.__table__, SlotGeneration.__table__])
+        with self.session_factory() as db:
+            seeded = db.execute(select(SlotGeneration.id).where(SlotGeneration.id == GENERATION_ID)).first()
+            if seeded is None and os.path.exists(csv_path):
+                try:
+                    import_bookings_from_csv(db, self._templates, csv_path)
+                except IntegrityError:
+                    # Another worker imported the bookings first.
+                    db.rollback()
+
+    def _in_schedule(self, doctor_name: str, ts: int) -> bool:
+        template = self._templates.get(doctor_name.lower())
+        return template is not None and template.has_slot(ts)
+
+    def _template_for(self, doctor_name: str, date_slot: str):
+        template = self._templates.get(doctor_name.lower())
+        try:
+            ts = parse_date_slot(date_slot)
+        except ValueError:
+            return None, None
+        if template is None or not template.has_slot(ts):
+            return None, None
+        return template, ts
+
+    def version(self) -> int:
+        mtime = _mtime(self.templates_path)
+        with self.session_factory() as db:
+            if mtime != self._templates_mtime:
+                self._templates = {t.doctor_name.lower(): t for t in load_templates(self.templates_path)}
+                self._templates_mtime = mtime
+                generation = _bump_generation(db, GENERATION_ID)
+                db.commit()
+                return generation
+            return db.execute(select(SlotGeneration.value).where(SlotGeneration.id == GENERATION_ID)).scalar() or 0
+
+    def catalog(self) -> list[DoctorSummary]:
+        with self.session_factory() as db:
+            bookings = db.execute(select(SlotBooking.doctor_key, SlotBooking.slot_ts)).all()
+        booked = {}
+        for doctor_key, ts in bookings:
+            template = self._templates.get(doctor_key)
+            # Bookings left outside the template (e.g. after adding leave) don't take an open slot.
+            if template is not None and template.has_slot(ts):
+                booked[doctor_key] = booked.get(doctor_key, 0) + 1
+
+        catalog = []
+        for key, t in self._templates.items():
+            first_ts, last_ts = t.first_slot(), t.last_slot()
+            if first_ts is None:
+                continue
+            catalog.append(DoctorSummary(
+                t.clinic, t.doctor_name, t.specialization, t.count_slots() - booked.get(key, 0), first_ts, last_ts,
+            ))
+        return catalog
+
+    def load_range(self, clinic: str, start_ts: int, end_ts: int) -> list[Slot]:
+        """Slots of one clinic with start_ts <= slot time < end_ts."""
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(SlotBooking.doctor_key, SlotBooking.slot_ts, SlotBooking.patient_to_attend).where(
+                    SlotBooking.clinic == clinic,
+                    SlotBooking.slot_ts >= start_ts,
+                    SlotBooking.slot_ts < end_ts,
+                )
+            ).all()
+        bookings = {(doctor_key, ts): patient_id for doctor_key, ts, patient_id in rows}
+
+        slots, date_slots = [], {}
+        for key, t in self._templates.items():
+            if t.clinic != clinic:
+                continue
+            for ts in t.slots_between(start_ts, end_ts):
+                if ts not in date_slots:
+                    date_slots[ts] = format_date_slot(ts)
+                patient_id = bookings.get((key, ts))
+                slots.append(Slot(
+                    date_slot=date_slots[ts],
+                    specialization=t.specialization,
+                    doctor_name=t.doctor_name,
+                    is_available=patient_id is None,
+                    patient_to_attend=patient_id,
+                    clinic=clinic,
+                    ts=ts,
+                ))
+        return slots
+
+    def book(self, doctor_name: str, date_slot: str, patient_id: int):
+        template, ts = self._template_for(doctor_name, date_slot)
+        if template is None:
+            return None
+        with self.session_factory() as db:
+            if not _insert_booking(db, template, ts, patient_id):
+                db.rollback()
+                return None
+            generation = _bump_generation(db, GENERATION_ID)
+            db.commit()
+            return generation
+
+    def cancel(self, doctor_name: str, date_slot: str, patient_id: int):
+        try:
+            ts = parse_date_slot(date_slot)
+        except ValueError:
+            return None
+        with self.session_factory() as db:
+            if not _delete_booking(db, doctor_name, ts, patient_id):
+                db.rollback()
+                return None
+            generation = _bump_generation(db, GENERATION_ID)
+            db.commit()
+        # A booking outside the templates frees no open slot, so readers must not apply it as one.
+        return generation if self._in_schedule(doctor_name, ts) else ReloadGeneration(generation)
+
+    def book_many(self, slots: list[tuple[str, str]], patient_id: int):
+        """
+        Book every (doctor_name, date_slot) in one transaction, or none of them.
+        Returns (generation, rejected); rejected lists the slots that could not be booked.
+        """
+        requested, rejected = [], []
+        for doctor_name, date_slot in slots:
+            template, ts = self._template_for(doctor_name, date_slot)
+            if template is None or any(t is template and other == ts for _, _, t, other in requested):
+                rejected.append((doctor_name, date_slot))
+            else:
+                requested.append((doctor_name, date_slot, template, ts))
+        if not requested:
+            return None, rejected
+
+        with self.session_factory() as db:
+            if not rejected:
+                db.add_all([_new_booking(template, ts, patient_id) for _, _, template, ts in requested])
+                try:
+                    db.flush()
+                except IntegrityError:
+                    db.rollback()
+                else:
+                    generation = _bump_generation(db, GENERATION_ID)
+                    db.commit()
+                    return generation, []
+            # Report the taken slots along with the invalid ones, as the other ledgers do.
+            taken = set(db.execute(
+                select(SlotBooking.doctor_key, SlotBooking.slot_ts)
+                .where(SlotBooking.slot_ts.in_([ts for _, _, _, ts in requested]))
+            ).all())
+            return None, rejected + [(d, s) for d, s, t, ts in requested if (t.doctor_name.lower(), ts) in taken]
+
+    def cancel_many(self, slots: list[tuple[str, str]], patient_id: int):
+        """Cancel every (doctor_name, date_slot) in one transaction, or none of them. Returns (generation, rejected)."""
+        with self.session_factory() as db:
+            rejected, displaced = [], False
+            for doctor_name, date_slot in slots:
+                try:
+                    ts = parse_date_slot(date_slot)
+                except ValueError:
+                    rejected.append((doctor_name, date_slot))
+                    continue
+                if not _delete_booking(db, doctor_name, ts, patient_id):
+                    rejected.append((doctor_name, date_slot))
+                    continue
+                displaced = displaced or not self._in_schedule(doctor_name, ts)
+            if rejected or not slots:
+                db.rollback()
+                return None, rejected
+            generation = _bump_generation(db, GENERATION_ID)
+            db.commit()
+            return ReloadGeneration(generation) if displaced else generation, []
+
+    def reschedule(self, doctor_name: str, old_date_slot: str, new_date_slot: str, patient_id: int):
+        """Returns (outcome, generation) where outcome is "ok", "no_appointment" or "unavailable"."""
+        try:
+            old_ts = parse_date_slot(old_date_slot)
+        except ValueError:
+            return "no_appointment", None
+        template, new_ts = self._template_for(doctor_name, new_date_slot)
+        with self.session_factory() as db:
+            if not _delete_booking(db, doctor_name, old_ts, patient_id):
+                db.rollback()
+                return "no_appointment", None
+            if template is None or new_ts == old_ts or not _insert_booking(db, template, new_ts, patient_id):
+                db.rollback()
+                return "unavailable", None
+            generation = _bump_generation(db, GENERATION_ID)
+            db.commit()
+        return "ok", generation if self._in_schedule(doctor_name, old_ts) else ReloadGeneration(generation)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import booked slots from the availability CSV into the bookings overlay.")
+    parser.add_argument("--csv", default=CSV_PATH, help="Path to doctor_availability.csv")
+    parser.add_argument("--templates", default=TEMPLATES_PATH, help="Path to schedule_templates.json")
+    parser.add_argument("--replace", action="store_true", help="Delete existing bookings before importing")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine, tables=[SlotBooking.__table__, SlotGeneration.__table__])
+    templates = {t.doctor_name.lower(): t for t in load_templates(args.templates)}
+    with SessionLocal() as db:
+        if args.replace:
+            db.execute(delete(SlotBooking))
+        elif db.execute(select(func.count(SlotBooking.id))).scalar():
+            raise SystemExit("slot_bookings table is not empty; pass --replace to re-import")
+        print(f"Imported {import_bookings_from_csv(db, templates, args.csv)} bookings from {args.csv}")
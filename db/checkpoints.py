@@ -0,0 +1,363 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterator, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from toolkit.slots import BASE_DIR
+
+CHECKPOINT_DB_PATH = os.path.join(BASE_DIR, "data", "checkpoints.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_threads_updated_at ON threads (updated_at);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id TEXT,
+    checkpoint_type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    value_type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class _HotEntry:
+    """Serialized latest checkpoint of one (thread, namespace) plus its pending writes."""
+
+    def __init__(self, version: int, row: tuple, writes: list):
+        self.version = version
+        self.row = row
+        self.writes = writes
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver):
+    """
+    LangGraph checkpointer backed by a local SQLite file.
+
+    Conversations survive restarts and are shared by every worker process
+    using the same file. Each thread keeps at most max_history checkpoints,
+    and threads idle for longer than ttl_seconds are deleted by a periodic
+    sweep. The latest checkpoint of recently used threads is kept in an LRU
+    hot tier of at most cache_size threads; entries are validated against a
+    per-thread version counter, so a write from another worker is never
+    masked by a stale cache entry.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_DB_PATH, ttl_seconds: float = 7 * 24 * 3600,
+                 cache_size: int = 256, max_history: int = 20, sweep_interval: float = 60, *, serde=None):
+        super().__init__(serde=serde)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.cache_size = cache_size
+        self.max_history = max_history
+        self.sweep_interval = sweep_interval
+        self._lock = threading.RLock()
+        self._hot: OrderedDict[tuple[str, str], _HotEntry] = OrderedDict()
+        self._last_sweep = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.expired_threads = 0
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    # Hot tier
+
+    def _cache_get(self, key: tuple[str, str], version: int) -> Optional[_HotEntry]:
+        entry = self._hot.get(key)
+        if entry is None or entry.version != version:
+            return None
+        self._hot.move_to_end(key)
+        return entry
+
+    def _cache_put(self, key: tuple[str, str], entry: _HotEntry):
+        if self.cache_size <= 0:
+            return
+        self._hot[key] = entry
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.cache_size:
+            self._hot.popitem(last=False)
+
+    def _drop_thread_cache(self, thread_id: str):
+        for key in [k for k in self._hot if k[0] == thread_id]:
+            del self._hot[key]
+
+    # Storage helpers
+
+    def _touch(self, thread_id: str) -> int:
+        """Bump the thread's version and idle timer; must run inside a transaction."""
+        return self._conn.execute(
+            "INSERT INTO threads (thread_id, version, updated_at) VALUES (?, 1, ?) "
+            "ON CONFLICT (thread_id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at "
+            "RETURNING version",
+            (thread_id, time.time()),
+        ).fetchone()[0]
+
+    def _thread_version(self, thread_id: str) -> Optional[int]:
+        row = self._conn.execute(
+            "SELECT version, updated_at FROM threads WHERE thread_id = ?", (thread_id,)
+        ).fetchone()
+        if row is None or (self.ttl_seconds > 0 and row[1] < time.time() - self.ttl_seconds):
+            return None
+        return row[0]
+
+    def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> list:
+        return self._conn.execute(
+            "SELECT task_id, channel, value_type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, row: tuple, writes: list) -> CheckpointTuple:
+        checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata = row
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint=self.serde.loads_typed((checkpoint_type, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+    def _sweep(self):
+        if self.ttl_seconds <= 0 or time.time() - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = time.time()
+        cutoff = time.time() - self.ttl_seconds
+        expired = [r[0] for r in self._conn.execute("SELECT thread_id FROM threads WHERE updated_at < ?", (cutoff,))]
+        for thread_id in expired:
+            self._delete(thread_id)
+        self.expired_threads += len(expired)
+
+    def _delete(self, thread_id: str):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("writes", "checkpoints", "threads"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._drop_thread_cache(thread_id)
+
+    # BaseCheckpointSaver interface
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            version = self._thread_version(thread_id)
+            if version is None:
+                return None
+            if checkpoint_id is None:
+                entry = self._cache_get((thread_id, checkpoint_ns), version)
+                if entry is not None:
+                    self.hits += 1
+                    return self._to_tuple(thread_id, checkpoint_ns, entry.row, entry.writes)
+                self.misses += 1
+                row = self._conn.execute(
+                    "SELECT checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata "
+                    "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata "
+                    "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            if row is None:
+                return None
+            writes = self._load_writes(thread_id, checkpoint_ns, row[0])
+            if checkpoint_id is None:
+                self._cache_put((thread_id, checkpoint_ns), _HotEntry(version, row, writes))
+            return self._to_tuple(thread_id, checkpoint_ns, row, writes)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, checkpoint_type, checkpoint, "
+                 "metadata_type, metadata FROM checkpoints")
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(str(config["configurable"]["thread_id"]))
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            results = []
+            for thread_id, checkpoint_ns, *row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                metadata = self.serde.loads_typed((row[4], row[5]))
+                if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                writes = self._load_writes(thread_id, checkpoint_ns, row[0])
+                results.append(self._to_tuple(thread_id, checkpoint_ns, tuple(row), writes))
+        yield from results
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        row = (checkpoint["id"], parent_id, checkpoint_type, checkpoint_blob, metadata_type, metadata_blob)
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_id, "
+                    "checkpoint_type, checkpoint, metadata_type, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, *row),
+                )
+                if self.max_history > 0:
+                    stale = [r[0] for r in self._conn.execute(
+                        "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                        "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                        (thread_id, checkpoint_ns, self.max_history),
+                    )]
+                    for table in ("writes", "checkpoints"):
+                        self._conn.executemany(
+                            f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                            [(thread_id, checkpoint_ns, c) for c in stale],
+                        )
+                version = self._touch(thread_id)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._cache_put((thread_id, checkpoint_ns), _HotEntry(version, row, []))
+            self._sweep()
+
+        return {"configurable": {
+            "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_blob = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                         channel, value_type, value_blob, task_path))
+        # Special channels (errors, interrupts) are replaced, regular writes are only stored once.
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, "
+                    "value_type, value, task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                version = self._touch(thread_id)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            entry = self._hot.get((thread_id, checkpoint_ns))
+            if entry is not None and entry.row[0] == checkpoint_id and entry.version == version - 1:
+                entry.writes = self._load_writes(thread_id, checkpoint_ns, checkpoint_id)
+                entry.version = version
+            else:
+                self._hot.pop((thread_id, checkpoint_ns), None)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._delete(str(thread_id))
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None):
+        for item in await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit))):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None = None) -> str:
+        # Zero-padded so versions also sort correctly as strings.
+        current_v = 0 if current is None else int(str(current).split(".")[0])
+        return f"{current_v + 1:032}"
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hot_threads": len(self._hot),
+                "cache_size": self.cache_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "expired_threads": self.expired_threads,
+            }
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Boolean, UniqueConstraint, Index
 from db.database import Base
 
 class Patient(Base):
@@ -8,4 +8,40 @@ class Patient(Base):
     patient_id = Column(Integer, unique=True, index=True) 
     fullname = Column(String, index=True)
     email = Column(String, unique=True, index=True)
-    password_hash = Column(String)
\ No newline at end of file
+    password_hash = Column(String)
+
+class AvailabilitySlot(Base):
+    __tablename__ = "slots"
+    __table_args__ = (
+        UniqueConstraint("doctor_key", "date_slot", name="uq_slot_doctor_date_slot"),
+        Index("ix_slots_clinic_slot_ts", "clinic", "slot_ts"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    doctor_key = Column(String, index=True)
+    doctor_name = Column(String)
+    specialization = Column(String, index=True)
+    date_slot = Column(String)
+    is_available = Column(Boolean, default=True, nullable=False)
+    patient_to_attend = Column(Integer, nullable=True, index=True)
+    clinic = Column(String, default="main", nullable=False)
+    slot_ts = Column(Integer)
+
+class SlotGeneration(Base):
+    __tablename__ = "slot_generation"
+
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, default=0, nullable=False)
+
+class SlotBooking(Base):
+    __tablename__ = "slot_bookings"
+    __table_args__ = (
+        UniqueConstraint("doctor_key", "slot_ts", name="uq_booking_doctor_slot_ts"),
+        Index("ix_slot_bookings_clinic_slot_ts", "clinic", "slot_ts"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    doctor_key = Column(String, nullable=False)
+    clinic = Column(String, default="main", nullable=False)
+    slot_ts = Column(Integer, nullable=False)
+    patient_to_attend = Column(Integer, nullable=False, index=True)
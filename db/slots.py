@@ -0,0 +1,239 @@
+import argparse
+from sqlalchemy import update, select, delete, func, case, inspect, text, bindparam
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+from db.database import Base, engine, SessionLocal
+from db.models import AvailabilitySlot, SlotGeneration
+from toolkit.slots import Slot, CSV_PATH, DEFAULT_CLINIC, DoctorSummary, parse_date_slot
+from toolkit.snapshot import load_slots
+
+SEED_ATTEMPTS = 3
+
+
+def import_slots_from_csv(db: Session, csv_path: str = CSV_PATH, replace: bool = False) -> int:
+    """Load doctor_availability.csv into the slots table. Returns the number of imported rows."""
+    if replace:
+        db.execute(delete(AvailabilitySlot))
+    db.bulk_insert_mappings(AvailabilitySlot, [
+        {
+            "doctor_key": s.doctor_name.lower(),
+            "doctor_name": s.doctor_name,
+            "specialization": s.specialization,
+            "date_slot": s.date_slot,
+            "is_available": s.is_available,
+            "patient_to_attend": s.patient_to_attend,
+            "clinic": s.clinic,
+            "slot_ts": s.ts,
+        }
+        for s in load_slots(csv_path)
+    ])
+    count = db.query(AvailabilitySlot).count()
+    _bump_generation(db)
+    db.commit()
+    return count
+
+
+def _migrate_slots_table():
+    """Add the clinic/slot_ts columns to slots tables created before sharding."""
+    columns = {c["name"] for c in inspect(engine).get_columns(AvailabilitySlot.__tablename__)}
+    if {"clinic", "slot_ts"} <= columns:
+        return
+    with engine.begin() as conn:
+        if "clinic" not in columns:
+            conn.execute(text(f"ALTER TABLE slots ADD COLUMN clinic VARCHAR NOT NULL DEFAULT '{DEFAULT_CLINIC}'"))
+        if "slot_ts" not in columns:
+            conn.execute(text("ALTER TABLE slots ADD COLUMN slot_ts INTEGER"))
+        table = AvailabilitySlot.__table__
+        rows = conn.execute(select(table.c.id, table.c.date_slot)).all()
+        if rows:
+            conn.execute(
+                table.update().where(table.c.id == bindparam("row_id")).values(slot_ts=bindparam("ts")),
+                [{"row_id": row_id, "ts": parse_date_slot(date_slot)} for row_id, date_slot in rows],
+            )
+    for index in AvailabilitySlot.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
+def _bump_generation(db: Session, generation_id: int = 1) -> int:
+    result = db.execute(
+        update(SlotGeneration).where(SlotGeneration.id == generation_id).values(value=SlotGeneration.value + 1)
+    )
+    if result.rowcount == 0:
+        db.add(SlotGeneration(id=generation_id, value=1))
+        db.flush()
+    return db.execute(select(SlotGeneration.value).where(SlotGeneration.id == generation_id)).scalar_one()
+
+
+def _book(db: Session, doctor_name: str, date_slot: str, patient_id: int) -> bool:
+    result = db.execute(
+        update(AvailabilitySlot)
+        .where(
+            AvailabilitySlot.doctor_key == doctor_name.lower(),
+            AvailabilitySlot.date_slot == date_slot,
+            AvailabilitySlot.is_available == True,
+        )
+        .values(is_available=False, patient_to_attend=patient_id)
+    )
+    return result.rowcount == 1
+
+
+def _cancel(db: Session, doctor_name: str, date_slot: str, patient_id: int) -> bool:
+    result = db.execute(
+        update(AvailabilitySlot)
+        .where(
+            AvailabilitySlot.doctor_key == doctor_name.lower(),
+            AvailabilitySlot.date_slot == date_slot,
+            AvailabilitySlot.is_available == False,
+            AvailabilitySlot.patient_to_attend == patient_id,
+        )
+        .values(is_available=True, patient_to_attend=None)
+    )
+    return result.rowcount == 1
+
+
+class SlotLedger:
+    """
+    Authoritative slot state in the SQL database.
+
+    Every mutation is a conditional UPDATE committed together with a bump of
+    the slot generation, so concurrent bookings from any thread or worker
+    cannot double-book, and readers can detect changes with a single lookup.
+    Mutations return the new generation, or None if nothing changed.
+    """
+
+    def __init__(self, session_factory=SessionLocal, csv_path: str = CSV_PATH):
+        self.session_factory = session_factory
+        self.csv_path = csv_path
+        Base.metadata.create_all(bind=engine, tables=[AvailabilitySlot.__table__, SlotGeneration.__table__])
+        _migrate_slots_table()
+        self._seed()
+
+    def _seed(self):
+        for attempt in range(SEED_ATTEMPTS):
+            with self.session_factory() as db:
+                if db.query(AvailabilitySlot.id).first() is not None:
+                    return
+                try:
+                    import_slots_from_csv(db, self.csv_path)
+                    return
+                except (IntegrityError, OperationalError):
+                    # Another worker is importing the seed data (SQLite reports "database is locked")
+                    # or already has; roll back and check again.
+                    db.rollback()
+                    if attempt == SEED_ATTEMPTS - 1:
+                        raise
+
+    def version(self) -> int:
+        with self.session_factory() as db:
+            return db.execute(select(SlotGeneration.value).where(SlotGeneration.id == 1)).scalar() or 0
+
+    def catalog(self) -> list[DoctorSummary]:
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(
+                    AvailabilitySlot.clinic,
+                    AvailabilitySlot.doctor_name,
+                    AvailabilitySlot.specialization,
+                    func.sum(case((AvailabilitySlot.is_available == True, 1), else_=0)),
+                    func.min(AvailabilitySlot.slot_ts),
+                    func.max(AvailabilitySlot.slot_ts),
+                )
+                .group_by(AvailabilitySlot.doctor_key)
+                .order_by(func.min(AvailabilitySlot.id))
+            ).all()
+            return [DoctorSummary(*row) for row in rows]
+
+    def load_range(self, clinic: str, start_ts: int, end_ts: int) -> list[Slot]:
+        """Slots of one clinic with start_ts <= slot time < end_ts."""
+        with self.session_factory() as db:
+            rows = (
+                db.query(AvailabilitySlot)
+                .filter(
+                    AvailabilitySlot.clinic == clinic,
+                    AvailabilitySlot.slot_ts >= start_ts,
+                    AvailabilitySlot.slot_ts < end_ts,
+                )
+                .order_by(AvailabilitySlot.id)
+                .all()
+            )
+            return [
+                Slot(
+                    date_slot=r.date_slot,
+                    specialization=r.specialization,
+                    doctor_name=r.doctor_name,
+                    is_available=r.is_available,
+                    patient_to_attend=r.patient_to_attend,
+                    clinic=r.clinic,
+                    ts=r.slot_ts,
+                )
+                for r in rows
+            ]
+
+    def book(self, doctor_name: str, date_slot: str, patient_id: int):
+        with self.session_factory() as db:
+            if not _book(db, doctor_name, date_slot, patient_id):
+                db.rollback()
+                return None
+            generation = _bump_generation(db)
+            db.commit()
+            return generation
+
+    def cancel(self, doctor_name: str, date_slot: str, patient_id: int):
+        with self.session_factory() as db:
+            if not _cancel(db, doctor_name, date_slot, patient_id):
+                db.rollback()
+                return None
+            generation = _bump_generation(db)
+            db.commit()
+            return generation
+
+    def book_many(self, slots: list[tuple[str, str]], patient_id: int):
+        """
+        Book every (doctor_name, date_slot) in one transaction, or none of them.
+        Returns (generation, rejected); rejected lists the slots that could not be booked.
+        """
+        with self.session_factory() as db:
+            rejected = [(d, s) for d, s in slots if not _book(db, d, s, patient_id)]
+            if rejected or not slots:
+                db.rollback()
+                return None, rejected
+            generation = _bump_generation(db)
+            db.commit()
+            return generation, []
+
+    def cancel_many(self, slots: list[tuple[str, str]], patient_id: int):
+        """Cancel every (doctor_name, date_slot) in one transaction, or none of them. Returns (generation, rejected)."""
+        with self.session_factory() as db:
+            rejected = [(d, s) for d, s in slots if not _cancel(db, d, s, patient_id)]
+            if rejected or not slots:
+                db.rollback()
+                return None, rejected
+            generation = _bump_generation(db)
+            db.commit()
+            return generation, []
+
+    def reschedule(self, doctor_name: str, old_date_slot: str, new_date_slot: str, patient_id: int):
+        """Returns (outcome, generation) where outcome is "ok", "no_appointment" or "unavailable"."""
+        with self.session_factory() as db:
+            if not _cancel(db, doctor_name, old_date_slot, patient_id):
+                db.rollback()
+                return "no_appointment", None
+            if old_date_slot == new_date_slot or not _book(db, doctor_name, new_date_slot, patient_id):
+                db.rollback()
+                return "unavailable", None
+            generation = _bump_generation(db)
+            db.commit()
+            return "ok", generation
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import doctor availability from CSV into the slots table.")
+    parser.add_argument("--csv", default=CSV_PATH, help="Path to doctor_availability.csv")
+    parser.add_argument("--replace", action="store_true", help="Delete existing slots before importing")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine, tables=[AvailabilitySlot.__table__, SlotGeneration.__table__])
+    with SessionLocal() as db:
+        if not args.replace and db.query(AvailabilitySlot.id).first() is not None:
+            raise SystemExit("slots table is not empty; pass --replace to re-import")
+        print(f"Imported {import_slots_from_csv(db, args.csv, args.replace)} slots from {args.csv}")
@@ -1,9 +1,26 @@
 import streamlit as st
 import json
+import uuid
 import requests
 
+# A dropped stream is retried with the same Idempotency-Key, so a run that already finished is replayed instead of
+# repeated. No Idempotency-Detach-Grace is sent: a run still going when the connection drops is cancelled right away
+# rather than kept alive for a user who may have left, and the retry runs it again.
+MAX_ATTEMPTS = 2
+
 def chat_with_backend_agent(fastapi_base_url: str, query: str, chat_area, status_holder, status_placeholder):
-    headers = {"Authorization": f"Bearer {st.session_state.get('access_token', '')}"}
+    headers = {
+        "Authorization": f"Bearer {st.session_state.get('access_token', '')}",
+        "Idempotency-Key": str(uuid.uuid4()),
+    }
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return _stream_reply(fastapi_base_url, query, headers, chat_area, status_holder, status_placeholder)
+        except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError):
+            if attempt == MAX_ATTEMPTS:
+                st.error("❌ Lost the connection to the server, please try again.")
+
+def _stream_reply(fastapi_base_url: str, query: str, headers: dict, chat_area, status_holder, status_placeholder):
     docubot_reply = ""
     
     with requests.post(
@@ -12,6 +29,9 @@ def chat_with_backend_agent(fastapi_base_url: str, query: str, chat_area, status
         headers=headers,
         stream=True,
     ) as r:
+        if r.status_code in (429, 503):
+            st.warning(f"⏳ {r.json().get('detail', 'The assistant is busy, please try again shortly.')}")
+            return
         if r.status_code != 200:
             st.error(f"❌ Server returned {r.status_code}")
             return
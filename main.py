@@ -1,7 +1,8 @@
-from fastapi import FastAPI, Depends, HTTPException, Response
+from fastapi import FastAPI, Depends, Header, HTTPException, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
+import asyncio
 from agent import DoctorAppointmentAgent
 from langchain_core.messages import ToolMessage, AIMessage, AIMessageChunk
 from data_models.userQuery import UserQuery
@@ -14,8 +15,15 @@ from utils.security import (
     verify_password, get_current_patient_id
 )
 from sqlalchemy.orm import Session
-from typing import Generator
-import json
+from typing import AsyncGenerator, AsyncIterator, Callable, Optional
+from utils.metrics import (
+    metrics, MetricsCallbackHandler, REQUEST_SECONDS, REQUEST_LLM_CALLS, CANCELLED_RUNS, CANCELLED_TOKENS_SAVED
+)
+from utils.streaming import ClosingStreamingResponse, coalesce, ndjson_stream, sse_stream
+from utils.idempotency import IdempotencyConflict, IdempotencyStore
+from utils.admission import AdmissionController, AdmissionRejected, ConcurrencyLimiter, ThreadSerializer, TokenBucketLimiter
+from toolkit.tools import tool_cache
+from toolkit.availability import availability_store
 
 app=FastAPI()
 
@@ -25,7 +33,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  
     allow_headers=["*"], 
-    expose_headers=["Content-Type"], 
+    expose_headers=["Content-Type", "Idempotent-Replayed"], 
 )
 
 Base.metadata.create_all(bind=engine)
@@ -33,6 +41,27 @@ Base.metadata.create_all(bind=engine)
 agent=DoctorAppointmentAgent()
 app_graph=agent.workflow()
 
+admission = AdmissionController(
+    TokenBucketLimiter(settings.RATE_LIMIT_PER_MINUTE, settings.RATE_LIMIT_BURST),
+    ThreadSerializer(settings.THREAD_QUEUE_SIZE, settings.THREAD_WAIT_SECONDS),
+    ConcurrencyLimiter(settings.MAX_CONCURRENT_REQUESTS, settings.MAX_QUEUED_REQUESTS, settings.QUEUE_WAIT_SECONDS),
+)
+idempotency = IdempotencyStore(
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+    max_entries=settings.IDEMPOTENCY_MAX_ENTRIES,
+    max_detach_grace=settings.IDEMPOTENCY_MAX_DETACH_GRACE_SECONDS,
+)
+
+metrics.register_stats("admission", admission.stats)
+metrics.register_stats("idempotency", idempotency.stats)
+metrics.register_stats("prefilter", agent.prefilter.stats)
+metrics.register_stats("speculation", agent.speculation.stats)
+metrics.register_stats("llm", agent.chat_model.stats)
+metrics.register_stats("tool_cache", tool_cache.stats)
+metrics.register_stats("availability", availability_store.stats)
+if hasattr(app_graph.checkpointer, "stats"):
+    metrics.register_stats("checkpoints", app_graph.checkpointer.stats)
+
 @app.post("/signup", response_model=SignupResponse)
 def signup(user: SignupRequest, db: Session = Depends(get_db)):
     try:
@@ -81,44 +110,117 @@ def logout(response: Response):
     response.delete_cookie(settings.COOKIE_NAME)
     return {"message": "Logged out successfully"}
 
+@app.get("/stats")
+def stats():
+    return {
+        "prefilter": agent.prefilter.stats(),
+        "speculation": agent.speculation.stats(),
+        "llm": agent.chat_model.stats(),
+        "admission": admission.stats(),
+        "idempotency": idempotency.stats(),
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def stream_response(events: AsyncIterator[dict], user_input: UserQuery, on_close: Optional[Callable[[], None]] = None,
+                    headers: Optional[dict] = None) -> ClosingStreamingResponse:
+    """
+    Frame events in the format the request asked for. The events are always
+    consumed in their own task, so closing the response on a disconnect can
+    cancel the graph behind them.
+    """
+    window = settings.STREAM_COALESCE_MS / 1000 if user_input.coalesce else 0
+    headers = dict(headers or {})
+    if user_input.stream_format == "sse":
+        frames = coalesce(events, window, settings.STREAM_COALESCE_CHARS, settings.SSE_HEARTBEAT_SECONDS)
+        headers.update({"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        return ClosingStreamingResponse(sse_stream(frames), media_type="text/event-stream", on_close=on_close, headers=headers)
+    frames = coalesce(events, window, settings.STREAM_COALESCE_CHARS)
+    return ClosingStreamingResponse(ndjson_stream(frames), media_type="application/json", on_close=on_close, headers=headers)
+
 @app.post("/execute")
-def execute_agent(user_input: UserQuery, patient_id: int = Depends(get_current_patient_id)):
+async def execute_agent(user_input: UserQuery, patient_id: int = Depends(get_current_patient_id),
+                        idempotency_key: Optional[str] = Header(None, max_length=255),
+                        idempotency_detach_grace: float = Header(0, ge=0)):
+    run = None
+    if idempotency_key:
+        # Reserved before any await, so concurrent retries with the same key share one run.
+        try:
+            run, created = idempotency.begin((patient_id, idempotency_key), user_input.message, idempotency_detach_grace)
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if not created:
+            return stream_response(run.follow(), user_input, on_close=run.schedule_detach,
+                                   headers={"Idempotent-Replayed": "true"})
+
+    try:
+        ticket = await admission.admit(patient_id)
+    except AdmissionRejected as e:
+        if run is not None:
+            idempotency.abandon(run, e.detail)
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
+
     query_data = {
         'query': user_input.message
     }
-    def event_generator() -> Generator[str, None, None]:
+    async def agent_events() -> AsyncGenerator[dict, None]:
+        instrumentation = MetricsCallbackHandler()
+        outcome = "error"
         try:
             seen_tool_ids = set()
-            events = app_graph.stream(
+            events = app_graph.astream(
                 query_data, 
                 stream_mode="messages",
                 config={
                     "configurable": {
                     "thread_id": patient_id
-                }
+                },
+                    "callbacks": [instrumentation],
                 })
-            for msg_chunk, _ in events:
+            async for msg_chunk, _ in events:
                 try:
                     if isinstance(msg_chunk, AIMessage):
                         if hasattr(msg_chunk, 'tool_call_chunks') and msg_chunk.tool_call_chunks:
                             for chunk in msg_chunk.tool_call_chunks:
                                 if chunk.get("name") and chunk.get("id") and chunk["id"] not in seen_tool_ids:
                                     seen_tool_ids.add(chunk["id"])
-                                    yield json.dumps({
+                                    yield {
                                         "type": "tool", 
                                         "tool_name": f'{chunk["name"]} node'
-                                    }) + "\n"
+                                    }
                         if msg_chunk.content:
-                            yield json.dumps({
+                            yield {
                                 "type": "text", 
                                 "content": str(msg_chunk.content)
-                            }) + "\n"
+                            }
                     elif isinstance(msg_chunk, ToolMessage): 
-                        yield json.dumps({"type": "tool", "tool_name": f'{msg_chunk.name} tool'}) + "\n"
+                        yield {"type": "tool", "tool_name": f'{msg_chunk.name} tool'}
                 except Exception as inner_err:
-                    yield json.dumps({"type": "error", "message": str(inner_err)}) + "\n"
+                    yield {"type": "error", "message": str(inner_err)}
+            outcome = "ok"
+            REQUEST_LLM_CALLS.observe(instrumentation.timing()["llm"]["calls"])
 
+        except asyncio.CancelledError:
+            # The client went away; cancelling astream cancels the running nodes and their LLM calls.
+            # Checkpoints are written in single transactions, so the thread keeps its last complete step.
+            outcome = "cancelled"
+            CANCELLED_RUNS.inc(node=",".join(instrumentation.running_nodes()) or "none")
+            CANCELLED_TOKENS_SAVED.inc(round(instrumentation.tokens_saved_estimate()))
+            raise
         except Exception as outer_err:
-            yield json.dumps({"type": "fatal_error", "message": str(outer_err)}) + "\n"
+            yield {"type": "fatal_error", "message": str(outer_err)}
+        finally:
+            ticket.release()
+            REQUEST_SECONDS.observe(instrumentation.timing()["total_seconds"], outcome=outcome)
+        if user_input.timing:
+            yield {"type": "timing", **instrumentation.timing()}
 
-    return StreamingResponse(event_generator(), media_type="application/json")
\ No newline at end of file
+    if run is not None:
+        # Keyed runs belong to the store: a dropped connection stops following, and the run is
+        # cancelled once its detach grace (none unless the client asked for one) passes unfollowed.
+        idempotency.start(run, agent_events(), on_done=ticket.release)
+        return stream_response(run.follow(), user_input, on_close=run.schedule_detach)
+    # on_close also releases the ticket if the stream never started.
+    return stream_response(agent_events(), user_input, on_close=ticket.release)
@@ -21,4 +21,57 @@ class Settings(BaseSettings):
     SMTP_USER : str
     SMTP_PASSWORD : str
 
+    SLOT_BACKEND : str = "sqlite"  # "sqlite", "journal" or "template"
+    JOURNAL_COMPACT_INTERVAL_SECONDS : float = 60
+    JOURNAL_COMPACT_MIN_RECORDS : int = 500
+    SCHEDULE_TEMPLATES_PATH : str = ""  # defaults to data/schedule_templates.json
+
+    SHARD_MAX_ROWS : int = 50000
+
+    TOOL_CACHE_SIZE : int = 512
+    TOOL_THREADS : int = 32
+    AVAILABILITY_FORMAT : str = "compact"  # "compact" groups free times into runs, "verbose" lists every slot
+    AVAILABILITY_MAX_RUNS : int = 8  # runs/times per doctor and day in the compact format; 0 shows all
+    AVAILABILITY_MAX_LINES : int = 30  # doctor-days in compact range listings; 0 shows all
+
+    PREFILTER_ENABLED : bool = True
+    PREFILTER_THRESHOLD : float = 0.8
+    DIRECT_TOOLS_ENABLED : bool = True  # run fully specified availability/booking requests without the LLM
+
+    ROUTING_MODE : str = "two_stage"  # "two_stage", "fused" or "speculative"
+    SPECULATIVE_WORKER : bool = True
+
+    HISTORY_TOKEN_BUDGET : int = 4000  # 0 disables history compaction
+    HISTORY_RECENT_TOKENS : int = 1500
+    HISTORY_SUMMARY_TOKENS : int = 300
+
+    RATE_LIMIT_PER_MINUTE : float = 20  # /execute messages per patient; 0 disables rate limiting
+    RATE_LIMIT_BURST : int = 5
+    THREAD_QUEUE_SIZE : int = 1  # messages per conversation waiting behind the one being answered
+    THREAD_WAIT_SECONDS : float = 60
+    MAX_CONCURRENT_REQUESTS : int = 64  # /execute requests running at once; 0 disables the limit
+    MAX_QUEUED_REQUESTS : int = 128
+    QUEUE_WAIT_SECONDS : float = 10
+
+    STREAM_COALESCE_MS : int = 50  # window for merging text chunks when a request sets coalesce
+    STREAM_COALESCE_CHARS : int = 1024
+    SSE_HEARTBEAT_SECONDS : float = 15
+
+    IDEMPOTENCY_TTL_SECONDS : float = 600  # how long a finished /execute run is replayed for its Idempotency-Key
+    IDEMPOTENCY_MAX_ENTRIES : int = 1000
+    IDEMPOTENCY_MAX_DETACH_GRACE_SECONDS : float = 30  # cap on Idempotency-Detach-Grace; without it a disconnect cancels the run
+
+    LLM_PROVIDERS : str = "gemini_latest,gemini,groq"  # in order of preference; "fake" runs offline
+    LLM_HEDGE_DELAY_SECONDS : float = 2.0  # 0 disables hedged requests
+    LLM_FAILURE_THRESHOLD : int = 3
+    LLM_COOLDOWN_SECONDS : float = 30
+    LLM_STATS_WINDOW : int = 100
+    LLM_STATS_HORIZON_SECONDS : float = 300  # calls older than this no longer count toward provider ranking
+
+    CHECKPOINTER : str = "sqlite"  # "sqlite" or "memory"
+    CHECKPOINT_DB_PATH : str = ""  # defaults to data/checkpoints.db
+    CHECKPOINT_TTL_SECONDS : float = 7*24*3600  # 0 keeps idle threads forever
+    CHECKPOINT_CACHE_SIZE : int = 256
+    CHECKPOINT_MAX_HISTORY : int = 20  # 0 keeps every checkpoint
+
 settings = Settings()
@@ -0,0 +1,17 @@
+import os
+import tempfile
+
+# settings.py requires these; tests never talk to the real services or database.
+for name, value in {
+    "GOOGLE_API_KEY": "test",
+    "GROQ_API_KEY": "test",
+    "SECRET_KEY": "test",
+    "ALGORITHM": "HS256",
+    "COOKIE_NAME": "test",
+    "SMTP_SERVER": "localhost",
+    "SMTP_PORT": "25",
+    "SMTP_USER": "test",
+    "SMTP_PASSWORD": "test",
+}.items():
+    os.environ.setdefault(name, value)
+os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'patients.db')}"
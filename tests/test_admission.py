@@ -0,0 +1,138 @@
+"""
+Tests for utils.admission: rate limits, per-thread serialization and the global limiter.
+
+    python -m pytest -q tests
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+from utils import admission
+from utils.admission import (
+    AdmissionController, AdmissionRejected, ConcurrencyLimiter, ThreadSerializer, TokenBucketLimiter,
+)
+
+
+class TokenBucketLimiterTest(unittest.TestCase):
+    def test_burst_then_refill(self):
+        now = [100.0]
+        with mock.patch.object(admission.time, "monotonic", lambda: now[0]):
+            limiter = TokenBucketLimiter(rate_per_minute=60, burst=2)
+            limiter.acquire("a")
+            limiter.acquire("a")
+            with self.assertRaises(AdmissionRejected) as rejected:
+                limiter.acquire("a")
+            self.assertEqual(rejected.exception.status_code, 429)
+            self.assertEqual(rejected.exception.headers, {"Retry-After": "1"})
+
+            limiter.acquire("b")  # every patient has a bucket of their own
+            now[0] += 1.0
+            limiter.acquire("a")
+            self.assertEqual((limiter.allowed, limiter.rejected), (4, 1))
+
+    def test_zero_rate_disables_the_limit(self):
+        limiter = TokenBucketLimiter(rate_per_minute=0, burst=1)
+        for _ in range(10):
+            limiter.acquire("a")
+        self.assertFalse(limiter.stats()["enabled"])
+
+    def test_least_recently_seen_keys_are_forgotten(self):
+        limiter = TokenBucketLimiter(rate_per_minute=1, burst=1, max_keys=2)
+        for key in ("a", "b", "c"):
+            limiter.acquire(key)
+        self.assertEqual(list(limiter._buckets), ["b", "c"])
+
+
+class ThreadSerializerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_requests_for_one_thread_run_in_arrival_order(self):
+        serializer, order = ThreadSerializer(queue_size=2, wait_seconds=1), []
+
+        async def request(name):
+            await serializer.acquire("thread")
+            order.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            order.append(f"{name} end")
+            serializer.release("thread")
+
+        await asyncio.gather(request("first"), request("second"), request("third"))
+        self.assertEqual(order, ["first start", "first end", "second start", "second end", "third start", "third end"])
+        self.assertEqual(serializer._locks, {})
+        self.assertEqual(serializer.waited, 2)
+
+    async def test_full_queue_is_rejected_and_other_threads_are_not_blocked(self):
+        serializer = ThreadSerializer(queue_size=1, wait_seconds=1)
+        await serializer.acquire("thread")
+        waiter = asyncio.create_task(serializer.acquire("thread"))
+        await asyncio.sleep(0)
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await serializer.acquire("thread")
+        self.assertEqual(rejected.exception.status_code, 429)
+
+        await asyncio.wait_for(serializer.acquire("other"), 0.1)
+        serializer.release("other")
+        serializer.release("thread")
+        await waiter
+        serializer.release("thread")
+        self.assertEqual(serializer._locks, {})
+
+    async def test_wait_times_out(self):
+        serializer = ThreadSerializer(queue_size=1, wait_seconds=0.05)
+        await serializer.acquire("thread")
+        with self.assertRaises(AdmissionRejected):
+            await serializer.acquire("thread")
+        self.assertEqual((serializer.timeouts, serializer.stats()["queued"]), (1, 0))
+        serializer.release("thread")
+        self.assertEqual(serializer._locks, {})
+
+
+class ConcurrencyLimiterTest(unittest.IsolatedAsyncioTestCase):
+    async def test_queue_then_reject(self):
+        limiter = ConcurrencyLimiter(max_active=1, max_queue=1, wait_seconds=1)
+        await limiter.acquire()
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        self.assertEqual(limiter.queued, 1)
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await limiter.acquire()
+        self.assertEqual(rejected.exception.status_code, 503)
+
+        limiter.release()
+        await asyncio.wait_for(queued, 0.1)
+        self.assertEqual((limiter.active, limiter.queued, limiter.admitted, limiter.rejected), (1, 0, 2, 1))
+        limiter.release()
+
+    async def test_wait_times_out(self):
+        limiter = ConcurrencyLimiter(max_active=1, max_queue=4, wait_seconds=0.05)
+        await limiter.acquire()
+        with self.assertRaises(AdmissionRejected):
+            await limiter.acquire()
+        self.assertEqual((limiter.timeouts, limiter.queued, limiter.active), (1, 0, 1))
+
+    async def test_zero_disables_the_cap(self):
+        limiter = ConcurrencyLimiter(max_active=0, max_queue=0)
+        for _ in range(5):
+            await limiter.acquire()
+        self.assertEqual(limiter.active, 5)
+
+
+class AdmissionControllerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_rejection_by_the_limiter_frees_the_thread(self):
+        controller = AdmissionController(
+            TokenBucketLimiter(rate_per_minute=0, burst=1),
+            ThreadSerializer(queue_size=1, wait_seconds=1),
+            ConcurrencyLimiter(max_active=1, max_queue=0),
+        )
+        first = await controller.admit(1)
+        with self.assertRaises(AdmissionRejected):
+            await controller.admit(2)
+        self.assertNotIn(2, controller.threads._locks)
+
+        first.release()
+        first.release()  # releasing twice is harmless
+        second = await controller.admit(2)
+        second.release()
+        self.assertEqual((controller.limiter.active, controller.threads._locks), (0, {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+All-or-nothing book_many/cancel_many on every slot ledger backend.
+
+    python -m pytest -q tests
+"""
+import json
+import os
+import tempfile
+import unittest
+
+from db.bookings import TemplateLedger
+from db.database import Base, engine
+from db.models import AvailabilitySlot, SlotBooking, SlotGeneration
+from db.slots import SlotLedger
+from toolkit.journal import JournalLedger
+from toolkit.slots import Slot, write_slots_csv
+
+DOCTORS = [("Soumya Chatterjee", "general_dentist"), ("Dibakar Basu", "orthodontist")]
+DATES = ["05-12-2025", "06-12-2025"]
+TIMES = ["08:00", "08:30", "09:00", "09:30"]
+BOOKED = ("Soumya Chatterjee", "05-12-2025 08:30", 1000082)
+
+TEMPLATES = {
+    "valid_from": DATES[0],
+    "valid_until": DATES[-1],
+    "slot_minutes": 30,
+    "weekly": {"fri": [["08:00", "10:00"]], "sat": [["08:00", "10:00"]]},
+    "doctors": [{"doctor_name": name, "specialization": spec, "clinic": "main"} for name, spec in DOCTORS],
+}
+
+
+class BatchBookingTests:
+    """Shared cases; subclasses build self.ledger over the same schedule with BOOKED already taken."""
+
+    def setUp(self):
+        Base.metadata.drop_all(bind=engine, tables=[AvailabilitySlot.__table__, SlotBooking.__table__,
+                                                    SlotGeneration.__table__])
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.csv_path = os.path.join(self.tmp.name, "doctor_availability.csv")
+        write_slots_csv(self.csv_path, [
+            Slot(f"{date} {time}", spec, name, (name, f"{date} {time}") != BOOKED[:2],
+                 BOOKED[2] if (name, f"{date} {time}") == BOOKED[:2] else None)
+            for name, spec in DOCTORS for date in DATES for time in TIMES
+        ])
+        self.ledger = self.create_ledger()
+
+    def create_ledger(self):
+        raise NotImplementedError
+
+    def states(self) -> dict:
+        return {
+            (s.doctor_name, s.date_slot): (s.is_available, s.patient_to_attend)
+            for s in self.ledger.load_range("main", 0, 2**40)
+        }
+
+    def test_book_many_books_every_slot(self):
+        version = self.ledger.version()
+        slots = [("Soumya Chatterjee", "05-12-2025 08:00"), ("dibakar basu", "06-12-2025 09:30")]
+        generation, rejected = self.ledger.book_many(slots, 7)
+        self.assertEqual((generation, rejected), (version + 1, []))
+        states = self.states()
+        self.assertEqual(states[("Soumya Chatterjee", "05-12-2025 08:00")], (False, 7))
+        self.assertEqual(states[("Dibakar Basu", "06-12-2025 09:30")], (False, 7))
+
+    def test_book_many_books_nothing_if_one_slot_is_taken(self):
+        before, version = self.states(), self.ledger.version()
+        slots = [("Dibakar Basu", "05-12-2025 08:00"), BOOKED[:2], ("Dibakar Basu", "05-12-2025 11:00")]
+        generation, rejected = self.ledger.book_many(slots, 7)
+        self.assertIsNone(generation)
+        self.assertIn(BOOKED[:2], rejected)
+        self.assertNotIn(("Dibakar Basu", "05-12-2025 08:00"), rejected)
+        self.assertEqual((self.states(), self.ledger.version()), (before, version))
+
+    def test_book_many_rejects_the_same_slot_twice(self):
+        before = self.states()
+        slots = [("Dibakar Basu", "05-12-2025 08:00"), ("dibakar basu", "05-12-2025 08:00")]
+        generation, rejected = self.ledger.book_many(slots, 7)
+        self.assertIsNone(generation)
+        self.assertEqual(len(rejected), 1)
+        self.assertEqual(self.states(), before)
+
+    def test_cancel_many_is_all_or_nothing(self):
+        self.ledger.book("Dibakar Basu", "05-12-2025 08:00", BOOKED[2])
+        before, version = self.states(), self.ledger.version()
+
+        # Another patient's slot, a free slot and a repeated slot each fail the whole batch.
+        for slots in (
+            [BOOKED[:2], ("Dibakar Basu", "05-12-2025 08:00"), ("Dibakar Basu", "05-12-2025 08:30")],
+            [BOOKED[:2], BOOKED[:2]],
+        ):
+            generation, rejected = self.ledger.cancel_many(slots, BOOKED[2])
+            self.assertIsNone(generation)
+            self.assertEqual(rejected, [slots[-1]])
+            self.assertEqual((self.states(), self.ledger.version()), (before, version))
+        self.assertEqual(self.ledger.cancel_many([BOOKED[:2]], 8), (None, [BOOKED[:2]]))
+
+        generation, rejected = self.ledger.cancel_many([BOOKED[:2], ("Dibakar Basu", "05-12-2025 08:00")], BOOKED[2])
+        self.assertEqual((generation, rejected), (version + 1, []))
+        states = self.states()
+        self.assertEqual(states[BOOKED[:2]], (True, None))
+        self.assertEqual(states[("Dibakar Basu", "05-12-2025 08:00")], (True, None))
+
+    def test_empty_batches_change_nothing(self):
+        version = self.ledger.version()
+        self.assertEqual(self.ledger.book_many([], 7), (None, []))
+        self.assertEqual(self.ledger.cancel_many([], 7), (None, []))
+        self.assertEqual(self.ledger.version(), version)
+
+
+class SlotLedgerBatchTest(BatchBookingTests, unittest.TestCase):
+    def create_ledger(self):
+        return SlotLedger(csv_path=self.csv_path)
+
+
+class JournalLedgerBatchTest(BatchBookingTests, unittest.TestCase):
+    def create_ledger(self):
+        ledger = JournalLedger(self.csv_path, compact_interval=0)
+        self.addCleanup(ledger.close)
+        return ledger
+
+
+class TemplateLedgerBatchTest(BatchBookingTests, unittest.TestCase):
+    def create_ledger(self):
+        templates_path = os.path.join(self.tmp.name, "schedule_templates.json")
+        with open(templates_path, "w", encoding="utf-8") as f:
+            json.dump(TEMPLATES, f)
+        return TemplateLedger(templates_path=templates_path, csv_path=self.csv_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+"""
+Tests for utils.history.HistoryManager's summary calls.
+
+    python -m pytest -q tests
+"""
+import unittest
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from utils.fake_llm import FakeChatModel
+from utils.history import HistoryManager
+from utils.metrics import BACKGROUND_FAILURES, MetricsCallbackHandler
+
+
+def conversation(turns: int) -> list:
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"Question {i}: " + "words " * 40, id=f"h{i}"))
+        messages.append(AIMessage(content=f"Answer {i}: " + "words " * 40, id=f"a{i}"))
+    return messages
+
+
+class HistoryManagerTest(unittest.IsolatedAsyncioTestCase):
+    def manager(self, model) -> HistoryManager:
+        return HistoryManager(model, budget_tokens=200, recent_tokens=100, summary_tokens=50)
+
+    def test_summary_call_runs_under_the_node_config(self):
+        handler = MetricsCallbackHandler()
+        removed, summary = self.manager(FakeChatModel(reply="summary")).compact(
+            conversation(6), config={"callbacks": [handler]})
+        self.assertEqual(summary, "summary")
+        self.assertTrue(removed)
+        self.assertEqual(handler.llm["calls"], 1)
+
+    async def test_async_summary_call_runs_under_the_node_config(self):
+        handler = MetricsCallbackHandler()
+        _, summary = await self.manager(FakeChatModel(reply="summary")).acompact(
+            conversation(6), "earlier", config={"callbacks": [handler]})
+        self.assertEqual(summary, "summary")
+        self.assertEqual(handler.llm["calls"], 1)
+
+    def test_failed_summary_falls_back_and_is_counted(self):
+        before = BACKGROUND_FAILURES._values.get(("history_summary",), 0)
+        _, summary = self.manager(FakeChatModel(failure_rate=1.0)).compact(conversation(6))
+        self.assertTrue(summary.endswith("words"))
+        self.assertLessEqual(len(summary), 50 * 4)
+        self.assertEqual(BACKGROUND_FAILURES._values.get(("history_summary",), 0), before + 1)
+
+    def test_within_budget_makes_no_call(self):
+        handler = MetricsCallbackHandler()
+        self.assertEqual(self.manager(FakeChatModel()).compact(conversation(1), config={"callbacks": [handler]}),
+                         ([], ""))
+        self.assertEqual(handler.llm["calls"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Tests for utils.idempotency.IdempotencyStore.
+
+    python -m pytest -q tests
+"""
+import asyncio
+import unittest
+
+from utils.idempotency import IdempotencyConflict, IdempotencyStore
+
+
+async def scripted(events: list, delay: float = 0, log: list = None):
+    for event in events:
+        await asyncio.sleep(delay)
+        if log is not None:
+            log.append(event)
+        yield event
+
+
+async def collect(run) -> list:
+    follower = run.follow()
+    try:
+        return [event async for event in follower]
+    finally:
+        run.schedule_detach()
+
+
+TEXT = [{"type": "text", "content": "Booked "}, {"type": "text", "content": "for 10:30."}]
+
+
+class IdempotencyStoreTest(unittest.IsolatedAsyncioTestCase):
+    async def test_finished_run_is_replayed(self):
+        store, log = IdempotencyStore(), []
+        run, created = store.begin("key", "book Isha Roy")
+        self.assertTrue(created)
+        store.start(run, scripted(TEXT, log=log))
+        self.assertEqual(await collect(run), TEXT)
+
+        replay, created = store.begin("key", "book Isha Roy")
+        self.assertEqual((replay, created), (run, False))
+        # Replays carry the text merged, and nothing runs a second time.
+        self.assertEqual(await collect(replay), [{"type": "text", "content": "Booked for 10:30."}])
+        self.assertEqual(len(log), 2)
+        self.assertEqual((store.started, store.replayed), (1, 1))
+
+    async def test_key_reused_for_another_message_is_a_conflict(self):
+        store = IdempotencyStore()
+        run, _ = store.begin("key", "book Isha Roy")
+        store.start(run, scripted(TEXT))
+        with self.assertRaises(IdempotencyConflict):
+            store.begin("key", "cancel Isha Roy")
+        self.assertEqual(store.conflicts, 1)
+        # The same key is still free for other patients, who use a different store key.
+        self.assertTrue(store.begin(("other", "key"), "cancel Isha Roy")[1])
+
+    async def test_failed_runs_are_dropped_so_a_retry_executes(self):
+        async def failing():
+            yield TEXT[0]
+            raise RuntimeError("provider down")
+
+        store = IdempotencyStore()
+        run, _ = store.begin("key", "book Isha Roy")
+        store.start(run, failing())
+        events = await collect(run)
+        self.assertEqual(events[-1], {"type": "fatal_error", "message": "provider down"})
+        self.assertTrue(store.begin("key", "book Isha Roy")[1])
+
+    async def test_disconnect_cancels_the_run_without_a_grace(self):
+        store, log = IdempotencyStore(), []
+        run, _ = store.begin("key", "book Isha Roy")
+        store.start(run, scripted(TEXT, delay=0.05, log=log))
+        follower = run.follow()
+        await follower.__anext__()
+        await follower.aclose()
+        run.schedule_detach()
+
+        await asyncio.sleep(0.15)
+        self.assertTrue(run.task.cancelled() or run.failed)
+        self.assertEqual(len(log), 1)
+        self.assertEqual(store.detached, 1)
+        self.assertTrue(store.begin("key", "book Isha Roy")[1])
+
+    async def test_retry_within_the_grace_attaches_to_the_running_run(self):
+        store, log = IdempotencyStore(max_detach_grace=0.2), []
+        run, _ = store.begin("key", "book Isha Roy", detach_grace=5)
+        self.assertEqual(run.detach_grace, 0.2)
+        store.start(run, scripted(TEXT, delay=0.05, log=log))
+        follower = run.follow()
+        await follower.__anext__()
+        await follower.aclose()
+        run.schedule_detach()
+
+        retry, created = store.begin("key", "book Isha Roy")
+        self.assertFalse(created)
+        self.assertEqual(await collect(retry), TEXT)
+        self.assertEqual((len(log), store.attached, store.detached), (2, 1, 0))
+
+    async def test_a_response_that_never_started_still_detaches(self):
+        store = IdempotencyStore()
+        run, _ = store.begin("key", "book Isha Roy")
+        store.start(run, scripted(TEXT, delay=0.05))
+        run.schedule_detach()  # what the response's on_close does when its body never ran
+        await asyncio.sleep(0.1)
+        self.assertEqual(store.detached, 1)
+
+    async def test_oldest_finished_runs_are_evicted_first(self):
+        store = IdempotencyStore(max_entries=2)
+        running, _ = store.begin("running", "a")
+        store.start(running, scripted(TEXT, delay=1))
+        for key in ("first", "second"):
+            run, _ = store.begin(key, "b")
+            store.start(run, scripted(TEXT))
+            await collect(run)
+        store.begin("third", "c")
+        self.assertEqual(list(store._runs), ["running", "second", "third"])
+        self.assertNotIn("first", store._runs)
+        self.assertEqual(store.evicted, 1)
+        running.task.cancel()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Tests for toolkit.journal.JournalLedger: replay, torn records and compaction.
+
+    python -m pytest -q tests
+"""
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from toolkit import journal as journal_module
+from toolkit.journal import JournalLedger
+from toolkit.slots import Slot, read_slots_csv, write_slots_csv
+from utils.metrics import BACKGROUND_FAILURES
+
+SLOTS = [
+    Slot("05-12-2025 08:00", "general_dentist", "Soumya Chatterjee", True),
+    Slot("05-12-2025 08:30", "general_dentist", "Soumya Chatterjee", False, 1000082),
+    Slot("05-12-2025 09:00", "general_dentist", "Soumya Chatterjee", True),
+    Slot("05-12-2025 08:00", "orthodontist", "Dibakar Basu", True),
+]
+
+
+def state(ledger: JournalLedger, doctor_name: str, date_slot: str) -> tuple:
+    slot = next(s for s in ledger.load_range("main", 0, 2**40)
+                if s.doctor_name == doctor_name and s.date_slot == date_slot)
+    return slot.is_available, slot.patient_to_attend
+
+
+class JournalLedgerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp.name, "doctor_availability.csv")
+        write_slots_csv(self.csv_path, SLOTS)
+        self.ledger = self.open()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open(self, **kwargs) -> JournalLedger:
+        ledger = JournalLedger(self.csv_path, **{"compact_interval": 0, **kwargs})
+        self.addCleanup(ledger.close)
+        return ledger
+
+    def journal_lines(self) -> list[bytes]:
+        with open(self.ledger.journal_path, "rb") as f:
+            return f.read().splitlines(keepends=True)
+
+    def test_mutations_append_one_record_each(self):
+        self.assertEqual(self.ledger.book("Soumya Chatterjee", "05-12-2025 08:00", 7), 1)
+        self.assertIsNone(self.ledger.book("Soumya Chatterjee", "05-12-2025 08:00", 8))
+        self.assertEqual(self.ledger.cancel("Soumya Chatterjee", "05-12-2025 08:30", 1000082), 2)
+        self.assertEqual(len(self.journal_lines()), 2)
+        self.assertEqual(state(self.ledger, "Soumya Chatterjee", "05-12-2025 08:00"), (False, 7))
+        self.assertEqual(state(self.ledger, "Soumya Chatterjee", "05-12-2025 08:30"), (True, None))
+
+    def test_restart_and_other_writers_are_replayed(self):
+        self.ledger.book("Dibakar Basu", "05-12-2025 08:00", 7)
+        other = self.open()
+        self.assertEqual(state(other, "Dibakar Basu", "05-12-2025 08:00"), (False, 7))
+
+        # A second writer sees the first one's record before validating its own.
+        self.assertIsNone(other.book("Dibakar Basu", "05-12-2025 08:00", 8))
+        self.assertEqual(other.reschedule("Soumya Chatterjee", "05-12-2025 08:30", "05-12-2025 09:00", 1000082),
+                         ("ok", 2))
+        self.assertEqual(self.ledger.version(), 2)
+        self.assertEqual(state(self.ledger, "Soumya Chatterjee", "05-12-2025 09:00"), (False, 1000082))
+        self.assertEqual([e.open_slots for e in self.ledger.catalog()], [2, 0])
+
+    def test_torn_record_is_ignored_and_truncated_before_the_next_write(self):
+        self.ledger.book("Soumya Chatterjee", "05-12-2025 08:00", 7)
+        with open(self.ledger.journal_path, "ab") as f:
+            f.write(b'{"seq": 2, "changes": [["Dibakar Ba')
+
+        restarted = self.open()
+        self.assertEqual(restarted.version(), 1)
+        self.assertTrue(state(restarted, "Dibakar Basu", "05-12-2025 08:00")[0])
+        self.assertEqual(restarted.book("Dibakar Basu", "05-12-2025 08:00", 9), 2)
+        self.assertEqual(len(self.journal_lines()), 2)
+        self.assertTrue(all(line.endswith(b"\n") for line in self.journal_lines()))
+        self.assertEqual(state(self.open(), "Dibakar Basu", "05-12-2025 08:00"), (False, 9))
+
+    def test_compaction_folds_the_journal_into_the_snapshot(self):
+        self.assertFalse(self.ledger.compact())
+        self.ledger.book("Soumya Chatterjee", "05-12-2025 08:00", 7)
+        self.ledger.cancel("Soumya Chatterjee", "05-12-2025 08:30", 1000082)
+        self.assertTrue(self.ledger.compact())
+
+        self.assertEqual(self.journal_lines(), [])
+        on_disk = {s.key: (s.is_available, s.patient_to_attend) for s in read_slots_csv(self.csv_path)}
+        self.assertEqual(on_disk[("soumya chatterjee", "05-12-2025 08:00")], (False, 7))
+        self.assertEqual(on_disk[("soumya chatterjee", "05-12-2025 08:30")], (True, None))
+
+        # Versions keep counting from the compacted sequence number, here and after a restart.
+        self.assertEqual(self.ledger.book("Dibakar Basu", "05-12-2025 08:00", 8), 3)
+        restarted = self.open()
+        self.assertEqual(restarted.version(), 3)
+        self.assertEqual(state(restarted, "Soumya Chatterjee", "05-12-2025 08:00"), (False, 7))
+        self.assertEqual(state(restarted, "Dibakar Basu", "05-12-2025 08:00"), (False, 8))
+        self.assertEqual(state(self.ledger, "Soumya Chatterjee", "05-12-2025 08:30"), (True, None))
+
+    def test_background_compaction_failures_are_counted(self):
+        before = BACKGROUND_FAILURES._values.get(("journal_compaction",), 0)
+        with mock.patch.object(journal_module, "write_slots_csv", side_effect=OSError("disk full")):
+            ledger = self.open(compact_interval=0.05, compact_min_records=1)
+            ledger.book("Dibakar Basu", "05-12-2025 08:00", 7)
+            deadline = time.monotonic() + 2
+            while BACKGROUND_FAILURES._values.get(("journal_compaction",), 0) == before and time.monotonic() < deadline:
+                time.sleep(0.02)
+            ledger.close()
+        self.assertGreater(BACKGROUND_FAILURES._values.get(("journal_compaction",), 0), before)
+        self.assertEqual(state(self.open(), "Dibakar Basu", "05-12-2025 08:00"), (False, 7))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+"""
+Offline tests for utils.llm_router with FakeChatModel providers.
+
+    python -m pytest -q tests
+"""
+import asyncio
+import time
+import unittest
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+
+from utils.fake_llm import FakeChatModel, FakeProviderError
+from utils.llm_router import RoutedChatModel
+
+
+def counting(reply: str, calls: list):
+    """Responder that records each call; a cancelled call never reaches it."""
+    def respond(messages, options):
+        calls.append(reply)
+        return AIMessage(content=reply)
+    return respond
+
+
+class FailsMidStream(FakeChatModel):
+    """Streams its first token and then fails, like a provider dropping the connection."""
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        chunk = ChatGenerationChunk(message=AIMessageChunk(content="partial "))
+        if run_manager:
+            run_manager.on_llm_new_token("partial ", chunk=chunk)
+        yield chunk
+        raise FakeProviderError("connection dropped")
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        chunk = ChatGenerationChunk(message=AIMessageChunk(content="partial "))
+        if run_manager:
+            await run_manager.on_llm_new_token("partial ", chunk=chunk)
+        yield chunk
+        raise FakeProviderError("connection dropped")
+
+
+class HedgingTest(unittest.IsolatedAsyncioTestCase):
+    async def test_hedge_wins_and_slow_primary_is_cancelled(self):
+        slow_calls, fast_calls = [], []
+        router = RoutedChatModel({
+            "slow": FakeChatModel(latency=1.0, responder=counting("slow", slow_calls)),
+            "fast": FakeChatModel(latency=0.01, responder=counting("fast", fast_calls)),
+        }, hedge_delay=0.05)
+
+        started = time.perf_counter()
+        result = await router.ainvoke("hi")
+        self.assertEqual(result.content, "fast")
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+        await asyncio.sleep(1.2)
+        self.assertEqual(slow_calls, [], "the losing call should have been cancelled before answering")
+        stats = router.stats()["providers"]
+        self.assertEqual((stats["slow"]["lost"], stats["slow"]["calls"]), (1, 0))
+        self.assertEqual((stats["fast"]["hedges"], stats["fast"]["wins"]), (1, 1))
+
+    async def test_no_hedge_when_primary_answers_in_time(self):
+        router = RoutedChatModel({
+            "primary": FakeChatModel(latency=0.01, reply="primary"),
+            "secondary": FakeChatModel(reply="secondary"),
+        }, hedge_delay=0.2)
+        self.assertEqual((await router.ainvoke("hi")).content, "primary")
+        self.assertEqual(router.stats()["providers"]["secondary"]["hedges"], 0)
+
+    def test_sync_hedge_wins(self):
+        router = RoutedChatModel({
+            "slow": FakeChatModel(latency=0.5, reply="slow"),
+            "fast": FakeChatModel(latency=0.01, reply="fast"),
+        }, hedge_delay=0.05)
+        started = time.perf_counter()
+        self.assertEqual(router.invoke("hi").content, "fast")
+        self.assertLess(time.perf_counter() - started, 0.4)
+        self.assertEqual(router.stats()["providers"]["fast"]["wins"], 1)
+
+
+class FailoverTest(unittest.IsolatedAsyncioTestCase):
+    async def test_breaker_trips_fails_over_and_probes_after_cooldown(self):
+        router = RoutedChatModel({
+            "broken": FakeChatModel(failure_rate=1.0),
+            "backup": FakeChatModel(reply="backup"),
+        }, hedge_delay=0, failure_threshold=1, cooldown=0.2)
+        broken = router.providers[0]
+
+        self.assertEqual((await router.ainvoke("hi")).content, "backup")
+        self.assertEqual((broken.calls, broken.trips), (1, 1))
+        self.assertFalse(broken.available())
+
+        # While the breaker is open the broken provider is skipped.
+        self.assertEqual((await router.ainvoke("hi")).content, "backup")
+        self.assertEqual(broken.calls, 1)
+
+        # After the cooldown the probe goes first; its failure reopens the breaker at once.
+        await asyncio.sleep(0.25)
+        self.assertTrue(broken.half_open())
+        self.assertEqual([p.name for p in router.candidates()], ["broken", "backup"])
+        self.assertEqual((await router.ainvoke("hi")).content, "backup")
+        self.assertEqual((broken.calls, broken.trips), (2, 2))
+        self.assertFalse(broken.available())
+
+    async def test_successful_probe_closes_the_breaker(self):
+        flaky = FakeChatModel(failure_rate=1.0, reply="flaky")
+        router = RoutedChatModel({"flaky": flaky, "backup": FakeChatModel(reply="backup")},
+                                 hedge_delay=0, failure_threshold=1, cooldown=0.1)
+        await router.ainvoke("hi")
+        self.assertFalse(router.providers[0].available())
+        flaky.failure_rate = 0.0
+        await asyncio.sleep(0.15)
+        self.assertEqual((await router.ainvoke("hi")).content, "flaky")
+        self.assertFalse(router.providers[0].half_open())
+
+    async def test_every_provider_failing_raises(self):
+        router = RoutedChatModel({
+            "a": FakeChatModel(failure_rate=1.0),
+            "b": FakeChatModel(failure_rate=1.0),
+        }, hedge_delay=0)
+        with self.assertRaises(FakeProviderError):
+            await router.ainvoke("hi")
+
+    async def test_no_failover_after_tokens_were_streamed(self):
+        backup_calls = []
+        router = RoutedChatModel({
+            "flaky": FailsMidStream(),
+            "backup": FakeChatModel(responder=counting("backup", backup_calls)),
+        }, hedge_delay=0)
+        with self.assertRaises(FakeProviderError):
+            await router.ainvoke("hi", stream=True)
+        with self.assertRaises(FakeProviderError):
+            router.invoke("hi", stream=True)
+        self.assertEqual(backup_calls, [])
+
+    def test_providers_ranked_by_error_rate_then_latency(self):
+        router = RoutedChatModel({
+            "first": FakeChatModel(latency=0.05, reply="first"),
+            "second": FakeChatModel(latency=0.01, reply="second"),
+            "third": FakeChatModel(failure_rate=1.0),
+        }, hedge_delay=0, failure_threshold=0)
+        self.assertEqual([p.name for p in router.candidates()], ["first", "second", "third"])
+        first, second, third = router.providers
+        first.record(0.05, True)
+        second.record(0.01, True)
+        third.record(0.001, False)
+        self.assertEqual([p.name for p in router.candidates()], ["second", "first", "third"])
+        second.record(0.01, False)
+        self.assertEqual([p.name for p in router.candidates()], ["first", "second", "third"])
+
+    def test_demoted_provider_returns_to_its_place_after_the_horizon(self):
+        router = RoutedChatModel({"first": FakeChatModel(), "second": FakeChatModel()},
+                                 hedge_delay=0, failure_threshold=0, horizon=0.1)
+        first, second = router.providers
+        first.record(0.01, False)
+        second.record(0.01, True)
+        self.assertEqual([p.name for p in router.candidates()], ["second", "first"])
+        time.sleep(0.15)
+        self.assertEqual([p.name for p in router.candidates()], ["first", "second"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+Tests for utils.prefilter: direct tool calls and the prefilter's counters.
+
+    python -m pytest -q tests
+"""
+import unittest
+
+from utils.prefilter import QueryPrefilter, parse_direct_call
+
+
+class ParseDirectCallTest(unittest.TestCase):
+    def test_fully_specified_requests(self):
+        call = parse_direct_call("slots for Md. Saifur Rahman on 07-12-2025")
+        self.assertEqual((call.tool, call.args["doctor_name"]), ("check_availability_by_doctor", "Md. Saifur Rahman"))
+        call = parse_direct_call("book Dr. Isha Roy on 07-12-2025 10:30")
+        self.assertEqual(call.tool, "book_appointment")
+        self.assertEqual(call.args["appointment_datetime"], {"datetime": "07-12-2025 10:30"})
+
+    def test_questions_and_vague_requests_are_left_to_the_agent(self):
+        for query in (
+            "can I book Isha Roy on 07-12-2025 10:30?",
+            "should I cancel my appointment with Isha Roy on 07-12-2025 10:30",
+            "book Isha Roy tomorrow",
+            "where do I park for Isha Roy on 07-12-2025?",
+        ):
+            self.assertIsNone(parse_direct_call(query), query)
+
+
+class QueryPrefilterStatsTest(unittest.TestCase):
+    def test_direct_hits_are_counted_once_when_recorded(self):
+        prefilter = QueryPrefilter(threshold=0.8)
+        call = prefilter.direct("slots for Isha Roy on 07-12-2025")
+        self.assertIsNotNone(call)
+        self.assertEqual(prefilter.stats()["total"], 0)
+
+        # A direct call whose tool failed falls back to classify() and is only counted there.
+        prefilter.classify("slots for Isha Roy on 07-12-2025")
+        prefilter.record_direct(call)
+        stats = prefilter.stats()
+        self.assertEqual((stats["total"], stats["direct"], stats["supervisor"]), (2, 1, 1))
+        self.assertEqual(stats["intents"], {"domain": 1, "direct_availability": 1})
+        self.assertEqual(stats["hit_rate"], 1.0)
+
+    def test_off_topic_questions_naming_a_doctor_fall_back(self):
+        prefilter = QueryPrefilter(threshold=0.8)
+        self.assertIsNone(prefilter.classify("how much does Isha Roy charge for a visit").route)
+        self.assertEqual(prefilter.classify("hello").route, "end")
+        self.assertEqual(prefilter.stats()["fallback"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+Tests for db.slots.SlotLedger against a throwaway SQLite database.
+
+    python -m pytest -q tests
+"""
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from sqlalchemy.exc import OperationalError
+
+from db import slots as slots_module
+from db.database import Base, engine
+from db.models import AvailabilitySlot, SlotGeneration
+from db.slots import SlotLedger
+from toolkit.slots import Slot, write_slots_csv
+
+SLOTS = [
+    Slot("05-12-2025 08:00", "general_dentist", "Soumya Chatterjee", True),
+    Slot("05-12-2025 08:30", "general_dentist", "Soumya Chatterjee", False, 1000082),
+    Slot("05-12-2025 09:00", "general_dentist", "Soumya Chatterjee", True),
+    Slot("05-12-2025 08:00", "orthodontist", "Dibakar Basu", True),
+]
+
+
+class SlotLedgerTest(unittest.TestCase):
+    def setUp(self):
+        tables = [AvailabilitySlot.__table__, SlotGeneration.__table__]
+        Base.metadata.drop_all(bind=engine, tables=tables)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp.name, "doctor_availability.csv")
+        write_slots_csv(self.csv_path, SLOTS)
+        self.ledger = SlotLedger(csv_path=self.csv_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def state(self, doctor_name: str, date_slot: str) -> tuple:
+        slot = next(s for s in self.ledger.load_range("main", 0, 2**40)
+                    if s.doctor_name == doctor_name and s.date_slot == date_slot)
+        return slot.is_available, slot.patient_to_attend
+
+    def test_seeds_once(self):
+        SlotLedger(csv_path=self.csv_path)
+        self.assertEqual(len(self.ledger.load_range("main", 0, 2**40)), len(SLOTS))
+        self.assertEqual([e.open_slots for e in self.ledger.catalog()], [2, 1])
+
+    def test_seeding_retries_when_the_database_is_locked(self):
+        Base.metadata.drop_all(bind=engine, tables=[AvailabilitySlot.__table__, SlotGeneration.__table__])
+        real_import = slots_module.import_slots_from_csv
+        calls = []
+
+        def locked_once(db, csv_path):
+            calls.append(csv_path)
+            if len(calls) == 1:
+                raise OperationalError("INSERT", {}, Exception("database is locked"))
+            return real_import(db, csv_path)
+
+        with mock.patch.object(slots_module, "import_slots_from_csv", locked_once):
+            ledger = SlotLedger(csv_path=self.csv_path)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(ledger.load_range("main", 0, 2**40)), len(SLOTS))
+
+    def test_book_only_succeeds_while_the_slot_is_free(self):
+        version = self.ledger.version()
+        self.assertEqual(self.ledger.book("soumya chatterjee", "05-12-2025 08:00", 7), version + 1)
+        self.assertIsNone(self.ledger.book("Soumya Chatterjee", "05-12-2025 08:00", 8))
+        self.assertIsNone(self.ledger.book("Soumya Chatterjee", "05-12-2025 10:00", 8))
+        self.assertEqual(self.state("Soumya Chatterjee", "05-12-2025 08:00"), (False, 7))
+        self.assertEqual(self.ledger.version(), version + 1)
+
+    def test_cancel_requires_the_booking_patient(self):
+        self.assertIsNone(self.ledger.cancel("Soumya Chatterjee", "05-12-2025 08:30", 7))
+        self.assertIsNone(self.ledger.cancel("Soumya Chatterjee", "05-12-2025 08:00", 1000082))
+        self.assertIsNotNone(self.ledger.cancel("Soumya Chatterjee", "05-12-2025 08:30", 1000082))
+        self.assertEqual(self.state("Soumya Chatterjee", "05-12-2025 08:30"), (True, None))
+
+    def test_concurrent_bookings_of_one_slot_have_one_winner(self):
+        results, barrier = [], threading.Barrier(8)
+
+        def book(patient_id):
+            barrier.wait()
+            results.append(self.ledger.book("Dibakar Basu", "05-12-2025 08:00", patient_id))
+
+        threads = [threading.Thread(target=book, args=(patient_id,)) for patient_id in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(result is not None for result in results), 1)
+        self.assertFalse(self.state("Dibakar Basu", "05-12-2025 08:00")[0])
+
+    def test_reschedule_moves_the_booking(self):
+        version = self.ledger.version()
+        outcome = self.ledger.reschedule("Soumya Chatterjee", "05-12-2025 08:30", "05-12-2025 09:00", 1000082)
+        self.assertEqual(outcome, ("ok", version + 1))
+        self.assertEqual(self.state("Soumya Chatterjee", "05-12-2025 08:30"), (True, None))
+        self.assertEqual(self.state("Soumya Chatterjee", "05-12-2025 09:00"), (False, 1000082))
+
+    def test_failed_reschedule_keeps_the_old_booking(self):
+        self.ledger.book("Soumya Chatterjee", "05-12-2025 09:00", 5)
+        version = self.ledger.version()
+        self.assertEqual(
+            self.ledger.reschedule("Soumya Chatterjee", "05-12-2025 08:30", "05-12-2025 09:00", 1000082),
+            ("unavailable", None),
+        )
+        self.assertEqual(
+            self.ledger.reschedule("Soumya Chatterjee", "05-12-2025 08:30", "05-12-2025 08:30", 1000082),
+            ("unavailable", None),
+        )
+        self.assertEqual(
+            self.ledger.reschedule("Soumya Chatterjee", "05-12-2025 08:00", "05-12-2025 09:00", 1000082),
+            ("no_appointment", None),
+        )
+        self.assertEqual(self.state("Soumya Chatterjee", "05-12-2025 08:30"), (False, 1000082))
+        self.assertEqual(self.state("Soumya Chatterjee", "05-12-2025 09:00"), (False, 5))
+        self.assertEqual(self.ledger.version(), version)
+
+
+if __name__ == "__main__":
+    unittest.main()
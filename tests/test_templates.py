@@ -0,0 +1,55 @@
+"""
+Tests for toolkit.templates.ScheduleTemplate's closed-form slot counts.
+
+    python -m pytest -q tests
+"""
+import random
+import unittest
+
+from toolkit.slots import SECONDS_PER_DAY, parse_date_slot
+from toolkit.templates import ScheduleTemplate
+
+DAY = SECONDS_PER_DAY
+START = parse_date_slot("05-12-2025 00:00")
+
+
+def walked(template: ScheduleTemplate) -> tuple:
+    """count_slots(), first_slot() and last_slot() computed by visiting every day."""
+    days = [d for d in range(template.valid_from, template.valid_until + 1, DAY) if template.day_offsets(d)]
+    if not days:
+        return 0, None, None
+    count = sum(len(template.day_offsets(d)) for d in days)
+    return count, days[0] + template.day_offsets(days[0])[0], days[-1] + template.day_offsets(days[-1])[-1]
+
+
+class ScheduleTemplateTest(unittest.TestCase):
+    def test_matches_a_day_by_day_walk(self):
+        rng = random.Random(7)
+        for _ in range(500):
+            weekly = {
+                weekday: [(480, 480 + 30 * rng.randint(0, 8))]
+                for weekday in range(7) if rng.random() < 0.4
+            }
+            valid_from = START + rng.randint(0, 30) * DAY
+            closed = []
+            for _ in range(rng.randint(0, 4)):
+                first = valid_from + rng.randint(-10, 120) * DAY
+                closed.append((first, first + rng.randint(0, 20) * DAY))
+            overrides = {
+                valid_from + rng.randint(-5, 120) * DAY: [(600, 600 + 30 * rng.randint(0, 3))]
+                for _ in range(rng.randint(0, 4))
+            }
+            template = ScheduleTemplate("Isha Roy", "oral_surgeon", "main", weekly, valid_from,
+                                        valid_from + rng.randint(-2, 110) * DAY, 30, closed, overrides)
+            self.assertEqual((template.count_slots(), template.first_slot(), template.last_slot()), walked(template))
+
+    def test_leave_at_both_ends_of_a_long_horizon(self):
+        template = ScheduleTemplate(
+            "Isha Roy", "oral_surgeon", "main", {0: [(480, 540)]},
+            START, START + 3650 * DAY, closed=[(START, START + 30 * DAY), (START + 3600 * DAY, START + 3650 * DAY)],
+        )
+        self.assertEqual((template.count_slots(), template.first_slot(), template.last_slot()), walked(template))
+
+
+if __name__ == "__main__":
+    unittest.main()
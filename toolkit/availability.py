@@ -0,0 +1,399 @@
+import heapq
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from typing import Optional
+from db.database import SessionLocal
+from db.slots import SlotLedger
+from db.bookings import TemplateLedger
+from toolkit.journal import JournalLedger
+from toolkit.templates import TEMPLATES_PATH
+from toolkit.slots import Slot, CSV_PATH, DoctorSummary, ReloadGeneration, parse_date_slot, week_start, SECONDS_PER_WEEK
+from settings import settings
+
+
+def _date_ts(date: str) -> Optional[int]:
+    try:
+        return parse_date_slot(f"{date} 00:00")
+    except ValueError:
+        return None
+
+
+class Shard:
+    """
+    Indexes over one clinic's slots for one week.
+
+    Holds hash indexes by (doctor, date) and (specialization, date), sorted
+    lists of available slot timestamps per doctor and per specialization for
+    bisect-based range queries, and open-slot counters per (date, doctor).
+    """
+
+    def __init__(self, key: tuple[str, int], slots: list[Slot]):
+        self.key = key
+        self.slots: dict[tuple, Slot] = {}
+        self.by_doctor_date: dict[tuple, list[Slot]] = {}
+        self.by_spec_date: dict[tuple, list[Slot]] = {}
+        self.date_doctor_open: dict[str, dict[tuple[str, str], int]] = {}
+        self.doctor_times: dict[str, list[int]] = {}
+        self.spec_times: dict[str, list[tuple[int, str]]] = {}
+        for slot in slots:
+            self.slots[slot.key] = slot
+            self.by_doctor_date.setdefault((slot.doctor_name.lower(), slot.date), []).append(slot)
+            self.by_spec_date.setdefault((slot.specialization.lower(), slot.date), []).append(slot)
+            counts = self.date_doctor_open.setdefault(slot.date, {})
+            counts.setdefault((slot.doctor_name, slot.specialization), 0)
+            if slot.is_available:
+                counts[(slot.doctor_name, slot.specialization)] += 1
+                self.doctor_times.setdefault(slot.doctor_name.lower(), []).append(slot.ts)
+                self.spec_times.setdefault(slot.specialization.lower(), []).append((slot.ts, slot.doctor_name))
+        for times in self.doctor_times.values():
+            times.sort()
+        for times in self.spec_times.values():
+            times.sort()
+
+    def __len__(self):
+        return len(self.slots)
+
+    def set_state(self, slot: Slot, is_available: bool, patient_id: Optional[int]):
+        was_available = slot.is_available
+        slot.is_available = is_available
+        slot.patient_to_attend = patient_id
+        if is_available == was_available:
+            return
+        doctor_times = self.doctor_times.setdefault(slot.doctor_name.lower(), [])
+        spec_times = self.spec_times.setdefault(slot.specialization.lower(), [])
+        self.date_doctor_open[slot.date][(slot.doctor_name, slot.specialization)] += 1 if is_available else -1
+        if is_available:
+            insort(doctor_times, slot.ts)
+            insort(spec_times, (slot.ts, slot.doctor_name))
+        else:
+            del doctor_times[bisect_left(doctor_times, slot.ts)]
+            del spec_times[bisect_left(spec_times, (slot.ts, slot.doctor_name))]
+
+    def window(self, start_ts: int, end_ts: int, doctor: Optional[str] = None,
+               specialization: Optional[str] = None) -> list[tuple[int, Optional[str]]]:
+        """Available (timestamp, doctor) in [start_ts, end_ts] for one doctor or one specialization, sorted."""
+        if doctor:
+            times = self.doctor_times.get(doctor.lower(), [])
+            return [(ts, None) for ts in times[bisect_left(times, start_ts):bisect_right(times, end_ts)]]
+        times = self.spec_times.get(specialization.lower(), [])
+        return times[bisect_left(times, (start_ts,)):bisect_left(times, (end_ts + 1,))]
+
+
+class AvailabilityStore:
+    """
+    Process-wide, indexed view of the doctor availability data.
+
+    Slots are partitioned into shards by clinic and week. Shards are loaded
+    from the ledger on first use and kept in an LRU; once more than max_rows
+    slots are resident the coldest shards are evicted, so memory and latency
+    track the queried window rather than the whole schedule. Range and
+    listing queries fan out over the shards they touch and merge the results.
+
+    The ledger's doctor catalog provides per-doctor and per-specialization
+    open-slot counters without loading any slots; they are adjusted in O(1)
+    on every booking change and verify_aggregates() checks them against a
+    full recount.
+
+    Each access compares the ledger generation and drops all cached state
+    only when another process changed it; this process's own mutations are
+    applied in place unless the ledger answers with a ReloadGeneration.
+    """
+
+    def __init__(self, ledger, max_rows: int = 50000):
+        self.ledger = ledger
+        self.max_rows = max_rows
+        self._lock = threading.RLock()
+        self._version = None
+        self._shards: OrderedDict[tuple[str, int], Shard] = OrderedDict()
+        self._resident_rows = 0
+        self._doctors: dict[str, DoctorSummary] = {}
+        self._doctor_open: dict[str, int] = {}
+        self._spec_open: dict[str, int] = {}
+        self.shard_loads = 0
+        self.shard_evictions = 0
+
+    def _load(self, version):
+        catalog = self.ledger.catalog()
+        self._shards = OrderedDict()
+        self._resident_rows = 0
+        self._doctors = {}
+        self._doctor_open = {}
+        self._spec_open = {}
+        for entry in catalog:
+            self._doctors[entry.doctor_name.lower()] = entry
+            self._doctor_open[entry.doctor_name] = entry.open_slots
+            self._spec_open[entry.specialization] = self._spec_open.get(entry.specialization, 0) + entry.open_slots
+        self._version = version
+
+    def refresh(self):
+        with self._lock:
+            version = self.ledger.version()
+            if version != self._version:
+                self._load(version)
+
+    def generation(self):
+        """Current ledger version; changes whenever slot state changes."""
+        with self._lock:
+            self.refresh()
+            return self._version
+
+    # Shards
+
+    def _shard(self, clinic: str, week: int) -> Shard:
+        key = (clinic, week)
+        shard = self._shards.get(key)
+        if shard is None:
+            shard = Shard(key, self.ledger.load_range(clinic, week, week + SECONDS_PER_WEEK))
+            self._shards[key] = shard
+            self._resident_rows += len(shard)
+            self.shard_loads += 1
+        else:
+            self._shards.move_to_end(key)
+        return shard
+
+    def _evict(self):
+        # The most recently used shard always stays resident.
+        while self._resident_rows > self.max_rows and len(self._shards) > 1:
+            _, shard = self._shards.popitem(last=False)
+            self._resident_rows -= len(shard)
+            self.shard_evictions += 1
+
+    def _entries(self, doctor_name: Optional[str] = None, specialization: Optional[str] = None) -> list[DoctorSummary]:
+        if doctor_name:
+            entry = self._doctors.get(doctor_name.lower())
+            return [entry] if entry else []
+        if specialization:
+            return [e for e in self._doctors.values() if e.specialization.lower() == specialization.lower()]
+        return list(self._doctors.values())
+
+    def _clinics(self, doctor_name: Optional[str] = None, specialization: Optional[str] = None) -> list[str]:
+        return list(dict.fromkeys(e.clinic for e in self._entries(doctor_name, specialization)))
+
+    def _weeks(self, start_ts: int, end_ts: int):
+        week = week_start(start_ts)
+        while week <= end_ts:
+            yield week
+            week += SECONDS_PER_WEEK
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "resident_shards": len(self._shards),
+                "resident_rows": self._resident_rows,
+                "max_rows": self.max_rows,
+                "shard_loads": self.shard_loads,
+                "shard_evictions": self.shard_evictions,
+            }
+
+    # Read queries
+
+    def available_times(self, doctor_name: str, date: str) -> list[str]:
+        with self._lock:
+            self.refresh()
+            day = _date_ts(date)
+            clinics = self._clinics(doctor_name=doctor_name)
+            if day is None or not clinics:
+                return []
+            shard = self._shard(clinics[0], week_start(day))
+            self._evict()
+            return [s.time for s in shard.by_doctor_date.get((doctor_name.lower(), date), []) if s.is_available]
+
+    def available_by_specialization(self, specialization: str, date: str) -> list[tuple[str, str]]:
+        with self._lock:
+            self.refresh()
+            day = _date_ts(date)
+            if day is None:
+                return []
+            result = []
+            for clinic in self._clinics(specialization=specialization):
+                shard = self._shard(clinic, week_start(day))
+                result.extend(
+                    (s.doctor_name, s.time)
+                    for s in shard.by_spec_date.get((specialization.lower(), date), []) if s.is_available
+                )
+            self._evict()
+            return result
+
+    def available_doctors_on_date(self, date: str) -> list[tuple[str, str]]:
+        with self._lock:
+            self.refresh()
+            day = _date_ts(date)
+            if day is None:
+                return []
+            result = []
+            for clinic in self._clinics():
+                shard = self._shard(clinic, week_start(day))
+                result.extend(doctor for doctor, count in shard.date_doctor_open.get(date, {}).items() if count > 0)
+            self._evict()
+            return result
+
+    def available_doctors(self) -> list[str]:
+        with self._lock:
+            self.refresh()
+            return [doctor for doctor, count in self._doctor_open.items() if count > 0]
+
+    def available_specializations(self) -> list[str]:
+        with self._lock:
+            self.refresh()
+            return [spec for spec, count in self._spec_open.items() if count > 0]
+
+    def verify_aggregates(self) -> list[str]:
+        """Recount open slots from scratch and return a description of every counter that disagrees."""
+        with self._lock:
+            doctor_open, spec_open = {}, {}
+            for entry in self.ledger.catalog():
+                doctor_open[entry.doctor_name] = entry.open_slots
+                spec_open[entry.specialization] = spec_open.get(entry.specialization, 0) + entry.open_slots
+
+            mismatches = []
+            for name, expected, actual in (
+                ("doctor", doctor_open, self._doctor_open),
+                ("specialization", spec_open, self._spec_open),
+            ):
+                for key in expected.keys() | actual.keys():
+                    if actual.get(key) != expected.get(key):
+                        mismatches.append(f"{name} {key}: counter {actual.get(key)}, recount {expected.get(key)}")
+            for (clinic, week), shard in self._shards.items():
+                recount = {}
+                for slot in shard.slots.values():
+                    counts = recount.setdefault(slot.date, {})
+                    key = (slot.doctor_name, slot.specialization)
+                    counts[key] = counts.get(key, 0) + int(slot.is_available)
+                if recount != shard.date_doctor_open:
+                    mismatches.append(f"shard {clinic}/{week}: per-date counters disagree with recount")
+            return mismatches
+
+    def next_available(self, after_ts: int, doctor_name: Optional[str] = None,
+                       specialization: Optional[str] = None) -> Optional[tuple[int, str]]:
+        """Earliest available (timestamp, doctor) at or after after_ts, optionally for one doctor or specialization."""
+        with self._lock:
+            self.refresh()
+            entries = [
+                e for e in self._entries(doctor_name, specialization)
+                if self._doctor_open[e.doctor_name] > 0 and e.last_ts >= after_ts
+            ]
+            if not entries:
+                return None
+
+            last_ts = max(e.last_ts for e in entries)
+            result = None
+            for week in self._weeks(max(after_ts, min(e.first_ts for e in entries)), last_ts):
+                candidates = []
+                if specialization and not doctor_name:
+                    for clinic in self._clinics(specialization=specialization):
+                        window = self._shard(clinic, week).window(after_ts, last_ts, specialization=specialization)
+                        candidates.extend(window[:1])
+                else:
+                    for entry in entries:
+                        window = self._shard(entry.clinic, week).window(after_ts, last_ts, doctor=entry.doctor_name)
+                        if window:
+                            candidates.append((window[0][0], entry.doctor_name))
+                if candidates:
+                    result = min(candidates)
+                    break
+            self._evict()
+            return result
+
+    def available_in_range(self, start_ts: int, end_ts: int, doctor_name: Optional[str] = None,
+                           specialization: Optional[str] = None) -> list[tuple[int, str, str]]:
+        """Available (timestamp, doctor, specialization) in [start_ts, end_ts], ordered by time."""
+        with self._lock:
+            self.refresh()
+            entries = self._entries(doctor_name, specialization)
+            runs = []
+            for week in self._weeks(start_ts, end_ts):
+                if specialization and not doctor_name:
+                    for clinic in self._clinics(specialization=specialization):
+                        window = self._shard(clinic, week).window(start_ts, end_ts, specialization=specialization)
+                        runs.append([(ts, name, self._doctors[name.lower()].specialization) for ts, name in window])
+                    continue
+                # Heap-merge the per-doctor windows across doctors.
+                for entry in entries:
+                    window = self._shard(entry.clinic, week).window(start_ts, end_ts, doctor=entry.doctor_name)
+                    runs.append([(ts, entry.doctor_name, entry.specialization) for ts, _ in window])
+            self._evict()
+            return list(heapq.merge(*runs))
+
+    # Mutations
+
+    def _apply(self, generation: int, changes: list[tuple]):
+        """Apply a committed mutation, or drop cached state if other writers got in between."""
+        if self._version is None or isinstance(generation, ReloadGeneration) or generation != self._version + 1:
+            self._version = None
+            return
+        for doctor_name, date_slot, is_available, patient_id in changes:
+            entry = self._doctors.get(doctor_name.lower())
+            if entry is None:
+                self._version = None
+                return
+            # The ledger only commits state flips, so the counters move by exactly one.
+            delta = 1 if is_available else -1
+            self._doctor_open[entry.doctor_name] += delta
+            self._spec_open[entry.specialization] += delta
+            shard = self._shards.get((entry.clinic, week_start(parse_date_slot(date_slot))))
+            if shard is not None:
+                slot = shard.slots.get((doctor_name.lower(), date_slot))
+                if slot is not None:
+                    shard.set_state(slot, is_available, patient_id)
+        self._version = generation
+
+    def book(self, doctor_name: str, date_slot: str, patient_id: int) -> bool:
+        with self._lock:
+            generation = self.ledger.book(doctor_name, date_slot, patient_id)
+            if generation is None:
+                return False
+            self._apply(generation, [(doctor_name, date_slot, False, patient_id)])
+            return True
+
+    def cancel(self, doctor_name: str, date_slot: str, patient_id: int) -> bool:
+        with self._lock:
+            generation = self.ledger.cancel(doctor_name, date_slot, patient_id)
+            if generation is None:
+                return False
+            self._apply(generation, [(doctor_name, date_slot, True, None)])
+            return True
+
+    def book_many(self, slots: list[tuple[str, str]], patient_id: int) -> list[tuple[str, str]]:
+        """Book all (doctor_name, date_slot) pairs or none; returns the pairs that were unavailable."""
+        with self._lock:
+            generation, rejected = self.ledger.book_many(slots, patient_id)
+            if generation is not None:
+                self._apply(generation, [(d, s, False, patient_id) for d, s in slots])
+            return rejected
+
+    def cancel_many(self, slots: list[tuple[str, str]], patient_id: int) -> list[tuple[str, str]]:
+        """Cancel all (doctor_name, date_slot) pairs or none; returns the pairs with no matching appointment."""
+        with self._lock:
+            generation, rejected = self.ledger.cancel_many(slots, patient_id)
+            if generation is not None:
+                self._apply(generation, [(d, s, True, None) for d, s in slots])
+            return rejected
+
+    def reschedule(self, doctor_name: str, old_date_slot: str, new_date_slot: str, patient_id: int) -> str:
+        """Returns "ok", "no_appointment" or "unavailable"."""
+        with self._lock:
+            outcome, generation = self.ledger.reschedule(doctor_name, old_date_slot, new_date_slot, patient_id)
+            if outcome == "ok":
+                self._apply(generation, [
+                    (doctor_name, old_date_slot, True, None),
+                    (doctor_name, new_date_slot, False, patient_id),
+                ])
+            return outcome
+
+
+def create_ledger():
+    if settings.SLOT_BACKEND == "journal":
+        return JournalLedger(
+            CSV_PATH,
+            compact_interval=settings.JOURNAL_COMPACT_INTERVAL_SECONDS,
+            compact_min_records=settings.JOURNAL_COMPACT_MIN_RECORDS,
+        )
+    if settings.SLOT_BACKEND == "sqlite":
+        return SlotLedger(SessionLocal, CSV_PATH)
+    if settings.SLOT_BACKEND == "template":
+        return TemplateLedger(SessionLocal, settings.SCHEDULE_TEMPLATES_PATH or TEMPLATES_PATH, CSV_PATH)
+    raise ValueError(f"Unknown SLOT_BACKEND: {settings.SLOT_BACKEND}")
+
+
+availability_store = AvailabilityStore(create_ledger(), max_rows=settings.SHARD_MAX_ROWS)
@@ -0,0 +1,126 @@
+import functools
+import inspect
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+
+def _normalize(value):
+    if hasattr(value, "model_dump"):
+        return _normalize(value.model_dump())
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class ToolResultCache:
+    """
+    LRU cache of tool outputs keyed by (tool name, normalized args, data generation).
+
+    The generation comes from the availability store and changes with every
+    booking mutation, so entries computed against older data are never served
+    and are dropped as soon as a new generation is seen. Concurrent misses for
+    the same key are single-flighted: one caller computes, the rest wait for
+    its result.
+    """
+
+    def __init__(self, generation: Callable[[], object], maxsize: int = 512):
+        self.generation = generation
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._in_flight: dict[tuple, _Flight] = {}
+        self._generation = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get_or_compute(self, name: str, args: dict, compute: Callable[[], object]):
+        if self.maxsize <= 0:
+            return compute()
+        generation = self.generation()
+        key = (name, json.dumps(_normalize(args), sort_keys=True, default=str), generation)
+
+        with self._lock:
+            if generation != self._generation:
+                self.evictions += len(self._entries)
+                self._entries.clear()
+                self._generation = generation
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if not flight.failed:
+                return flight.result
+            return compute()
+
+        try:
+            flight.result = compute()
+        except BaseException:
+            flight.failed = True
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+                if not flight.failed and generation == self._generation:
+                    self._entries[key] = flight.result
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+            flight.done.set()
+        return flight.result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "generation": self._generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+
+def cached_tool(cache: ToolResultCache):
+    """Cache a read-only tool function's output; apply it below @tool."""
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return cache.get_or_compute(func.__name__, dict(bound.arguments), lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,327 @@
+import json
+import os
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Optional
+from toolkit.slots import Slot, CSV_PATH, DoctorSummary, write_slots_csv, parse_date_slot
+from toolkit.snapshot import (
+    AvailabilitySnapshot, load_snapshot, read_snapshot, write_snapshot, snapshot_path_for, source_signature,
+)
+from utils.metrics import BACKGROUND_FAILURES
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking is available
+    fcntl = None
+
+
+def _stat_signature(path: str):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class JournalLedger:
+    """
+    Slot ledger that keeps doctor_availability.csv as the snapshot of record.
+
+    Each booking mutation is appended as one JSON line to a journal file and
+    fsync'd before it is acknowledged, so write cost does not depend on the
+    number of slots. The current state is the snapshot plus the replayed
+    journal. A background compactor periodically folds the journal into a new
+    snapshot, swapped in with an atomic rename, and refreshes the binary
+    ``.snap`` copy so the next cold start can memory-map it.
+
+    Slot state is that columnar snapshot plus a per-row overlay of the states
+    journal records changed, so a cold start only maps the file and replays
+    the journal. The catalog and shard loads are answered from the columns,
+    decoding only the rows a shard covers.
+
+    Records carry a monotonically increasing sequence number which doubles as
+    the ledger version. The snapshot's sequence number lives in a sidecar
+    ``.meta`` file; replaying records already folded into the snapshot is
+    harmless because every record stores absolute slot states.
+    """
+
+    def __init__(self, csv_path: str = CSV_PATH, journal_path: Optional[str] = None,
+                 compact_interval: float = 60, compact_min_records: int = 500):
+        self.csv_path = csv_path
+        self.journal_path = journal_path or os.path.splitext(csv_path)[0] + ".journal"
+        self.meta_path = f"{self.journal_path}.meta"
+        self.lock_path = f"{self.journal_path}.lock"
+        self.compact_min_records = compact_min_records
+
+        self._lock = threading.RLock()
+        self._base: Optional[AvailabilitySnapshot] = None
+        # snapshot row -> (is_available, patient_id) set by journal records
+        self._overrides: dict[int, tuple] = {}
+        self._seq = 0
+        self._snapshot_seq = 0
+        self._snapshot_sig = None
+        self._journal_ino = None
+        self._offset = 0
+        self._pending_records = 0
+        with self._lock:
+            self._load_all()
+
+        self._stop = threading.Event()
+        if compact_interval > 0:
+            threading.Thread(target=self._compact_loop, args=(compact_interval,), daemon=True,
+                             name="journal-compactor").start()
+
+    # Replay
+
+    def _read_meta(self) -> int:
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _load_all(self):
+        self._snapshot_sig = _stat_signature(self.csv_path)
+        self._base = load_snapshot(self.csv_path)
+        self._overrides = {}
+        self._snapshot_seq = self._read_meta()
+        self._seq = self._snapshot_seq
+        self._journal_ino = None
+        self._offset = 0
+        self._pending_records = 0
+        self._replay()
+
+    def _row(self, doctor_name: str, date_slot: str) -> Optional[int]:
+        try:
+            return self._base.find(doctor_name, parse_date_slot(date_slot))
+        except ValueError:
+            return None
+
+    def _get(self, doctor_name: str, date_slot: str) -> Optional[Slot]:
+        row = self._row(doctor_name, date_slot)
+        if row is None:
+            return None
+        return self._base.to_slots(np.array([row]), self._overrides)[0]
+
+    def _apply_changes(self, changes: list):
+        for doctor_name, date_slot, is_available, patient_id in changes:
+            row = self._row(doctor_name, date_slot)
+            if row is not None:
+                self._overrides[row] = (is_available, patient_id)
+
+    def _replay(self, truncate_torn: bool = False):
+        """Apply journal records written since the last replay, by this or another process."""
+        if _stat_signature(self.csv_path) != self._snapshot_sig:
+            self._load_all()
+            return
+        journal_sig = _stat_signature(self.journal_path)
+        if journal_sig is None:
+            return
+        if self._journal_ino is not None and journal_sig[0] != self._journal_ino:
+            # The journal was swapped by a compaction in another process.
+            self._load_all()
+            return
+        self._journal_ino = journal_sig[0]
+        if journal_sig[2] == self._offset:
+            return
+
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record["seq"] > self._seq:
+                self._apply_changes(record["changes"])
+                self._seq = record["seq"]
+                self._pending_records += 1
+        self._offset += complete
+
+        if truncate_torn and complete < len(data):
+            # A writer crashed mid-record; drop the partial line before appending.
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(self._offset)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                self._replay(truncate_torn=True)
+                yield
+                return
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._replay(truncate_torn=True)
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _append(self, changes: list) -> int:
+        seq = self._seq + 1
+        line = (json.dumps({"seq": seq, "changes": changes}) + "\n").encode("utf-8")
+        with open(self.journal_path, "ab") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self._apply_changes(changes)
+        self._seq = seq
+        self._pending_records += 1
+        self._journal_ino = os.stat(self.journal_path).st_ino
+        self._offset += len(line)
+        return seq
+
+    # Ledger interface
+
+    def version(self) -> int:
+        with self._lock:
+            self._replay()
+            return self._seq
+
+    def catalog(self) -> list[DoctorSummary]:
+        with self._lock:
+            self._replay()
+            return self._base.summaries(self._overrides)
+
+    def load_range(self, clinic: str, start_ts: int, end_ts: int) -> list[Slot]:
+        """Slots of one clinic with start_ts <= slot time < end_ts."""
+        with self._lock:
+            self._replay()
+            return self._base.to_slots(self._base.rows_in_range(clinic, start_ts, end_ts), self._overrides)
+
+    def book(self, doctor_name: str, date_slot: str, patient_id: int):
+        with self._locked():
+            slot = self._get(doctor_name, date_slot)
+            if slot is None or not slot.is_available:
+                return None
+            return self._append([[slot.doctor_name, date_slot, False, patient_id]])
+
+    def cancel(self, doctor_name: str, date_slot: str, patient_id: int):
+        with self._locked():
+            slot = self._get(doctor_name, date_slot)
+            if slot is None or slot.is_available or slot.patient_to_attend != patient_id:
+                return None
+            return self._append([[slot.doctor_name, date_slot, True, None]])
+
+    def book_many(self, slots: list[tuple[str, str]], patient_id: int):
+        """Book every (doctor_name, date_slot) as one journal record, or none of them. Returns (version, rejected)."""
+        with self._locked():
+            changes, rejected, seen = [], [], set()
+            for doctor_name, date_slot in slots:
+                slot = self._get(doctor_name, date_slot)
+                if slot is None or not slot.is_available or slot.key in seen:
+                    rejected.append((doctor_name, date_slot))
+                    continue
+                seen.add(slot.key)
+                changes.append([slot.doctor_name, date_slot, False, patient_id])
+            if rejected or not changes:
+                return None, rejected
+            return self._append(changes), []
+
+    def cancel_many(self, slots: list[tuple[str, str]], patient_id: int):
+        """Cancel every (doctor_name, date_slot) as one journal record, or none of them. Returns (version, rejected)."""
+        with self._locked():
+            changes, rejected, seen = [], [], set()
+            for doctor_name, date_slot in slots:
+                slot = self._get(doctor_name, date_slot)
+                if slot is None or slot.is_available or slot.patient_to_attend != patient_id or slot.key in seen:
+                    rejected.append((doctor_name, date_slot))
+                    continue
+                seen.add(slot.key)
+                changes.append([slot.doctor_name, date_slot, True, None])
+            if rejected or not changes:
+                return None, rejected
+            return self._append(changes), []
+
+    def reschedule(self, doctor_name: str, old_date_slot: str, new_date_slot: str, patient_id: int):
+        """Returns (outcome, version) where outcome is "ok", "no_appointment" or "unavailable"."""
+        with self._locked():
+            old_slot = self._get(doctor_name, old_date_slot)
+            new_slot = self._get(doctor_name, new_date_slot)
+            if old_slot is None or old_slot.is_available or old_slot.patient_to_attend != patient_id:
+                return "no_appointment", None
+            if new_slot is None or not new_slot.is_available:
+                return "unavailable", None
+            return "ok", self._append([
+                [old_slot.doctor_name, old_date_slot, True, None],
+                [new_slot.doctor_name, new_date_slot, False, patient_id],
+            ])
+
+    # Compaction
+
+    def compact(self) -> bool:
+        """Fold the journal into a new snapshot. Returns False if there was nothing to fold."""
+        with self._locked():
+            if self._seq == self._snapshot_seq:
+                return False
+            seq = self._seq
+            base, overrides = self._base, dict(self._overrides)
+
+        # Decode and serialize outside the lock so writers are only blocked for the swap.
+        slots = base.to_slots(overrides=overrides)
+        staging_path = f"{self.csv_path}.compact"
+        write_slots_csv(staging_path, slots)
+
+        with self._locked():
+            if self._snapshot_seq >= seq:
+                os.remove(staging_path)
+                return False
+            os.replace(staging_path, self.csv_path)
+            snapshot_path = snapshot_path_for(self.csv_path)
+            write_snapshot(snapshot_path, slots, source_signature(self.csv_path))
+
+            meta_tmp = f"{self.meta_path}.tmp"
+            with open(meta_tmp, "w", encoding="utf-8") as f:
+                f.write(str(seq))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(meta_tmp, self.meta_path)
+
+            remaining = []
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "rb") as f:
+                    for line in f.read()[:self._offset].splitlines(keepends=True):
+                        try:
+                            if json.loads(line)["seq"] > seq:
+                                remaining.append(line)
+                        except ValueError:
+                            continue
+            journal_tmp = f"{self.journal_path}.tmp"
+            with open(journal_tmp, "wb") as f:
+                f.writelines(remaining)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(journal_tmp, self.journal_path)
+
+            if base is self._base:
+                # The new snapshot keeps the row order, so overrides carry over minus those it already holds.
+                self._base = read_snapshot(snapshot_path)
+                rows = sorted(self._overrides)
+                folded = self._base.to_slots(np.array(rows, dtype=np.int64))
+                self._overrides = {
+                    row: self._overrides[row] for row, slot in zip(rows, folded)
+                    if self._overrides[row] != (slot.is_available, slot.patient_to_attend)
+                }
+            self._snapshot_sig = _stat_signature(self.csv_path)
+            self._snapshot_seq = seq
+            self._journal_ino = os.stat(self.journal_path).st_ino
+            self._offset = sum(len(line) for line in remaining)
+            self._pending_records = len(remaining)
+            return True
+
+    def _compact_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            if self._pending_records < self.compact_min_records:
+                continue
+            try:
+                self.compact()
+            except Exception as e:
+                BACKGROUND_FAILURES.inc(task="journal_compaction")
+                print(f"Journal compaction failed: {e}")
+
+    def close(self):
+        self._stop.set()
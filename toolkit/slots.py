@@ -0,0 +1,137 @@
+import calendar
+import csv
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_PATH = os.path.join(BASE_DIR, "data", "doctor_availability.csv")
+
+CSV_COLUMNS = ["date_slot", "specialization", "doctor_name", "is_available", "patient_to_attend"]
+DATE_SLOT_FORMAT = "%d-%m-%Y %H:%M"
+DEFAULT_CLINIC = "main"
+SECONDS_PER_DAY = 24 * 60 * 60
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+
+
+@dataclass
+class Slot:
+    date_slot: str
+    specialization: str
+    doctor_name: str
+    is_available: bool
+    patient_to_attend: Optional[int] = None
+    clinic: str = DEFAULT_CLINIC
+    ts: Optional[int] = field(default=None, compare=False)
+
+    def __post_init__(self):
+        if self.ts is None:
+            self.ts = parse_date_slot(self.date_slot)
+
+    @property
+    def date(self) -> str:
+        return self.date_slot.split(' ')[0]
+
+    @property
+    def time(self) -> str:
+        return self.date_slot.split(' ')[-1]
+
+    @property
+    def key(self) -> tuple:
+        return (self.doctor_name.lower(), self.date_slot)
+
+
+class DoctorSummary(NamedTuple):
+    """Per-doctor catalog entry a ledger reports without loading the doctor's slots."""
+    clinic: str
+    doctor_name: str
+    specialization: str
+    open_slots: int
+    first_ts: int
+    last_ts: int
+
+
+class ReloadGeneration(int):
+    """
+    Generation a ledger mutation returns when its effect can't be applied to
+    cached views in place, e.g. cancelling a booking that no longer matches a
+    slot in the schedule; callers reload from the ledger instead.
+    """
+
+
+def summarize_slots(slots) -> list[DoctorSummary]:
+    summaries = {}
+    for s in slots:
+        entry = summaries.get(s.doctor_name.lower())
+        if entry is None:
+            summaries[s.doctor_name.lower()] = DoctorSummary(s.clinic, s.doctor_name, s.specialization, int(s.is_available), s.ts, s.ts)
+        else:
+            summaries[s.doctor_name.lower()] = entry._replace(
+                open_slots=entry.open_slots + int(s.is_available),
+                first_ts=min(entry.first_ts, s.ts),
+                last_ts=max(entry.last_ts, s.ts),
+            )
+    return list(summaries.values())
+
+
+def parse_date_slot(date_slot: str) -> int:
+    """Convert a "DD-MM-YYYY HH:MM" slot string to seconds since the epoch (slots are naive, treated as UTC)."""
+    return calendar.timegm(datetime.strptime(date_slot, DATE_SLOT_FORMAT).timetuple())
+
+
+def format_date_slot(ts: int) -> str:
+    return datetime.fromtimestamp(int(ts), timezone.utc).strftime(DATE_SLOT_FORMAT)
+
+
+def week_start(ts: int) -> int:
+    """Timestamp of 00:00 on the Monday of the week containing ts."""
+    days = ts // SECONDS_PER_DAY
+    # The epoch fell on a Thursday.
+    return (days - (days + 3) % 7) * SECONDS_PER_DAY
+
+
+def parse_patient_id(value) -> Optional[int]:
+    if value is None or str(value).strip() in ("", "nan", "None"):
+        return None
+    return int(float(value))
+
+
+def read_slots_csv(path: str) -> list[Slot]:
+    """Read slots from the availability CSV; the clinic column is optional."""
+    slots = []
+    parsed = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        missing = [c for c in CSV_COLUMNS if c not in (reader.fieldnames or [])]
+        if missing:
+            raise KeyError(missing[0])
+        for row in reader:
+            date_slot = row["date_slot"].strip()
+            if date_slot not in parsed:
+                parsed[date_slot] = parse_date_slot(date_slot)
+            slots.append(Slot(
+                date_slot=date_slot,
+                specialization=row["specialization"].strip(),
+                doctor_name=row["doctor_name"].strip(),
+                is_available=row["is_available"].strip().lower() == "true",
+                patient_to_attend=parse_patient_id(row["patient_to_attend"]),
+                clinic=(row.get("clinic") or DEFAULT_CLINIC).strip(),
+                ts=parsed[date_slot],
+            ))
+    return slots
+
+
+def write_slots_csv(path: str, slots: list[Slot]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS + ["clinic"])
+        for s in slots:
+            writer.writerow([
+                s.date_slot, s.specialization, s.doctor_name, s.is_available,
+                "" if s.patient_to_attend is None else s.patient_to_attend, s.clinic,
+            ])
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
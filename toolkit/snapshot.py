@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import struct
+import numpy as np
+from typing import Optional
+from toolkit.slots import Slot, CSV_PATH, DoctorSummary, read_slots_csv, format_date_slot
+
+MAGIC = b"DOCSNAP2"
+ALIGNMENT = 64
+NO_PATIENT = -1
+
+# column name -> dtype; "available" is a packed bitmap, one bit per row
+COLUMNS = {
+    "ts": np.int64,
+    "doctor": np.uint16,
+    "specialization": np.uint8,
+    "clinic": np.uint8,
+    "available": np.uint8,
+    "patient": np.int32,
+}
+
+
+def snapshot_path_for(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".snap"
+
+
+def source_signature(csv_path: str) -> Optional[dict]:
+    try:
+        stat = os.stat(csv_path)
+    except FileNotFoundError:
+        return None
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class AvailabilitySnapshot:
+    """
+    Columnar, memory-mapped view of the availability data.
+
+    Slot times are int64 epoch seconds, doctors, specializations and clinics
+    are dictionary-encoded, availability is a packed bitmap and patient IDs are
+    int32 with -1 for free slots.
+    """
+
+    def __init__(self, header: dict, columns: dict):
+        self.header = header
+        self.rows = header["rows"]
+        self.doctors = header["doctors"]
+        self.specializations = header["specializations"]
+        self.clinics = header["clinics"]
+        self.ts = columns["ts"]
+        self.doctor = columns["doctor"]
+        self.specialization = columns["specialization"]
+        self.clinic = columns["clinic"]
+        self.available_bits = columns["available"]
+        self.patient = columns["patient"]
+        self._doctor_codes = {name.lower(): code for code, name in enumerate(self.doctors)}
+        # (doctor code, slot time) -> row, so point lookups don't scan the columns.
+        self._rows: dict[tuple[int, int], int] = {}
+        for row, key in enumerate(zip(self.doctor.tolist(), self.ts.tolist())):
+            self._rows.setdefault(key, row)
+
+    @property
+    def available(self) -> np.ndarray:
+        return np.unpackbits(self.available_bits, count=self.rows).astype(bool)
+
+    def find(self, doctor_name: str, ts: int) -> Optional[int]:
+        """Row of the doctor's slot at ts, or None."""
+        code = self._doctor_codes.get(doctor_name.lower())
+        if code is None:
+            return None
+        return self._rows.get((code, ts))
+
+    def rows_in_range(self, clinic: str, start_ts: int, end_ts: int) -> np.ndarray:
+        """Rows of one clinic with start_ts <= slot time < end_ts, in file order."""
+        if clinic not in self.clinics:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero((self.clinic == self.clinics.index(clinic)) & (self.ts >= start_ts) & (self.ts < end_ts))
+
+    def available_at(self, rows: np.ndarray) -> np.ndarray:
+        """Availability bits of the given rows, read without unpacking the whole bitmap."""
+        return ((self.available_bits[rows >> 3] >> (7 - (rows & 7))) & 1).astype(bool)
+
+    def summaries(self, overrides: Optional[dict] = None) -> list[DoctorSummary]:
+        """Per-doctor catalog computed from the columns; overrides maps a row to its current (is_available, patient)."""
+        available = self.available
+        if overrides:
+            available[list(overrides)] = [state[0] for state in overrides.values()]
+        count = len(self.doctors)
+        open_slots = np.bincount(self.doctor, weights=available, minlength=count)
+        first_ts = np.full(count, np.iinfo(np.int64).max)
+        last_ts = np.full(count, np.iinfo(np.int64).min)
+        np.minimum.at(first_ts, self.doctor, self.ts)
+        np.maximum.at(last_ts, self.doctor, self.ts)
+        # Doctor codes follow first appearance, so this keeps the file's doctor order.
+        codes, first_rows = np.unique(self.doctor, return_index=True)
+        return [
+            DoctorSummary(
+                self.clinics[self.clinic[row]], self.doctors[code], self.specializations[self.specialization[row]],
+                int(open_slots[code]), int(first_ts[code]), int(last_ts[code]),
+            )
+            for code, row in zip(codes.tolist(), first_rows.tolist())
+        ]
+
+    def to_slots(self, rows: Optional[np.ndarray] = None, overrides: Optional[dict] = None) -> list[Slot]:
+        """Decode rows (all of them by default) into Slot objects, applying overrides as in summaries()."""
+        rows = np.arange(self.rows) if rows is None else np.asarray(rows, dtype=np.int64)
+        # Only a few hundred distinct slot times exist, so format each once.
+        unique_ts, inverse = np.unique(self.ts[rows], return_inverse=True)
+        date_slots = [format_date_slot(ts) for ts in unique_ts.tolist()]
+        timestamps = unique_ts.tolist()
+        available = self.available_at(rows).tolist()
+        patients = self.patient[rows].tolist()
+        doctors = self.doctor[rows].tolist()
+        specializations = self.specialization[rows].tolist()
+        clinics = self.clinic[rows].tolist()
+        slots = []
+        for i, row in enumerate(rows.tolist()):
+            is_available, patient = overrides[row] if overrides and row in overrides else (
+                available[i], None if patients[i] == NO_PATIENT else patients[i])
+            slots.append(Slot(
+                date_slot=date_slots[inverse[i]],
+                specialization=self.specializations[specializations[i]],
+                doctor_name=self.doctors[doctors[i]],
+                is_available=is_available,
+                patient_to_attend=patient,
+                clinic=self.clinics[clinics[i]],
+                ts=timestamps[inverse[i]],
+            ))
+        return slots
+
+
+def _encode(slots: list[Slot], source: Optional[dict] = None) -> tuple[dict, dict, int]:
+    """Header, column arrays and aligned data size of a snapshot of slots."""
+    doctors, specializations, clinics = {}, {}, {}
+    for s in slots:
+        doctors.setdefault(s.doctor_name, len(doctors))
+        specializations.setdefault(s.specialization, len(specializations))
+        clinics.setdefault(s.clinic, len(clinics))
+
+    arrays = {
+        "ts": np.array([s.ts for s in slots], dtype=COLUMNS["ts"]),
+        "doctor": np.array([doctors[s.doctor_name] for s in slots], dtype=COLUMNS["doctor"]),
+        "specialization": np.array([specializations[s.specialization] for s in slots], dtype=COLUMNS["specialization"]),
+        "clinic": np.array([clinics[s.clinic] for s in slots], dtype=COLUMNS["clinic"]),
+        "available": np.packbits(np.array([s.is_available for s in slots], dtype=bool)),
+        "patient": np.array(
+            [NO_PATIENT if s.patient_to_attend is None else s.patient_to_attend for s in slots],
+            dtype=COLUMNS["patient"],
+        ),
+    }
+
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = {"offset": offset, "count": int(array.size)}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header = {
+        "rows": len(slots),
+        "doctors": list(doctors),
+        "specializations": list(specializations),
+        "clinics": list(clinics),
+        "columns": layout,
+        "source": source,
+    }
+    return header, arrays, offset
+
+
+def write_snapshot(path: str, slots: list[Slot], source: Optional[dict] = None):
+    header, arrays, size = _encode(slots, source)
+    layout = header["columns"]
+    header = json.dumps(header).encode("utf-8")
+    prefix_len = len(MAGIC) + 4 + len(header)
+    data_start = -(-prefix_len // ALIGNMENT) * ALIGNMENT
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + size)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> AvailabilitySnapshot:
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an availability snapshot")
+        (header_len,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_len))
+    data_start = -(-(len(MAGIC) + 4 + header_len) // ALIGNMENT) * ALIGNMENT
+
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    columns = {}
+    for name, dtype in COLUMNS.items():
+        info = header["columns"][name]
+        start = data_start + info["offset"]
+        nbytes = info["count"] * np.dtype(dtype).itemsize
+        columns[name] = buffer[start:start + nbytes].view(dtype)
+    return AvailabilitySnapshot(header, columns)
+
+
+def build_snapshot(csv_path: str = CSV_PATH, snapshot_path: Optional[str] = None) -> str:
+    snapshot_path = snapshot_path or snapshot_path_for(csv_path)
+    source = source_signature(csv_path)
+    write_snapshot(snapshot_path, read_slots_csv(csv_path), source)
+    return snapshot_path
+
+
+def _fresh_snapshot(csv_path: str) -> Optional[AvailabilitySnapshot]:
+    try:
+        snapshot = read_snapshot(snapshot_path_for(csv_path))
+    except (FileNotFoundError, ValueError):
+        return None
+    return snapshot if snapshot.header.get("source") == source_signature(csv_path) else None
+
+
+def load_snapshot(csv_path: str = CSV_PATH) -> AvailabilitySnapshot:
+    """
+    Columnar view of csv_path: the memory-mapped snapshot next to it when it
+    was built from the CSV's current contents, otherwise the parsed CSV
+    encoded into in-memory columns.
+    """
+    snapshot = _fresh_snapshot(csv_path)
+    if snapshot is None:
+        header, arrays, _ = _encode(read_slots_csv(csv_path))
+        snapshot = AvailabilitySnapshot(header, arrays)
+    return snapshot
+
+
+def load_slots(csv_path: str = CSV_PATH) -> list[Slot]:
+    """
+    Every slot as a Slot object, decoded from the fresh snapshot or parsed
+    from the CSV. Readers that need only a window or the doctor catalog
+    should query load_snapshot() instead of decoding every row.
+    """
+    snapshot = _fresh_snapshot(csv_path)
+    return snapshot.to_slots() if snapshot is not None else read_slots_csv(csv_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the binary availability snapshot from the CSV.")
+    parser.add_argument("--csv", default=CSV_PATH, help="Path to doctor_availability.csv")
+    parser.add_argument("--out", default=None, help="Snapshot path (defaults to the CSV path with a .snap suffix)")
+    args = parser.parse_args()
+
+    path = build_snapshot(args.csv, args.out)
+    print(f"Wrote {path} ({os.path.getsize(path)} bytes) from {args.csv}")
@@ -0,0 +1,205 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+from toolkit.slots import BASE_DIR, DEFAULT_CLINIC, SECONDS_PER_DAY, parse_date_slot
+
+TEMPLATES_PATH = os.path.join(BASE_DIR, "data", "schedule_templates.json")
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+def _parse_day(date: str) -> int:
+    return parse_date_slot(f"{date} 00:00")
+
+
+def _parse_minutes(value: str) -> int:
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _parse_hours(intervals: list) -> list[tuple[int, int]]:
+    return [(_parse_minutes(start), _parse_minutes(end)) for start, end in intervals]
+
+
+def _parse_periods(entries: list) -> list[tuple[int, int]]:
+    """Dates ("DD-MM-YYYY") or {"from": ..., "to": ...} ranges as inclusive (first_day, last_day) timestamps."""
+    periods = []
+    for entry in entries:
+        if isinstance(entry, str):
+            periods.append((_parse_day(entry), _parse_day(entry)))
+        else:
+            periods.append((_parse_day(entry["from"]), _parse_day(entry["to"])))
+    return periods
+
+
+def _weekday(day_ts: int) -> int:
+    # The epoch fell on a Thursday.
+    return (day_ts // SECONDS_PER_DAY + 3) % 7
+
+
+def _weekday_counts(first_day: int, last_day: int) -> list[int]:
+    """How many of each weekday (0 = Monday) fall between two day timestamps, inclusive."""
+    days = (last_day - first_day) // SECONDS_PER_DAY + 1
+    counts = [days // 7] * 7
+    for i in range(days % 7):
+        counts[(_weekday(first_day) + i) % 7] += 1
+    return counts
+
+
+@dataclass
+class ScheduleTemplate:
+    """
+    One doctor's recurring working hours.
+
+    weekly maps a weekday (0 = Monday) to (start, end) minute intervals that
+    are cut into slot_minutes slots. closed holds inclusive day ranges with no
+    slots (the doctor's leave plus clinic holidays) and overrides replaces the
+    weekly hours on specific days. Slots exist only between valid_from and
+    valid_until, both day timestamps and inclusive.
+    """
+    doctor_name: str
+    specialization: str
+    clinic: str
+    weekly: dict[int, list[tuple[int, int]]]
+    valid_from: int
+    valid_until: int
+    slot_minutes: int = 30
+    closed: list[tuple[int, int]] = field(default_factory=list)
+    overrides: dict[int, list[tuple[int, int]]] = field(default_factory=dict)
+
+    def _offsets(self, hours: list[tuple[int, int]]) -> list[int]:
+        offsets = []
+        for start, end in hours:
+            minute = start
+            while minute + self.slot_minutes <= end:
+                offsets.append(minute * 60)
+                minute += self.slot_minutes
+        return offsets
+
+    def _closed_days(self) -> list[tuple[int, int]]:
+        """closed clipped to the valid days, merged into sorted, disjoint ranges."""
+        merged = []
+        for first, last in sorted(self.closed):
+            first, last = max(first, self.valid_from), min(last, self.valid_until)
+            if first > last:
+                continue
+            if merged and first <= merged[-1][1] + SECONDS_PER_DAY:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+            else:
+                merged.append((first, last))
+        return merged
+
+    def day_offsets(self, day_ts: int) -> list[int]:
+        """Second offsets from midnight of the slots on the day starting at day_ts."""
+        if not self.valid_from <= day_ts <= self.valid_until:
+            return []
+        if any(first <= day_ts <= last for first, last in self.closed):
+            return []
+        hours = self.overrides.get(day_ts)
+        if hours is None:
+            hours = self.weekly.get(_weekday(day_ts), [])
+        return self._offsets(hours)
+
+    def slots_between(self, start_ts: int, end_ts: int) -> Iterator[int]:
+        """Slot timestamps with start_ts <= ts < end_ts, in order."""
+        day = max(start_ts - start_ts % SECONDS_PER_DAY, self.valid_from)
+        last_day = min(end_ts, self.valid_until + SECONDS_PER_DAY)
+        while day < last_day:
+            for offset in self.day_offsets(day):
+                if start_ts <= day + offset < end_ts:
+                    yield day + offset
+            day += SECONDS_PER_DAY
+
+    def has_slot(self, ts: int) -> bool:
+        day = ts - ts % SECONDS_PER_DAY
+        return ts - day in self.day_offsets(day)
+
+    def count_slots(self) -> int:
+        """
+        Slots in the whole validity window: the weekly pattern times the number
+        of each weekday, less the closed days and adjusted for overrides, so
+        the cost doesn't depend on how far the window reaches.
+        """
+        if self.valid_from > self.valid_until:
+            return 0
+        per_weekday = [len(self._offsets(self.weekly.get(weekday, []))) for weekday in range(7)]
+
+        def weekly_slots(first: int, last: int) -> int:
+            return sum(count * per_weekday[weekday] for weekday, count in enumerate(_weekday_counts(first, last)))
+
+        closed = self._closed_days()
+        total = weekly_slots(self.valid_from, self.valid_until) - sum(weekly_slots(f, l) for f, l in closed)
+        for day, hours in self.overrides.items():
+            if self.valid_from <= day <= self.valid_until and not any(f <= day <= l for f, l in closed):
+                total += len(self._offsets(hours)) - per_weekday[_weekday(day)]
+        return total
+
+    def _edge_day(self, forward: bool) -> Optional[int]:
+        """First (or last) day that has slots, skipping closed ranges and weeks without working days whole."""
+        closed = self._closed_days()
+        if not forward:
+            closed.reverse()
+        works_weekly = any(self._offsets(self.weekly.get(weekday, [])) for weekday in range(7))
+        step = SECONDS_PER_DAY if forward else -SECONDS_PER_DAY
+        day, end = (self.valid_from, self.valid_until) if forward else (self.valid_until, self.valid_from)
+        found = None
+        # With a working weekday in the pattern a matching day is at most a week past each closed
+        # range or override; without one only override days can have slots.
+        while works_weekly and (day <= end if forward else day >= end):
+            while closed and (closed[0][1] < day if forward else closed[0][0] > day):
+                closed.pop(0)
+            if closed and closed[0][0] <= day <= closed[0][1]:
+                day = (closed[0][1] if forward else closed[0][0]) + step
+                continue
+            if self.day_offsets(day):
+                found = day
+                break
+            day += step
+        candidates = [d for d in self.overrides if self.day_offsets(d)]
+        if found is not None:
+            candidates.append(found)
+        if not candidates:
+            return None
+        return min(candidates) if forward else max(candidates)
+
+    def first_slot(self) -> Optional[int]:
+        day = self._edge_day(forward=True)
+        return None if day is None else day + self.day_offsets(day)[0]
+
+    def last_slot(self) -> Optional[int]:
+        day = self._edge_day(forward=False)
+        return None if day is None else day + self.day_offsets(day)[-1]
+
+
+def load_templates(path: str = TEMPLATES_PATH) -> list[ScheduleTemplate]:
+    """
+    Read schedule templates from JSON.
+
+    Top-level "valid_from", "valid_until", "slot_minutes" and "weekly" are
+    defaults that each doctor entry may override; "clinics" lists holiday
+    dates per clinic under "closed". Doctors list their own "leave" and
+    per-date "overrides" of the weekly hours.
+    """
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+
+    clinic_closed = {
+        name: _parse_periods(clinic.get("closed", []))
+        for name, clinic in config.get("clinics", {}).items()
+    }
+    templates = []
+    for doctor in config["doctors"]:
+        clinic = doctor.get("clinic", DEFAULT_CLINIC)
+        weekly = doctor.get("weekly", config.get("weekly", {}))
+        templates.append(ScheduleTemplate(
+            doctor_name=doctor["doctor_name"],
+            specialization=doctor["specialization"],
+            clinic=clinic,
+            weekly={WEEKDAYS.index(day): _parse_hours(hours) for day, hours in weekly.items()},
+            valid_from=_parse_day(doctor.get("valid_from", config.get("valid_from"))),
+            valid_until=_parse_day(doctor.get("valid_until", config.get("valid_until"))),
+            slot_minutes=doctor.get("slot_minutes", config.get("slot_minutes", 30)),
+            closed=_parse_periods(doctor.get("leave", [])) + clinic_closed.get(clinic, []),
+            overrides={_parse_day(date): _parse_hours(hours) for date, hours in doctor.get("overrides", {}).items()},
+        ))
+    return templates
@@ -1,15 +1,32 @@
-import pandas as pd
-from langchain_core.tools import tool
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.tools import StructuredTool
+from langchain_core.runnables.config import run_in_executor
 from data_models.models import *
 from core.config import DoctorName, Specialization
 from langchain_core.runnables import RunnableConfig
 from db.database import SessionLocal 
 from db.models import Patient
 from utils.notification import send_email
-import os
+from toolkit.availability import availability_store
+from toolkit.cache import ToolResultCache, cached_tool
+from toolkit.slots import parse_date_slot, format_date_slot
+from typing import Optional
+from settings import settings
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-CSV_PATH = os.path.join(BASE_DIR, "data", "doctor_availability.csv")
+tool_cache = ToolResultCache(availability_store.generation, maxsize=settings.TOOL_CACHE_SIZE)
+tool_pool = ThreadPoolExecutor(max_workers=settings.TOOL_THREADS, thread_name_prefix="tools")
+
+def async_tool(func) -> StructuredTool:
+    """
+    Like @tool, but the tool also gets a coroutine for the async graph. The
+    body does blocking database and SMTP work, so it runs on tool_pool and
+    the event loop stays free for other conversations.
+    """
+    @functools.wraps(func)
+    async def coroutine(*args, **kwargs):
+        return await run_in_executor(tool_pool, func, *args, **kwargs)
+    return StructuredTool.from_function(func=func, coroutine=coroutine)
 
 def convert_to_am_pm(time):
     """Convert time from 24-hour format to 12-hour AM/PM format."""
@@ -19,6 +36,36 @@ def convert_to_am_pm(time):
     hour = 12 if hour == 0 else hour
     return f"{hour}:{minute:02d} {period}"
 
+def compact_availability() -> bool:
+    return settings.AVAILABILITY_FORMAT == "compact"
+
+def format_time_runs(times: list[str], max_runs: int = 0) -> str:
+    """
+    Compact encoding of HH:MM times: runs of three or more evenly spaced times
+    become "08:00–11:30 every 30 min" and the rest are listed. Only the first
+    max_runs entries are shown (0 shows all); the remaining slots are counted
+    as "+N more".
+    """
+    minutes = sorted({int(h) * 60 + int(m) for h, m in (t.split(':') for t in times)})
+    entries = []  # (text, slot count)
+    i = 0
+    while i < len(minutes):
+        j = i
+        if i + 1 < len(minutes):
+            step = minutes[i + 1] - minutes[i]
+            while j + 1 < len(minutes) and minutes[j + 1] - minutes[j] == step:
+                j += 1
+        if j - i >= 2:
+            entries.append((f"{minutes[i] // 60:02d}:{minutes[i] % 60:02d}–{minutes[j] // 60:02d}:{minutes[j] % 60:02d} every {step} min", j - i + 1))
+            i = j + 1
+        else:
+            entries.append((f"{minutes[i] // 60:02d}:{minutes[i] % 60:02d}", 1))
+            i += 1
+    shown = entries[:max_runs] if max_runs else entries
+    text = ', '.join(entry for entry, _ in shown)
+    hidden = sum(count for _, count in entries[len(shown):])
+    return f"{text} (+{hidden} more)" if hidden else text
+
 def get_patient_details(patient_id: int) -> str:
     db = SessionLocal()
     try:
@@ -31,7 +78,8 @@ def get_patient_details(patient_id: int) -> str:
     finally:
         db.close()
 
-@tool
+@async_tool
+@cached_tool(tool_cache)
 def check_availability_by_doctor(doctor_name: DoctorName, desired_date: DateModel):
     """
     Check availability for a given doctor on a specific validated date.
@@ -44,15 +92,12 @@ def check_availability_by_doctor(doctor_name: DoctorName, desired_date: DateMode
         A message with a list if available time slots for the doctor on the selected date or a message indicating no availability.
     """
     try:
-        df= pd.read_csv(CSV_PATH )
-        available_slots = df[
-            (df['doctor_name'].str.lower() == doctor_name.lower()) & 
-            (df['date_slot'].str.startswith(desired_date.date)) &
-            (df['is_available'] == True)
-            ]['date_slot'].apply(lambda dt: dt.split(' ')[-1]).tolist()
+        available_slots = availability_store.available_times(doctor_name, desired_date.date)
         
         if len(available_slots) == 0:
             return f"No available slots for Dr. {doctor_name} on {desired_date.date} in the entire day."
+        elif compact_availability():
+            return f"Available slots for Dr. {doctor_name} on {desired_date.date}: {format_time_runs(available_slots, settings.AVAILABILITY_MAX_RUNS)}."
         else:
             slots_str = ', '.join(available_slots)
             return f"Available slots for Dr. {doctor_name} on {desired_date.date} are: {slots_str}."
@@ -63,7 +108,8 @@ def check_availability_by_doctor(doctor_name: DoctorName, desired_date: DateMode
     except Exception as e:
         return f"Unexpected error: {str(e)}"
             
-@tool
+@async_tool
+@cached_tool(tool_cache)
 def check_availability_by_specialization(specialization: Specialization, desired_date: DateModel):
     """
     Check availability for doctors of a given specialization on a specific validated date.
@@ -76,20 +122,20 @@ def check_availability_by_specialization(specialization: Specialization, desired
         A message with a list if available time slots for doctors of the given specialization on the selected date or a message indicating no availability.
     """
     try:
-        df= pd.read_csv(CSV_PATH )
-        available_slots = df[
-            (df['specialization'].str.lower() == specialization.lower()) & 
-            (df['date_slot'].str.startswith(desired_date.date)) &
-            (df['is_available'] == True)
-            ][['doctor_name','date_slot']]
+        available_slots = availability_store.available_by_specialization(specialization, desired_date.date)
         
-        if available_slots.empty:
+        if len(available_slots) == 0:
             return f"No available slots for {specialization.replace('_', ' ')} on {desired_date.date} in the entire day."
+        elif compact_availability():
+            by_doctor = {}
+            for doctor, time in available_slots:
+                by_doctor.setdefault(doctor, []).append(time)
+            result_str = '\n'.join(f"Dr. {doctor}: {format_time_runs(times, settings.AVAILABILITY_MAX_RUNS)}" for doctor, times in by_doctor.items())
+            return f"Available slots for {specialization.replace('_', ' ')} on {desired_date.date}:\n{result_str}"
         else:
             result_lines = []
-            for _, row in available_slots.iterrows():
-                time_slot = convert_to_am_pm(row['date_slot'].split(' ')[-1])
-                result_lines.append(f"Dr. {row['doctor_name']} at {time_slot}")
+            for doctor, time in available_slots:
+                result_lines.append(f"Dr. {doctor} at {convert_to_am_pm(time)}")
             result_str = '\n'.join(result_lines)
             return f"Available slots for {specialization.replace('_', ' ')} on {desired_date.date} are:\n{result_str}."
     except FileNotFoundError:
@@ -99,7 +145,7 @@ def check_availability_by_specialization(specialization: Specialization, desired
     except Exception as e:
         return f"Unexpected error: {str(e)}"
 
-@tool
+@async_tool
 def book_appointment(doctor_name: DoctorName, appointment_datetime: DateTimeModel, config: RunnableConfig):
     """
     Book an appointment with a specific doctor at a given validated date and time for a patient.
@@ -113,22 +159,10 @@ def book_appointment(doctor_name: DoctorName, appointment_datetime: DateTimeMode
     """
     try:
         patient_id=config["configurable"].get("thread_id")
-        df= pd.read_csv(CSV_PATH )
         slot_str = f"{appointment_datetime.datetime}"
-        is_available = not df[
-            (df['doctor_name'].str.lower() == doctor_name.lower()) & 
-            (df['date_slot'] == slot_str) &
-            (df['is_available'] == True)
-            ].empty
         
-        if is_available:
-            df.loc[
-                (df['doctor_name'].str.lower() == doctor_name.lower()) & 
-                (df['date_slot'] == slot_str), ['is_available','patient_to_attend']
-            ] = [False,patient_id]
-
-            df.to_csv(CSV_PATH, index=False)
-            email, fullName = get_patient_details(patient_id)
+        if availability_store.book(doctor_name, slot_str, patient_id):
+            email, fullName = get_patient_details(patient_id) or (None, None)
             if email and fullName:
                 subject = "Appointment Confirmation"
                 body = f"Dear {fullName},\n\nYour appointment with Dr. {doctor_name} has been successfully booked on {appointment_datetime.datetime}.\n\nThank you!"
@@ -144,7 +178,7 @@ def book_appointment(doctor_name: DoctorName, appointment_datetime: DateTimeMode
     except Exception as e:
         return f"Unexpected error: {str(e)}"
 
-@tool
+@async_tool
 def cancel_appointment(doctor_name: DoctorName, appointment_datetime: DateTimeModel, config: RunnableConfig):
     """
     Cancel an existing appointment with a specific doctor at a given validated date and time for a patient.
@@ -158,24 +192,10 @@ def cancel_appointment(doctor_name: DoctorName, appointment_datetime: DateTimeMo
     """
     try:
         patient_id=config["configurable"].get("thread_id")
-        df= pd.read_csv(CSV_PATH )
         slot_str = f"{appointment_datetime.datetime}"
-        appointment_exists = not df[
-            (df['doctor_name'].str.lower() == doctor_name.lower()) & 
-            (df['date_slot'] == slot_str) &
-            (df['patient_to_attend'] == patient_id) &
-            (df['is_available'] == False)
-            ].empty
         
-        if appointment_exists:
-            df.loc[
-                (df['doctor_name'].str.lower() == doctor_name.lower()) & 
-                (df['date_slot'] == slot_str) &
-                (df['patient_to_attend'] == patient_id), ['is_available','patient_to_attend']
-            ] = [True, None]
-
-            df.to_csv(CSV_PATH, index=False)
-            email, fullName = get_patient_details(patient_id)
+        if availability_store.cancel(doctor_name, slot_str, patient_id):
+            email, fullName = get_patient_details(patient_id) or (None, None)
             if email and fullName:
                 subject = "Appointment Cancellation"
                 body = f"Dear {fullName},\n\nYour appointment with Dr. {doctor_name} on {appointment_datetime.datetime} has been successfully canceled.\n\nThank you!"
@@ -190,7 +210,86 @@ def cancel_appointment(doctor_name: DoctorName, appointment_datetime: DateTimeMo
     except Exception as e:
         return f"Unexpected error: {str(e)}"
     
-@tool
+def _format_appointments(appointments) -> str:
+    return '\n'.join(f"- Dr. {a.doctor_name} on {a.appointment_datetime.datetime}" for a in appointments)
+
+@async_tool
+def book_appointments_batch(appointments: list[AppointmentSlotModel], config: RunnableConfig):
+    """
+    Book several appointments for a patient at once, e.g. for repeat treatments. Either all of them are booked or none are.
+    Use this instead of calling book_appointment repeatedly when the user wants more than one appointment.
+    
+    Args:
+        appointments (list[AppointmentSlotModel]): Appointments to book, each with a doctor name (restricted set) and a validated date-time string in format DD-MM-YYYY HH:MM.
+    
+    Returns:
+        A confirmation message listing the booked appointments or a message listing the slots that are unavailable.
+    """
+    try:
+        patient_id=config["configurable"].get("thread_id")
+        if len(appointments) == 0:
+            return "No appointments were given to book."
+        slots = [(a.doctor_name, a.appointment_datetime.datetime) for a in appointments]
+        
+        rejected = availability_store.book_many(slots, patient_id)
+        
+        if len(rejected) == 0:
+            appointments_str = _format_appointments(appointments)
+            email, fullName = get_patient_details(patient_id) or (None, None)
+            if email and fullName:
+                subject = "Appointment Confirmation"
+                body = f"Dear {fullName},\n\nThe following appointments have been successfully booked:\n{appointments_str}\n\nThank you!"
+                send_email(email, subject, body)
+            return f"{len(appointments)} appointments successfully booked for patient ID {patient_id}:\n{appointments_str}"
+        else:
+            rejected_str = ', '.join(f"Dr. {doctor} on {date_slot}" for doctor, date_slot in rejected)
+            return f"No appointments were booked because these slots are not available: {rejected_str}. Please choose different times."
+    except FileNotFoundError:
+        return "Error: The availability data file was not found."
+    except KeyError as e:
+        return f"Error: Missing expected column {e} in the dataset."
+    except Exception as e:
+        return f"Unexpected error: {str(e)}"
+
+@async_tool
+def cancel_appointments_batch(appointments: list[AppointmentSlotModel], config: RunnableConfig):
+    """
+    Cancel several existing appointments for a patient at once. Either all of them are canceled or none are.
+    Use this instead of calling cancel_appointment repeatedly when the user wants to cancel more than one appointment.
+    
+    Args:
+        appointments (list[AppointmentSlotModel]): Appointments to cancel, each with a doctor name (restricted set) and a validated date-time string in format DD-MM-YYYY HH:MM.
+    
+    Returns:
+        A confirmation message listing the canceled appointments or a message listing the appointments that were not found.
+    """
+    try:
+        patient_id=config["configurable"].get("thread_id")
+        if len(appointments) == 0:
+            return "No appointments were given to cancel."
+        slots = [(a.doctor_name, a.appointment_datetime.datetime) for a in appointments]
+        
+        rejected = availability_store.cancel_many(slots, patient_id)
+        
+        if len(rejected) == 0:
+            appointments_str = _format_appointments(appointments)
+            email, fullName = get_patient_details(patient_id) or (None, None)
+            if email and fullName:
+                subject = "Appointment Cancellation"
+                body = f"Dear {fullName},\n\nThe following appointments have been successfully canceled:\n{appointments_str}\n\nThank you!"
+                send_email(email, subject, body)
+            return f"{len(appointments)} appointments successfully canceled for patient ID {patient_id}:\n{appointments_str}"
+        else:
+            rejected_str = ', '.join(f"Dr. {doctor} on {date_slot}" for doctor, date_slot in rejected)
+            return f"No appointments were canceled because no existing appointment was found for patient ID {patient_id} with: {rejected_str}."
+    except FileNotFoundError:
+        return "Error: The availability data file was not found."
+    except KeyError as e:
+        return f"Error: Missing expected column {e} in the dataset."
+    except Exception as e:
+        return f"Unexpected error: {str(e)}"
+    
+@async_tool
 def reschedule_appointment(doctor_name: DoctorName, old_appointment_datetime: DateTimeModel, new_appointment_datetime: DateTimeModel,config: RunnableConfig):
     """
     Reschedule an existing appointment with a specific doctor from an old date and time to a new date and time for a patient.
@@ -205,45 +304,19 @@ def reschedule_appointment(doctor_name: DoctorName, old_appointment_datetime: Da
     """
     try:
         patient_id=config["configurable"].get("thread_id")
-        df= pd.read_csv(CSV_PATH )
         old_slot_str = f"{old_appointment_datetime.datetime}"
         new_slot_str = f"{new_appointment_datetime.datetime}"
         
-        appointment_exists = not df[
-            (df['doctor_name'].str.lower() == doctor_name.lower()) & 
-            (df['date_slot'] == old_slot_str) &
-            (df['patient_to_attend'] == patient_id) &
-            (df['is_available'] == False)
-            ].empty
-        
-        new_slot_available = not df[
-            (df['doctor_name'].str.lower() == doctor_name.lower()) & 
-            (df['date_slot'] == new_slot_str) &
-            (df['is_available'] == True)
-            ].empty
+        outcome = availability_store.reschedule(doctor_name, old_slot_str, new_slot_str, patient_id)
         
-        if appointment_exists and new_slot_available:
-            # Cancel old appointment
-            df.loc[
-                (df['doctor_name'].str.lower() == doctor_name.lower()) & 
-                (df['date_slot'] == old_slot_str) &
-                (df['patient_to_attend'] == patient_id), ['is_available','patient_to_attend']
-            ] = [True, None]
-            
-            # Book new appointment
-            df.loc[
-                (df['doctor_name'].str.lower() == doctor_name.lower()) & 
-                (df['date_slot'] == new_slot_str), ['is_available','patient_to_attend']
-            ] = [False, patient_id]
-
-            df.to_csv(CSV_PATH, index=False)
-            email, fullName = get_patient_details(patient_id)
+        if outcome == "ok":
+            email, fullName = get_patient_details(patient_id) or (None, None)
             if email and fullName:
                 subject = "Appointment Rescheduling"
                 body = f"Dear {fullName},\n\nYour appointment with Dr. {doctor_name} has been successfully rescheduled from {old_appointment_datetime.datetime} to {new_appointment_datetime.datetime}.\n\nThank you!"
                 send_email(email, subject, body)
             return f"Appointment with Dr. {doctor_name} has been successfully rescheduled from {old_appointment_datetime.datetime} to {new_appointment_datetime.datetime} for patient ID {patient_id}."
-        elif not appointment_exists:
+        elif outcome == "no_appointment":
             return f"No existing appointment found with Dr. {doctor_name} on {old_appointment_datetime.datetime} for patient ID {patient_id}."
         else:
             return f"Sorry, Dr. {doctor_name} is not available on {new_appointment_datetime.datetime}. Please choose a different time."
@@ -254,7 +327,8 @@ def reschedule_appointment(doctor_name: DoctorName, old_appointment_datetime: Da
     except Exception as e:
         return f"Unexpected error: {str(e)}"
     
-@tool
+@async_tool
+@cached_tool(tool_cache)
 def get_available_doctors_on_date(desired_date: DateModel):
     """
     Get a list of all doctors along with their specializations who have at least one available time slot on a specific validated date.
@@ -266,19 +340,15 @@ def get_available_doctors_on_date(desired_date: DateModel):
         A message with a list of available doctors along with their specializations on the specified date or a message indicating no doctors are available.
     """
     try:
-        df= pd.read_csv(CSV_PATH )
-        available_doctors = df[
-            (df['date_slot'].str.startswith(desired_date.date)) &
-            (df['is_available'] == True)
-            ][['doctor_name','specialization']].drop_duplicates()
+        available_doctors = availability_store.available_doctors_on_date(desired_date.date)
         
-        if available_doctors.empty:
+        if len(available_doctors) == 0:
             return f"No doctors are available on {desired_date.date}."
         else:
             result_lines = []
-            for _, row in available_doctors.iterrows():
-                spec_formatted = row['specialization'].replace('_', ' ')
-                result_lines.append(f"Dr. {row['doctor_name']} ({spec_formatted})")
+            for doctor, specialization in available_doctors:
+                spec_formatted = specialization.replace('_', ' ')
+                result_lines.append(f"Dr. {doctor} ({spec_formatted})")
             result_str = ', '.join(result_lines)
             return f"The following doctors are available on {desired_date.date}: {result_str}."
     except FileNotFoundError:
@@ -288,7 +358,8 @@ def get_available_doctors_on_date(desired_date: DateModel):
     except Exception as e:
         return f"Unexpected error: {str(e)}"
     
-@tool
+@async_tool
+@cached_tool(tool_cache)
 def get_available_doctors():
     """
     Get a list of all doctors who have at least one available time slot.
@@ -297,8 +368,7 @@ def get_available_doctors():
         A message with a list of available doctors or a message indicating no doctors are available.
     """
     try:
-        df= pd.read_csv(CSV_PATH )
-        available_doctors = df[df['is_available'] == True]['doctor_name'].unique().tolist()
+        available_doctors = availability_store.available_doctors()
         
         if len(available_doctors) == 0:
             return "No doctors are currently available."
@@ -312,7 +382,8 @@ def get_available_doctors():
     except Exception as e:
         return f"Unexpected error: {str(e)}"
     
-@tool
+@async_tool
+@cached_tool(tool_cache)
 def get_available_specializations():
     """
     Get a list of all specializations that have at least one available time slot.
@@ -321,8 +392,7 @@ def get_available_specializations():
         A message with a list of available specializations or a message indicating no specializations are available.
     """
     try:
-        df= pd.read_csv(CSV_PATH )
-        available_specializations = df[df['is_available'] == True]['specialization'].unique().tolist()
+        available_specializations = availability_store.available_specializations()
         
         if len(available_specializations) == 0:
             return "No specializations are currently available."
@@ -335,3 +405,86 @@ def get_available_specializations():
         return f"Error: Missing expected column {e} in the dataset."
     except Exception as e:
         return f"Unexpected error: {str(e)}"
+
+@async_tool
+@cached_tool(tool_cache)
+def find_next_available_slot(after: DateTimeModel, doctor_name: Optional[DoctorName] = None, specialization: Optional[Specialization] = None):
+    """
+    Find the earliest available slot at or after a given validated date and time, for a specific doctor or for any doctor of a specialization.
+    Use this instead of checking availability date by date when the user asks for the next, earliest or soonest slot.
+    
+    Args:
+        after (DateTimeModel): Validated date-time string in format DD-MM-YYYY HH:MM to search from.
+        doctor_name (DoctorName, optional): Name of the doctor (restricted set).
+        specialization (Specialization, optional): Specialization of the doctor (restricted set). Ignored if doctor_name is given.
+    
+    Returns:
+        A message with the earliest available slot or a message indicating there is no later availability.
+    """
+    try:
+        after_ts = parse_date_slot(after.datetime)
+        result = availability_store.next_available(after_ts, doctor_name=doctor_name, specialization=specialization)
+        
+        target = f"Dr. {doctor_name}" if doctor_name else (specialization.replace('_', ' ') if specialization else "any doctor")
+        if result is None:
+            return f"No available slots for {target} on or after {after.datetime}."
+        else:
+            ts, doctor = result
+            date, time = format_date_slot(ts).split(' ')
+            if doctor_name:
+                return f"The next available slot for Dr. {doctor} is on {date} at {convert_to_am_pm(time)}."
+            return f"The next available slot for {target} is with Dr. {doctor} on {date} at {convert_to_am_pm(time)}."
+    except FileNotFoundError:
+        return "Error: The availability data file was not found."
+    except KeyError as e:
+        return f"Error: Missing expected column {e} in the dataset."
+    except Exception as e:
+        return f"Unexpected error: {str(e)}"
+
+@async_tool
+@cached_tool(tool_cache)
+def list_availability_in_range(start: DateTimeModel, end: DateTimeModel, doctor_name: Optional[DoctorName] = None, specialization: Optional[Specialization] = None):
+    """
+    List all available slots between two validated date-times (inclusive), optionally for one doctor or one specialization.
+    Use this for questions spanning several days such as "any slot this week".
+    
+    Args:
+        start (DateTimeModel): Validated start date-time string in format DD-MM-YYYY HH:MM.
+        end (DateTimeModel): Validated end date-time string in format DD-MM-YYYY HH:MM.
+        doctor_name (DoctorName, optional): Name of the doctor (restricted set).
+        specialization (Specialization, optional): Specialization of the doctor (restricted set). Ignored if doctor_name is given.
+    
+    Returns:
+        A message listing the available slots grouped by date and doctor or a message indicating no availability in the range.
+    """
+    try:
+        start_ts = parse_date_slot(start.datetime)
+        end_ts = parse_date_slot(end.datetime)
+        if end_ts < start_ts:
+            return f"The end of the range ({end.datetime}) must not be before its start ({start.datetime})."
+        
+        available_slots = availability_store.available_in_range(start_ts, end_ts, doctor_name=doctor_name, specialization=specialization)
+        
+        if len(available_slots) == 0:
+            return f"No available slots between {start.datetime} and {end.datetime}."
+        else:
+            compact = compact_availability()
+            grouped = {}
+            for ts, doctor, spec in available_slots:
+                date, time = format_date_slot(ts).split(' ')
+                grouped.setdefault((date, doctor, spec), []).append(time if compact else convert_to_am_pm(time))
+            result_lines = []
+            for (date, doctor, spec), times in grouped.items():
+                times_str = format_time_runs(times, settings.AVAILABILITY_MAX_RUNS) if compact else ', '.join(times)
+                result_lines.append(f"{date} - Dr. {doctor} ({spec.replace('_', ' ')}): {times_str}")
+            if compact and settings.AVAILABILITY_MAX_LINES and len(result_lines) > settings.AVAILABILITY_MAX_LINES:
+                hidden = len(result_lines) - settings.AVAILABILITY_MAX_LINES
+                result_lines = result_lines[:settings.AVAILABILITY_MAX_LINES] + [f"+{hidden} more doctor-days; narrow the range to see them."]
+            result_str = '\n'.join(result_lines)
+            return f"Available slots between {start.datetime} and {end.datetime} are:\n{result_str}."
+    except FileNotFoundError:
+        return "Error: The availability data file was not found."
+    except KeyError as e:
+        return f"Error: Missing expected column {e} in the dataset."
+    except Exception as e:
+        return f"Unexpected error: {str(e)}"
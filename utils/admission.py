@@ -0,0 +1,228 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class AdmissionRejected(Exception):
+    """A request turned away before it starts; maps onto an HTTP error with Retry-After."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Optional[dict]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))} if self.retry_after is not None else None
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets refilled at rate_per_minute up to burst; the least recently seen keys are forgotten past max_keys."""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = 10000):
+        self.rate = rate_per_minute / 60
+        self.burst = max(burst, 1)
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+
+    def acquire(self, key: Hashable):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._store(key, tokens, now)
+            self.rejected += 1
+            raise AdmissionRejected(429, "Too many messages, please wait a moment before sending another.",
+                                    (1 - tokens) / self.rate)
+        self._store(key, tokens - 1, now)
+        self.allowed += 1
+
+    def _store(self, key: Hashable, tokens: float, now: float):
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.rate > 0,
+            "rate_per_minute": self.rate * 60,
+            "burst": self.burst,
+            "tracked_keys": len(self._buckets),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+
+class ThreadSerializer:
+    """
+    Runs one request per conversation at a time within this worker process.
+    Later requests for the same thread wait their turn in arrival order, at
+    most queue_size of them and for at most wait_seconds, so overlapping
+    messages handled by one worker never interleave writes to the same
+    checkpoint. The lock is in memory: with several workers sharing the
+    SQLite checkpointer, route each patient to a fixed worker (sticky
+    sessions) or the guarantee does not hold across workers.
+    """
+
+    def __init__(self, queue_size: int = 1, wait_seconds: float = 30):
+        self.queue_size = queue_size
+        self.wait_seconds = wait_seconds
+        # thread -> [lock, requests holding or waiting for it]
+        self._locks: dict[Hashable, list] = {}
+        self.rejected = 0
+        self.timeouts = 0
+        self.waited = 0
+
+    async def acquire(self, key: Hashable):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        if entry[1] > self.queue_size:
+            self.rejected += 1
+            raise AdmissionRejected(429, "Your previous message is still being answered, please wait for it to finish.", 1)
+        entry[1] += 1
+        # Count by holders and waiters: wait_for() only takes the lock once its own task runs.
+        if entry[1] > 1:
+            self.waited += 1
+        try:
+            await asyncio.wait_for(entry[0].acquire(), self.wait_seconds or None)
+        except asyncio.TimeoutError:
+            self._unref(key, entry)
+            self.timeouts += 1
+            raise AdmissionRejected(429, "Your previous message is still being answered, please try again shortly.", 1)
+        except BaseException:
+            self._unref(key, entry)
+            raise
+
+    def release(self, key: Hashable):
+        entry = self._locks[key]
+        entry[0].release()
+        self._unref(key, entry)
+
+    def _unref(self, key: Hashable, entry: list):
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[key]
+
+    def stats(self) -> dict:
+        entries = list(self._locks.values())
+        running = sum(1 for lock, _ in entries if lock.locked())
+        return {
+            "queue_size": self.queue_size,
+            "running": running,
+            "queued": sum(users for _, users in entries) - running,
+            "waited": self.waited,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+class ConcurrencyLimiter:
+    """
+    Caps requests running at once at max_active (0 disables the cap). Up to
+    max_queue more wait for a slot, each for at most wait_seconds; beyond
+    that requests are rejected immediately with 503 instead of piling up.
+    """
+
+    def __init__(self, max_active: int, max_queue: int, wait_seconds: float = 10):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.wait_seconds = wait_seconds
+        self._semaphore = asyncio.Semaphore(max_active) if max_active > 0 else None
+        self.active = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    async def acquire(self):
+        if self._semaphore is not None and not self._semaphore.locked():
+            # A free slot is taken without suspending, so queued only counts real waiters.
+            await self._semaphore.acquire()
+        elif self._semaphore is not None:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise AdmissionRejected(503, "The assistant is busy right now, please try again shortly.", 1)
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.wait_seconds or None)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise AdmissionRejected(503, "The assistant is busy right now, please try again shortly.",
+                                        self.wait_seconds)
+            finally:
+                self.queued -= 1
+        self.active += 1
+        self.admitted += 1
+
+    def release(self):
+        self.active -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_active": self.max_active,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "peak_queued": self.peak_queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+class Admission:
+    """A request's place in the thread lock and the global limiter; release() is safe to call more than once."""
+
+    def __init__(self, controller: "AdmissionController", key: Hashable):
+        self._controller = controller
+        self._key = key
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller.limiter.release()
+            self._controller.threads.release(self._key)
+
+
+class AdmissionController:
+    """
+    Admission for /execute, cheapest check first: the patient's rate limit,
+    then the conversation's turn, then a global slot. Waiting for the
+    conversation before taking a global slot keeps queued follow-up messages
+    from holding capacity other patients could use.
+    """
+
+    def __init__(self, rate_limiter: TokenBucketLimiter, threads: ThreadSerializer, limiter: ConcurrencyLimiter):
+        self.rate_limiter = rate_limiter
+        self.threads = threads
+        self.limiter = limiter
+
+    async def admit(self, patient_id: Hashable) -> Admission:
+        self.rate_limiter.acquire(patient_id)
+        await self.threads.acquire(patient_id)
+        try:
+            await self.limiter.acquire()
+        except BaseException:
+            self.threads.release(patient_id)
+            raise
+        return Admission(self, patient_id)
+
+    def stats(self) -> dict:
+        return {
+            "rate_limit": self.rate_limiter.stats(),
+            "threads": self.threads.stats(),
+            "concurrency": self.limiter.stats(),
+        }
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import random
+import time
+from typing import Any, Callable, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+
+class FakeProviderError(RuntimeError):
+    pass
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline chat model for exercising the LLM plumbing without network calls.
+
+    Every call waits latency seconds (plus token_latency per streamed token)
+    and fails with probability failure_rate. Replies come from responder,
+    called with the prompt messages and the bound call options ("tools",
+    "structured_output"); without one the model replies with reply, and
+    structured output is returned as a tool call with the arguments in
+    structured[schema name], the way function-calling providers return it.
+    """
+
+    reply: str = "This is a fake reply."
+    structured: dict[str, dict] = {}
+    responder: Optional[Callable[[list[BaseMessage], dict], AIMessage]] = None
+    latency: float = 0.0
+    token_latency: float = 0.0
+    failure_rate: float = 0.0
+    seed: int = 0
+    _rng: random.Random = PrivateAttr()
+
+    def model_post_init(self, __context: Any):
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def with_structured_output(self, schema, **kwargs):
+        def parse(message: AIMessage):
+            return schema.model_validate(message.tool_calls[0]["args"])
+        return self.bind(structured_output=schema.__name__) | RunnableLambda(parse)
+
+    def _respond(self, messages: list[BaseMessage], options: dict) -> AIMessage:
+        if self._rng.random() < self.failure_rate:
+            raise FakeProviderError("fake provider failure")
+        if self.responder is not None:
+            return self.responder(messages, options)
+        if options.get("structured_output"):
+            name = options["structured_output"]
+            return AIMessage(content="", tool_calls=[{"name": name, "args": self.structured.get(name, {}), "id": f"call_{name}"}])
+        return AIMessage(content=self.reply)
+
+    @staticmethod
+    def _tokens(message: AIMessage) -> list[str]:
+        words = str(message.content).split(" ")
+        return [w if i == len(words) - 1 else w + " " for i, w in enumerate(words)]
+
+    @staticmethod
+    def _tool_call_chunk(message: AIMessage) -> ChatGenerationChunk:
+        return ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+            {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": i}
+            for i, c in enumerate(message.tool_calls)
+        ]))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        message = self._respond(messages, kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        message = self._respond(messages, kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        message = self._respond(messages, kwargs)
+        for token in self._tokens(message) if message.content else []:
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        if message.tool_calls:
+            yield self._tool_call_chunk(message)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        message = self._respond(messages, kwargs)
+        for token in self._tokens(message) if message.content else []:
+            await asyncio.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        if message.tool_calls:
+            yield self._tool_call_chunk(message)
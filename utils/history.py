@@ -0,0 +1,127 @@
+from typing import Optional
+from langchain_core.runnables import RunnableConfig
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from prompt_library.prompts import history_summary_prompt
+from utils.metrics import BACKGROUND_FAILURES
+
+CHARS_PER_TOKEN = 4
+
+
+def _turns(messages: list) -> list[list]:
+    """Group messages into turns, each starting at a user message."""
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _is_tool_chatter(message) -> bool:
+    return isinstance(message, ToolMessage) or (
+        isinstance(message, AIMessage) and bool(message.tool_calls) and not message.content
+    )
+
+
+def _transcript(messages: list) -> str:
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            lines.append(f"Patient: {message.content}")
+        elif isinstance(message, ToolMessage):
+            lines.append(f"Tool {message.name}: {message.content}")
+        elif message.content:
+            lines.append(f"Assistant: {message.content}")
+    return "\n".join(lines)
+
+
+class HistoryManager:
+    """
+    Keeps a thread's message history within a token budget.
+
+    Runs at the start of every turn, when all earlier turns are complete.
+    Tool calls and tool results of completed turns are dropped since the
+    assistant's reply already states their outcome. If the remaining
+    history is still over budget, the most recent turns that fit in
+    recent_tokens are kept verbatim and older turns are folded into a
+    running summary that is appended to the model nodes' system prompts.
+    """
+
+    def __init__(self, summary_model=None, budget_tokens: int = 4000, recent_tokens: int = 1500,
+                 summary_tokens: int = 300):
+        self.summary_model = summary_model
+        self.budget_tokens = budget_tokens
+        self.recent_tokens = recent_tokens
+        self.summary_tokens = summary_tokens
+
+    def _split(self, messages: list) -> tuple[list, list]:
+        """Returns (tool chatter to remove, older turns to fold into the summary)."""
+        if self.budget_tokens <= 0:
+            return [], []
+        removed = [m for m in messages if _is_tool_chatter(m)]
+        removed_ids = {m.id for m in removed}
+        turns = [t for t in _turns([m for m in messages if m.id not in removed_ids]) if t]
+        if count_tokens_approximately([m for t in turns for m in t]) <= self.budget_tokens:
+            return removed, []
+
+        kept, used = 0, 0
+        for turn in reversed(turns):
+            size = count_tokens_approximately(turn)
+            if kept and used + size > self.recent_tokens:
+                break
+            kept += 1
+            used += size
+        return removed, [m for t in turns[:len(turns) - kept] for m in t]
+
+    def compact(self, messages: list, summary: str = "", config: Optional[RunnableConfig] = None) -> tuple[list, str]:
+        """Returns (messages to remove, updated summary); config is passed on to the summary call."""
+        removed, older = self._split(messages)
+        if not older:
+            return removed, summary
+        return removed + older, self.summarize(summary, older, config)
+
+    async def acompact(self, messages: list, summary: str = "",
+                       config: Optional[RunnableConfig] = None) -> tuple[list, str]:
+        removed, older = self._split(messages)
+        if not older:
+            return removed, summary
+        return removed + older, await self.asummarize(summary, older, config)
+
+    def _summary_prompt(self, summary: str, transcript: str) -> list:
+        return [
+            SystemMessage(content=history_summary_prompt.format(max_words=int(self.summary_tokens * 0.75))),
+            HumanMessage(content=f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"),
+        ]
+
+    def summarize(self, summary: str, messages: list, config: Optional[RunnableConfig] = None) -> str:
+        transcript = _transcript(messages)
+        limit = self.summary_tokens * CHARS_PER_TOKEN
+        if self.summary_model is not None:
+            try:
+                response = self.summary_model.invoke(self._summary_prompt(summary, transcript), config)
+                return str(response.content).strip()[:limit]
+            except Exception as e:
+                BACKGROUND_FAILURES.inc(task="history_summary")
+                print(f"History summarization failed, keeping the latest text instead: {e}")
+        # Without a model, keep the most recent text that fits.
+        return f"{summary}\n{transcript}".strip()[-limit:]
+
+    async def asummarize(self, summary: str, messages: list, config: Optional[RunnableConfig] = None) -> str:
+        transcript = _transcript(messages)
+        limit = self.summary_tokens * CHARS_PER_TOKEN
+        if self.summary_model is not None:
+            try:
+                response = await self.summary_model.ainvoke(self._summary_prompt(summary, transcript), config)
+                return str(response.content).strip()[:limit]
+            except Exception as e:
+                BACKGROUND_FAILURES.inc(task="history_summary")
+                print(f"History summarization failed, keeping the latest text instead: {e}")
+        return f"{summary}\n{transcript}".strip()[-limit:]
+
+    @staticmethod
+    def system_text(text: str, summary: Optional[str]) -> str:
+        """A node's system prompt with the running summary appended."""
+        if not summary:
+            return text
+        return f"{text}\n\nSummary of the earlier conversation with this patient:\n{summary}"
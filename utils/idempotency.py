@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Hashable, Optional
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request."""
+
+
+class IdempotentRun:
+    """
+    One execution's events, shared by the request that started it and any
+    retries carrying the same key. Retries replay what was recorded so far
+    and then follow the live run until it finishes.
+    """
+
+    def __init__(self, key: Hashable, fingerprint: str, detach_grace: float = 0):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.detach_grace = detach_grace
+        self.events: list[dict] = []
+        self.done = False
+        self.failed = False
+        self.expires_at = float("inf")
+        self.task: Optional[asyncio.Task] = None
+        self.followers = 0
+        self._detach: Optional[asyncio.TimerHandle] = None
+        self._changed = asyncio.Event()
+
+    def append(self, event: dict):
+        self.events.append(event)
+        self.failed = self.failed or event.get("type") == "fatal_error"
+        self._notify()
+
+    def finish(self):
+        self.done = True
+        # Replays only need the text, not how it was chunked.
+        compact: list[dict] = []
+        for event in self.events:
+            if event.get("type") == "text" and compact and compact[-1].get("type") == "text":
+                compact[-1] = {"type": "text", "content": compact[-1]["content"] + event["content"]}
+            else:
+                compact.append(event)
+        self.events = compact
+        if self._detach is not None:
+            self._detach.cancel()
+        self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self) -> AsyncIterator[dict]:
+        self.followers += 1
+        if self._detach is not None:
+            self._detach.cancel()
+            self._detach = None
+        # finish() swaps in a compacted list; a follower keeps reading the one it started on.
+        events, i = self.events, 0
+        try:
+            while True:
+                while i < len(events):
+                    yield events[i]
+                    i += 1
+                if self.done:
+                    return
+                await self._changed.wait()
+        finally:
+            self.followers -= 1
+            if not self.followers:
+                self.schedule_detach()
+
+    def schedule_detach(self):
+        """
+        Cancel the run once nobody has followed it for detach_grace seconds.
+        With the default of 0 a disconnect cancels it right away; a grace lets
+        a retry attach after a dropped connection.
+        """
+        if self.done or self.followers or self.task is None:
+            return
+        if self._detach is not None:
+            self._detach.cancel()
+        self._detach = asyncio.get_running_loop().call_later(self.detach_grace, self.task.cancel)
+
+
+class IdempotencyStore:
+    """
+    Bounded in-memory store of /execute runs by (patient, Idempotency-Key).
+
+    Successful runs are replayed for ttl_seconds after they finish; failed
+    or cancelled runs are dropped so a retry executes again. When the store
+    holds more than max_entries, the oldest finished runs are evicted first;
+    running ones are never evicted.
+
+    A run is cancelled as soon as its last follower disconnects, like an
+    unkeyed request, unless the client asked begin() for a detach grace
+    (capped at max_detach_grace) to reconnect within.
+    """
+
+    def __init__(self, ttl_seconds: float = 600, max_entries: int = 1000, max_detach_grace: float = 30):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_detach_grace = max_detach_grace
+        self._runs: OrderedDict[Hashable, IdempotentRun] = OrderedDict()
+        self.started = 0
+        self.replayed = 0
+        self.attached = 0
+        self.conflicts = 0
+        self.detached = 0
+        self.evicted = 0
+
+    @staticmethod
+    def fingerprint(message: str) -> str:
+        return hashlib.sha256(message.encode()).hexdigest()
+
+    def begin(self, key: Hashable, message: str, detach_grace: float = 0) -> tuple[IdempotentRun, bool]:
+        """
+        The run for key and whether it is new; a new run must be start()ed or
+        abandon()ed by the caller, and every response following a run must
+        call its schedule_detach() when it closes.
+        """
+        self._evict()
+        fingerprint = self.fingerprint(message)
+        run = self._runs.get(key)
+        if run is not None:
+            if run.fingerprint != fingerprint:
+                self.conflicts += 1
+                raise IdempotencyConflict("This Idempotency-Key was already used for a different message.")
+            if run.done:
+                self.replayed += 1
+            else:
+                self.attached += 1
+            return run, False
+        run = self._runs[key] = IdempotentRun(key, fingerprint, min(max(detach_grace, 0), self.max_detach_grace))
+        return run, True
+
+    def start(self, run: IdempotentRun, events: AsyncIterator[dict], on_done: Optional[Callable[[], None]] = None):
+        """Run events to completion in the background, independent of the connection that asked for it."""
+        async def record():
+            try:
+                async for event in events:
+                    run.append(event)
+            except asyncio.CancelledError:
+                run.failed = True
+                self.detached += 1
+            except Exception as e:
+                run.failed = True
+                run.append({"type": "fatal_error", "message": str(e)})
+            finally:
+                if on_done is not None:
+                    on_done()
+                self._finish(run)
+
+        self.started += 1
+        run.task = asyncio.create_task(record())
+
+    def abandon(self, run: IdempotentRun, message: str):
+        """Give up on a run that never started, telling any retry already attached to it."""
+        run.failed = True
+        run.append({"type": "error", "message": message})
+        self._finish(run)
+
+    def _finish(self, run: IdempotentRun):
+        run.finish()
+        if run.failed:
+            if self._runs.get(run.key) is run:
+                del self._runs[run.key]
+        else:
+            run.expires_at = time.monotonic() + self.ttl_seconds
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [key for key, run in self._runs.items() if run.done and run.expires_at <= now]:
+            del self._runs[key]
+        while len(self._runs) > self.max_entries:
+            key = next((key for key, run in self._runs.items() if run.done), None)
+            if key is None:
+                break
+            del self._runs[key]
+            self.evicted += 1
+
+    def stats(self) -> dict:
+        running = sum(1 for run in self._runs.values() if not run.done)
+        return {
+            "ttl_seconds": self.ttl_seconds,
+            "max_detach_grace": self.max_detach_grace,
+            "entries": len(self._runs),
+            "running": running,
+            "stored": len(self._runs) - running,
+            "started": self.started,
+            "replayed": self.replayed,
+            "attached": self.attached,
+            "conflicts": self.conflicts,
+            "detached": self.detached,
+            "evicted": self.evicted,
+        }
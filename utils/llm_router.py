@@ -0,0 +1,316 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import ContextThreadPoolExecutor, ensure_config, patch_config
+
+
+class ProviderHealth:
+    """
+    Rolling latency and error window for one provider, over its last window
+    calls within the last horizon seconds, plus a consecutive-failure
+    circuit breaker.
+    """
+
+    def __init__(self, name: str, model, window: int = 100, failure_threshold: int = 3, cooldown: float = 30,
+                 horizon: float = 300):
+        self.name = name
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.horizon = horizon
+        self._lock = threading.Lock()
+        # (finished at, latency, ok)
+        self._window: deque[tuple[float, float, bool]] = deque(maxlen=window)
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.hedges = 0
+        self.wins = 0
+        self.lost = 0
+        self.trips = 0
+
+    def available(self) -> bool:
+        return time.monotonic() >= self._open_until
+
+    def half_open(self) -> bool:
+        """The breaker's cooldown has ended and no call has succeeded since; the next call is the probe."""
+        return bool(self._open_until) and self.available()
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self.calls += 1
+            self._window.append((time.monotonic(), latency, ok))
+            if ok:
+                self._consecutive_failures = 0
+                self._open_until = 0.0
+                return
+            self.failures += 1
+            self._consecutive_failures += 1
+            if self.failure_threshold and self._consecutive_failures >= self.failure_threshold:
+                # Stay open for the cooldown; the next call after it is a single probe.
+                self._open_until = time.monotonic() + self.cooldown
+                self._consecutive_failures = self.failure_threshold - 1
+                self.trips += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            since = time.monotonic() - self.horizon
+            samples = [(latency, ok) for finished, latency, ok in self._window if finished >= since]
+            latencies = sorted(latency for latency, ok in samples if ok)
+            errors = sum(1 for _, ok in samples if not ok)
+
+            def percentile(p: float):
+                return round(latencies[min(int(p * len(latencies)), len(latencies) - 1)], 3) if latencies else None
+
+            return {
+                "available": self.available(),
+                "calls": self.calls,
+                "failures": self.failures,
+                "hedges": self.hedges,
+                "wins": self.wins,
+                "lost": self.lost,
+                "trips": self.trips,
+                "samples": len(samples),
+                "error_rate": errors / len(samples) if samples else 0.0,
+                "p50_seconds": percentile(0.5),
+                "p95_seconds": percentile(0.95),
+            }
+
+
+class _FirstToken(BaseCallbackHandler):
+    run_inline = True
+
+    def __init__(self, on_token: Callable[[], None]):
+        self.on_token = on_token
+        self.seen = False
+
+    def on_llm_new_token(self, token: str, **kwargs: Any):
+        if not self.seen:
+            self.seen = True
+            self.on_token()
+
+
+class _Attempt:
+    def __init__(self, provider: ProviderHealth, visible: bool):
+        self.provider = provider
+        self.visible = visible
+        self.started = time.perf_counter()
+        self.streamed = False
+
+
+class RoutedRunnable(Runnable):
+    """
+    One logical LLM call spread over the providers of a RoutedChatModel.
+
+    The healthiest provider is called first with the caller's config. If it
+    has neither answered nor streamed a token after hedge_delay seconds, the
+    next provider is called as well and the first successful answer wins;
+    the other call is cancelled (async) or abandoned (sync). The hedge runs
+    without the caller's callbacks so its tokens never interleave with the
+    primary's stream; once the primary starts streaming, the hedge is dropped.
+    A failed call fails over to the next provider, unless it had already
+    streamed tokens: the client holds part of its answer, so the error is
+    raised rather than starting a second one.
+    """
+
+    def __init__(self, router: "RoutedChatModel", build: Callable[[Any], Runnable]):
+        self.router = router
+        self.build = build
+        self._bound: dict[str, Runnable] = {}
+
+    def _runnable(self, provider: ProviderHealth) -> Runnable:
+        if provider.name not in self._bound:
+            self._bound[provider.name] = self.build(provider.model)
+        return self._bound[provider.name]
+
+    def _config(self, config: Optional[RunnableConfig], attempt: _Attempt, on_token: Callable[[], None]) -> RunnableConfig:
+        config = ensure_config(config)
+        if not attempt.visible:
+            return patch_config(config, callbacks=[])
+        handler = _FirstToken(on_token)
+        callbacks = config.get("callbacks")
+        if callbacks is None:
+            callbacks = [handler]
+        elif isinstance(callbacks, list):
+            callbacks = callbacks + [handler]
+        else:
+            callbacks = callbacks.copy()
+            callbacks.add_handler(handler, inherit=False)
+        return patch_config(config, callbacks=callbacks)
+
+    @staticmethod
+    def _winner(attempts: dict, done, errors: list) -> Optional[tuple[_Attempt, Any]]:
+        """
+        Record finished attempts and return (attempt, result) of a usable
+        success, if any. Raises the error of a call that failed after
+        streaming tokens to the client.
+        """
+        winner, fatal = None, None
+        for handle in done:
+            attempt = attempts.pop(handle)
+            error = handle.exception()
+            attempt.provider.record(time.perf_counter() - attempt.started, error is None)
+            if error is None and winner is None:
+                # A hedge can't win once the primary has streamed tokens to the client.
+                if attempt.visible or not any(a.visible and a.streamed for a in attempts.values()):
+                    winner = attempt, handle.result()
+            elif error is not None:
+                errors.append(error)
+                if attempt.visible and attempt.streamed:
+                    fatal = error
+        if fatal is not None:
+            raise fatal
+        return winner
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        candidates = self.router.candidates()
+        attempts: dict = {}
+        errors: list = []
+
+        def start(visible: bool):
+            provider = candidates.pop(0)
+            attempt = _Attempt(provider, visible)
+
+            def on_token():
+                attempt.streamed = True
+            runnable_config = self._config(config, attempt, on_token)
+            call = lambda: self._runnable(provider).invoke(input, runnable_config, **kwargs)
+            # Visible calls keep the caller's context (tracing, streaming); hedges start from an empty one.
+            attempts[(self.router.visible_pool if visible else self.router.hedge_pool).submit(call)] = attempt
+            if not visible:
+                provider.hedges += 1
+
+        start(visible=True)
+        try:
+            while attempts:
+                can_hedge = (candidates and len(attempts) == 1 and self.router.hedge_delay > 0
+                             and not any(a.streamed for a in attempts.values()))
+                done, _ = wait(list(attempts), timeout=self.router.hedge_delay if can_hedge else None,
+                               return_when=FIRST_COMPLETED)
+                if not done:
+                    start(visible=False)
+                    continue
+                winner = self._winner(attempts, done, errors)
+                if winner is not None:
+                    winner[0].provider.wins += 1
+                    for attempt in attempts.values():
+                        attempt.provider.lost += 1
+                    return winner[1]
+                if not attempts and candidates:
+                    start(visible=True)
+            raise errors[-1]
+        finally:
+            # Calls already running on a thread can't be interrupted; they finish and are ignored.
+            for handle in attempts:
+                handle.cancel()
+
+    async def ainvoke(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        candidates = self.router.candidates()
+        attempts: dict = {}
+        errors: list = []
+
+        def start(visible: bool):
+            provider = candidates.pop(0)
+            attempt = _Attempt(provider, visible)
+
+            def on_token():
+                attempt.streamed = True
+                # The primary is streaming to the client now; any hedge is wasted.
+                for handle, other in list(attempts.items()):
+                    if not other.visible:
+                        handle.cancel()
+            coro = self._runnable(provider).ainvoke(input, self._config(config, attempt, on_token), **kwargs)
+            task = asyncio.create_task(coro) if visible else asyncio.create_task(coro, context=contextvars.Context())
+            attempts[task] = attempt
+            if not visible:
+                provider.hedges += 1
+
+        start(visible=True)
+        try:
+            while attempts:
+                can_hedge = (candidates and len(attempts) == 1 and self.router.hedge_delay > 0
+                             and not any(a.streamed for a in attempts.values()))
+                done, _ = await asyncio.wait(list(attempts), timeout=self.router.hedge_delay if can_hedge else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    start(visible=False)
+                    continue
+                cancelled = [handle for handle in done if handle.cancelled()]
+                for handle in cancelled:
+                    attempts.pop(handle)
+                winner = self._winner(attempts, [handle for handle in done if not handle.cancelled()], errors)
+                if winner is not None:
+                    winner[0].provider.wins += 1
+                    for attempt in attempts.values():
+                        attempt.provider.lost += 1
+                    return winner[1]
+                if not attempts and candidates:
+                    start(visible=True)
+            raise errors[-1]
+        finally:
+            for handle in attempts:
+                handle.cancel()
+
+
+class RoutedChatModel:
+    """
+    Chat model facade over several providers, tried healthiest first.
+
+    Offers the subset of the chat model API the agent uses (invoke,
+    ainvoke, bind_tools, with_structured_output); each call returns a
+    RoutedRunnable. Providers whose circuit breaker is open are skipped
+    until their cooldown ends, unless every provider is open.
+    """
+
+    def __init__(self, providers: dict[str, Any], hedge_delay: float = 2.0, window: int = 100,
+                 failure_threshold: int = 3, cooldown: float = 30, horizon: float = 300, max_workers: int = 32):
+        self.providers = [
+            ProviderHealth(name, model, window=window, failure_threshold=failure_threshold, cooldown=cooldown,
+                           horizon=horizon)
+            for name, model in providers.items()
+        ]
+        self.hedge_delay = hedge_delay
+        self.visible_pool = ContextThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self.hedge_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+
+    def candidates(self) -> list[ProviderHealth]:
+        """
+        Providers to try, in order. Providers with recent calls are ranked by
+        rolling error rate and then p50 among the positions they hold in the
+        configured order; providers without any keep their position, so a
+        demoted provider returns to it once its errors age out of the
+        horizon. A provider whose breaker cooldown just ended goes first so
+        that its probe call is actually made.
+        """
+        providers = [p for p in self.providers if p.available()] or list(self.providers)
+        stats = {p.name: p.stats() for p in providers}
+
+        def rank(provider: ProviderHealth):
+            p50 = stats[provider.name]["p50_seconds"]
+            return stats[provider.name]["error_rate"], p50 if p50 is not None else float("inf")
+
+        measured = iter(sorted((p for p in providers if stats[p.name]["samples"]), key=rank))
+        ordered = [next(measured) if stats[p.name]["samples"] else p for p in providers]
+        return sorted(ordered, key=lambda p: not p.half_open())
+
+    def bind_tools(self, tools, **kwargs) -> RoutedRunnable:
+        return RoutedRunnable(self, lambda model: model.bind_tools(tools, **kwargs))
+
+    def with_structured_output(self, schema, **kwargs) -> RoutedRunnable:
+        return RoutedRunnable(self, lambda model: model.with_structured_output(schema, **kwargs))
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        return RoutedRunnable(self, lambda model: model).invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        return await RoutedRunnable(self, lambda model: model).ainvoke(input, config, **kwargs)
+
+    def stats(self) -> dict:
+        return {"hedge_delay": self.hedge_delay, "providers": {p.name: p.stats() for p in self.providers}}
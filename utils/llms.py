@@ -1,6 +1,9 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_groq import ChatGroq
 from dotenv import load_dotenv
+from settings import settings
+from utils.fake_llm import FakeChatModel
+from utils.llm_router import RoutedChatModel
 
 load_dotenv()
 
@@ -21,3 +24,27 @@ class LLMModel:
     
     def get_groq_model(self):
         return self.groq_model
+
+    def get_fake_model(self):
+        return FakeChatModel()
+
+    def get_routed_model(self):
+        """Chat model over settings.LLM_PROVIDERS with hedged requests and failover, healthiest provider first."""
+        models = {
+            "gemini_latest": self.get_gemini_model_latest,
+            "gemini": self.get_gemini_model,
+            "groq": self.get_groq_model,
+            "fake": self.get_fake_model,
+        }
+        names = [name.strip() for name in settings.LLM_PROVIDERS.split(",") if name.strip()]
+        unknown = [name for name in names if name not in models]
+        if unknown or not names:
+            raise ValueError(f"Unknown LLM_PROVIDERS: {settings.LLM_PROVIDERS}")
+        return RoutedChatModel(
+            {name: models[name]() for name in names},
+            hedge_delay=settings.LLM_HEDGE_DELAY_SECONDS,
+            window=settings.LLM_STATS_WINDOW,
+            failure_threshold=settings.LLM_FAILURE_THRESHOLD,
+            cooldown=settings.LLM_COOLDOWN_SECONDS,
+            horizon=settings.LLM_STATS_HORIZON_SECONDS,
+        )
@@ -0,0 +1,315 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages.utils import count_tokens_approximately
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def mean(self, **labels) -> float:
+        """Mean of the observations whose labels match the given ones, across all series if none are given."""
+        wanted = [(i, str(labels[n])) for i, n in enumerate(self.labels) if n in labels]
+        total, count = 0.0, 0
+        with self._lock:
+            for key, (_, series_sum, series_count) in self._series.items():
+                if all(key[i] == value for i, value in wanted):
+                    total += series_sum
+                    count += series_count
+        return total / count if count else 0.0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+def _gauges(prefix: str, stats: dict, labels: tuple = (), values: tuple = ()):
+    """Flatten a stats() dict into (name, label names, label values, value); dicts of dicts become a "name" label."""
+    for key, value in stats.items():
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            yield f"{prefix}_{key}", labels, values, value
+        elif isinstance(value, dict) and value and all(isinstance(v, dict) for v in value.values()):
+            for child, child_stats in value.items():
+                yield from _gauges(f"{prefix}_{key}", child_stats, labels + ("name",), values + (child,))
+        elif isinstance(value, dict):
+            yield from _gauges(f"{prefix}_{key}", value, labels, values)
+
+
+class MetricsRegistry:
+    """Counters and histograms rendered in the Prometheus text format, plus gauges read from stats() callbacks."""
+
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: dict[str, Callable[[], dict]] = {}
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = SECONDS_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, prefix: str, stats: Callable[[], dict]):
+        """Export the numeric fields of stats() as gauges named docubot_{prefix}_{field}."""
+        self._collectors[prefix] = stats
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, stats in self._collectors.items():
+            seen = set()
+            for name, labels, values, value in _gauges(f"docubot_{prefix}", stats()):
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name}{_labels(labels, values)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+REQUEST_SECONDS = metrics.histogram("docubot_request_seconds", "Wall time of /execute requests.", ("outcome",))
+NODE_SECONDS = metrics.histogram("docubot_node_seconds", "Wall time of graph nodes.", ("node", "outcome"))
+LLM_SECONDS = metrics.histogram("docubot_llm_seconds", "Wall time of LLM calls.", ("node", "model", "outcome"))
+LLM_INPUT_TOKENS = metrics.histogram("docubot_llm_input_tokens", "Input tokens per LLM call.", ("node", "model"), TOKEN_BUCKETS)
+LLM_OUTPUT_TOKENS = metrics.histogram("docubot_llm_output_tokens", "Output tokens per LLM call.", ("node", "model"), TOKEN_BUCKETS)
+TOOL_SECONDS = metrics.histogram("docubot_tool_seconds", "Wall time of tool calls.", ("tool", "outcome"))
+SMTP_SECONDS = metrics.histogram("docubot_smtp_seconds", "Wall time of confirmation emails.", ("outcome",))
+REQUEST_LLM_CALLS = metrics.histogram("docubot_request_llm_calls", "LLM calls made by completed /execute requests.", (), (0, 1, 2, 3, 4, 6, 8, 12, 16))
+CANCELLED_RUNS = metrics.counter("docubot_cancelled_runs_total", "/execute runs cancelled because the client disconnected.", ("node",))
+CANCELLED_TOKENS_SAVED = metrics.counter("docubot_cancelled_tokens_saved_total", "Estimated LLM tokens not spent because runs were cancelled.")
+BACKGROUND_FAILURES = metrics.counter("docubot_background_failures_total", "Failures of work that falls back instead of failing a request.", ("task",))
+
+
+def _error_outcome(error: BaseException) -> str:
+    return "cancelled" if isinstance(error, asyncio.CancelledError) else "error"
+
+
+class _Run:
+    __slots__ = ("name", "node", "model", "started", "input_tokens")
+
+    def __init__(self, name: str, node: Optional[str], model: Optional[str] = None, input_tokens: int = 0):
+        self.name = name
+        self.node = node
+        self.model = model
+        self.started = time.perf_counter()
+        self.input_tokens = input_tokens
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Records graph nodes, LLM calls and tool calls of one request into the
+    global histograms, and keeps the request's own breakdown for timing().
+    Token counts come from the provider's usage metadata when it reports
+    them and are estimated from the message text otherwise.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._runs: dict[UUID, _Run] = {}
+        self.nodes: dict[str, float] = {}
+        self.tools: dict[str, float] = {}
+        self.llm = {"calls": 0, "seconds": 0.0, "input_tokens": 0, "output_tokens": 0}
+        self.errors = 0
+
+    def _start(self, run_id: UUID, run: _Run):
+        with self._lock:
+            self._runs[run_id] = run
+
+    def _finish(self, run_id: UUID) -> tuple[Optional[_Run], float]:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        return run, (time.perf_counter() - run.started if run else 0.0)
+
+    # Graph nodes
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                       metadata: Optional[dict] = None, **kwargs: Any):
+        node = (metadata or {}).get("langgraph_node")
+        if node is None or kwargs.get("name") != node:
+            return
+        with self._lock:
+            parent = self._runs.get(parent_run_id)
+        # The node's task and the node's own runnable share its name; time only the outer run.
+        if parent is None or parent.name != node:
+            self._start(run_id, _Run(node, node))
+
+    def _end_node(self, run_id: UUID, outcome: str):
+        run, seconds = self._finish(run_id)
+        if run is None:
+            return
+        NODE_SECONDS.observe(seconds, node=run.name, outcome=outcome)
+        with self._lock:
+            self.nodes[run.name] = self.nodes.get(run.name, 0.0) + seconds
+            self.errors += outcome == "error"
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any):
+        self._end_node(run_id, "ok")
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        # Command routing is implemented with exceptions that are not failures.
+        self._end_node(run_id, "ok" if type(error).__name__ == "ParentCommand" else _error_outcome(error))
+
+    # LLM calls
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs: Any):
+        metadata = metadata or {}
+        tokens = sum(count_tokens_approximately(batch) for batch in messages)
+        self._start(run_id, _Run("llm", metadata.get("langgraph_node"), metadata.get("ls_model_name"), tokens))
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        run, seconds = self._finish(run_id)
+        if run is None:
+            return
+        input_tokens, output_tokens = run.input_tokens, 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    input_tokens, output_tokens = usage.get("input_tokens", input_tokens), usage.get("output_tokens", 0)
+                elif message is not None:
+                    output_tokens += count_tokens_approximately([message])
+        labels = {"node": run.node or "", "model": run.model or ""}
+        LLM_SECONDS.observe(seconds, outcome="ok", **labels)
+        LLM_INPUT_TOKENS.observe(input_tokens, **labels)
+        LLM_OUTPUT_TOKENS.observe(output_tokens, **labels)
+        with self._lock:
+            self.llm["calls"] += 1
+            self.llm["seconds"] += seconds
+            self.llm["input_tokens"] += input_tokens
+            self.llm["output_tokens"] += output_tokens
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        run, seconds = self._finish(run_id)
+        if run is None:
+            return
+        outcome = _error_outcome(error)
+        LLM_SECONDS.observe(seconds, node=run.node or "", model=run.model or "", outcome=outcome)
+        with self._lock:
+            self.llm["calls"] += 1
+            self.llm["seconds"] += seconds
+            self.errors += outcome == "error"
+
+    # Tools
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs: Any):
+        name = kwargs.get("name") or (serialized or {}).get("name", "tool")
+        self._start(run_id, _Run(name, (metadata or {}).get("langgraph_node")))
+
+    def _end_tool(self, run_id: UUID, outcome: str):
+        run, seconds = self._finish(run_id)
+        if run is None:
+            return
+        TOOL_SECONDS.observe(seconds, tool=run.name, outcome=outcome)
+        with self._lock:
+            self.tools[run.name] = self.tools.get(run.name, 0.0) + seconds
+            self.errors += outcome == "error"
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs: Any):
+        self._end_tool(run_id, "ok")
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end_tool(run_id, _error_outcome(error))
+
+    def running_nodes(self) -> list[str]:
+        with self._lock:
+            return [run.name for run in self._runs.values() if run.name == run.node]
+
+    def tokens_saved_estimate(self) -> float:
+        """
+        Rough LLM tokens this run would still have spent had it not been
+        cancelled: the output of its unfinished calls, plus the calls a
+        completed request makes on average beyond the ones already started,
+        each at the average size of an LLM call.
+        """
+        with self._lock:
+            in_flight = sum(1 for run in self._runs.values() if run.name == "llm")
+            started = self.llm["calls"] + in_flight
+        output = LLM_OUTPUT_TOKENS.mean()
+        remaining = max(REQUEST_LLM_CALLS.mean() - started, 0)
+        return in_flight * output + remaining * (LLM_INPUT_TOKENS.mean() + output)
+
+    def timing(self) -> dict:
+        """This request's latency breakdown; node times include the LLM and tool calls they make."""
+        with self._lock:
+            return {
+                "total_seconds": round(time.perf_counter() - self.started, 4),
+                "nodes": {name: round(seconds, 4) for name, seconds in self.nodes.items()},
+                "llm": {**self.llm, "seconds": round(self.llm["seconds"], 4)},
+                "tools": {name: round(seconds, 4) for name, seconds in self.tools.items()},
+                "errors": self.errors,
+            }
@@ -1,7 +1,9 @@
 import smtplib
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from settings import settings
+from utils.metrics import SMTP_SECONDS
 
 SMTP_SERVER = settings.SMTP_SERVER
 SMTP_PORT = settings.SMTP_PORT
@@ -16,11 +18,14 @@ def send_email(to_email: str, subject: str, body: str):
 
     msg.attach(MIMEText(body, 'plain'))
 
+    started = time.perf_counter()
     try:
         with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
             server.starttls()
             server.login(SMTP_USER, SMTP_PASSWORD)
             server.send_message(msg)
+        SMTP_SECONDS.observe(time.perf_counter() - started, outcome="ok")
         print(f"Email sent to {to_email}")
     except Exception as e:
+        SMTP_SECONDS.observe(time.perf_counter() - started, outcome="error")
         print(f"Failed to send email to {to_email}: {e}")
\ No newline at end of file
@@ -0,0 +1,251 @@
+import re
+import threading
+from typing import NamedTuple, Optional, get_args
+from core.config import DoctorName, Specialization
+from prompt_library.prompts import canned_replies
+
+def _normalize(query: str) -> str:
+    text = query.lower().replace("_", " ")
+    text = re.sub(r"[^\w\s:'-]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+_FILLER = r"(?:\s+(?:there|docubot|bot|again|so much|a lot|very much|everyone|all))*"
+
+# (intent, pattern matched against the whole normalized message)
+SMALL_TALK_RULES = [
+    ("greeting", rf"(?:hi+|hello+|hey+|hiya|howdy|greetings|good (?:morning|afternoon|evening)){_FILLER}"),
+    ("how_are_you", rf"(?:(?:hi|hello|hey)\s+)?how are you(?: doing)?(?: today)?{_FILLER}"),
+    ("identity", r"(?:who|what) are you|what(?:'s| is) your name|are you (?:a )?(?:bot|robot|human|ai)"),
+    ("capabilities", r"(?:what can you do|how can you help(?: me)?|help|what do you do)"),
+    ("thanks", rf"(?:ok(?:ay)?\s+)?(?:thanks?(?: you)?|thank u|thx|ty|cheers|great thanks?){_FILLER}"),
+    ("goodbye", rf"(?:bye+|goodbye|good bye|see you(?: later)?|take care|that'?s all){_FILLER}"),
+]
+
+_INTENT = re.compile(
+    r"\b(?:book(?:ing)?|appointments?|cancel(?:l?ation|l?ed)?|reschedul\w*|availab\w*|slots?|schedule|"
+    r"free|open|next|earliest|soonest|visit|consult\w*)\b"
+)
+_ENTITY = re.compile(
+    r"\b(?:doctors?|dr|dentists?|specialists?|surgeons?|clinic|tomorrow|today|monday|tuesday|wednesday|thursday|"
+    r"friday|saturday|sunday|week|morning|afternoon|evening)\b"
+    r"|\d{1,2}-\d{1,2}-\d{4}|\d{1,2}:\d{2}|"
+    + "|".join(re.escape(_normalize(name)) for name in get_args(DoctorName))
+    + "|"
+    + "|".join(re.escape(_normalize(spec)) for spec in get_args(Specialization))
+)
+
+# Intents the supervisor can act on; the other _INTENT words ("free", "open", "next", ...) also turn up in
+# questions about something else that merely mention a doctor.
+_ACTION = re.compile(r"\b(?:book(?:ing)?|appointments?|cancel(?:l?ation|l?ed)?|reschedul\w*|availab\w*|slots?)\b")
+# Topics outside booking and availability, left to the LLM classifier even when a doctor is named.
+_OFF_DOMAIN = re.compile(
+    r"\b(?:park\w*|fees?|costs?|price\w*|pay\w*|charges?|insurance|refunds?|address|directions?|located|location|"
+    r"hours|wifi|toilets?|restrooms?|bathrooms?|cafeteria|food|eat|bring|wear)\b"
+)
+
+_BOOKING = re.compile(r"\b(?:book(?:ing)?|cancel\w*|reschedul\w*|postpone|move|change)\b")
+
+# Keyed the way messages are normalized, so "Md. Saifur Rahman" matches as "md saifur rahman".
+_DOCTORS = {_normalize(name): name for name in get_args(DoctorName)}
+_SPECIALIZATIONS = {_normalize(spec): spec for spec in get_args(Specialization)}
+
+
+def _alternation(words) -> str:
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+_DOCTOR = re.compile(rf"\b(?:{_alternation(_DOCTORS)})\b")
+_SPECIALIZATION = re.compile(rf"\b(?:{_alternation(_SPECIALIZATIONS)})s?\b")
+_DATETIME = re.compile(r"\b(\d{2}-\d{2}-\d{4})(?:\s+(?:at\s+)?(\d{1,2}:\d{2}))?\b")
+_TIME = re.compile(r"\b\d{1,2}:\d{2}\b")
+_NEGATION = re.compile(r"\b(?:not|no|never|dont|don't|cant|can't|won't|without)\b|n't\b")
+# Alternatives, relative dates and time-of-day constraints the tool arguments cannot express.
+_QUALIFIER = re.compile(
+    r"\b(?:or|either|else|other|another|instead|except|also|tomorrow|today|tonight|day after|next|last|week\w*|"
+    r"month|morning|afternoon|evening|night|noon|before|after|between|until|till|earliest|soonest|latest)\b"
+)
+# Questions and conditionals about a booking change ("can I book ...?", "how do I cancel ...") are not
+# instructions to make it; only availability lookups may be phrased as questions.
+_QUESTION = re.compile(
+    r"^(?:can|could|would|should|shall|may|might|will|do|does|did|is|are|am|how|what|when|where|why|which|who)\b"
+    r"|\b(?:can|could|should|may|might|shall) (?:i|we)\b|\bhow (?:do|can|would|should|to)\b|\b(?:if|whether)\b"
+)
+_DIRECT_INTENTS = [
+    ("reschedule", re.compile(r"\b(?:reschedul\w*|postpone|move|change|shift)\b")),
+    ("cancel", re.compile(r"\bcancel\w*\b")),
+    ("book", re.compile(r"\bbook(?:ing)?\b")),
+]
+_AVAILABILITY = re.compile(r"\b(?:slots?|availab\w*|free|open|timings?)\b")
+
+
+class PrefilterResult(NamedTuple):
+    route: Optional[str]  # "end", "supervisor" or None when the LLM classifier should decide
+    confidence: float
+    intent: str
+    answer: Optional[str] = None
+
+
+class DirectCall(NamedTuple):
+    intent: str  # "availability", "book", "cancel" or "reschedule"
+    tool: str
+    args: dict
+
+
+def predict_worker(query: str) -> str:
+    """Best guess at the worker node for a query, used to start it speculatively."""
+    return "booking_node" if _BOOKING.search(_normalize(query)) else "information_node"
+
+
+def _datetime(date: str, time: str) -> dict:
+    hour, minute = time.split(":")
+    return {"datetime": f"{date} {int(hour):02d}:{minute}"}
+
+
+def parse_direct_call(query: str) -> Optional[DirectCall]:
+    """
+    The tool call for a message that names every argument of one tool, e.g.
+    "slots for Dr. Farhan Ali on 06-12-2025" or "book Isha Roy 06-12-2025 10:30".
+    Returns None whenever the message could mean anything else, so the agent
+    handles it: negations, alternatives or relative dates, several intents,
+    doctors or dates, missing arguments, other topics, or a booking change
+    asked about as a question rather than requested.
+    """
+    text = _normalize(query)
+    if not text or _NEGATION.search(text) or _QUALIFIER.search(text) or _OFF_DOMAIN.search(text):
+        return None
+    intents = [intent for intent, pattern in _DIRECT_INTENTS if pattern.search(text)]
+    if len(intents) > 1 or not (intents or _AVAILABILITY.search(text)):
+        return None
+    intent = intents[0] if intents else "availability"
+    if intent != "availability" and ("?" in query or _QUESTION.search(text)):
+        return None
+
+    doctors = {_DOCTORS[m] for m in _DOCTOR.findall(text)}
+    specializations = {_SPECIALIZATIONS[m if m in _SPECIALIZATIONS else m[:-1]] for m in _SPECIALIZATION.findall(text)}
+    moments = list(_DATETIME.finditer(text))
+    # Every time must belong to a date, otherwise "06-12-2025 after 10:30" would drop a constraint.
+    if len(_TIME.findall(text)) != sum(1 for m in moments if m[2]):
+        return None
+
+    if intent == "availability":
+        if len(moments) != 1 or moments[0][2]:
+            return None
+        desired_date = {"date": moments[0][1]}
+        if len(doctors) == 1:
+            return DirectCall(intent, "check_availability_by_doctor",
+                              {"doctor_name": doctors.pop(), "desired_date": desired_date})
+        if not doctors and len(specializations) == 1:
+            return DirectCall(intent, "check_availability_by_specialization",
+                              {"specialization": specializations.pop(), "desired_date": desired_date})
+        return None
+
+    if len(doctors) != 1 or not all(m[2] for m in moments):
+        return None
+    doctor = doctors.pop()
+    if intent in ("book", "cancel"):
+        if len(moments) != 1:
+            return None
+        return DirectCall(intent, f"{intent}_appointment",
+                          {"doctor_name": doctor, "appointment_datetime": _datetime(moments[0][1], moments[0][2])})
+
+    # Reschedule needs both ends marked, "from <old> to <new>" in either order.
+    ends = {}
+    for m in moments:
+        marker = (text[:m.start()].split() or [""])[-1]
+        end = {"from": "old", "on": "old", "to": "new"}.get(marker)
+        if end is None or end in ends:
+            return None
+        ends[end] = m
+    if len(ends) != 2:
+        return None
+    return DirectCall(intent, "reschedule_appointment", {
+        "doctor_name": doctor,
+        "old_appointment_datetime": _datetime(ends["old"][1], ends["old"][2]),
+        "new_appointment_datetime": _datetime(ends["new"][1], ends["new"][2]),
+    })
+
+
+class QueryPrefilter:
+    """
+    Rule-based classifier that runs before the LLM query classifier.
+
+    Messages that are entirely small talk get a canned reply, and messages
+    with a booking, cancellation or availability intent plus a doctor,
+    specialization or date go straight to the supervisor. Vaguer intents and
+    questions about other topics (parking, fees, directions) stay below the
+    threshold even when they name a doctor. Anything scored below it is
+    left to the LLM classifier. Counters are kept so the hit rate can be
+    monitored while tuning the threshold.
+
+    Fully specified availability and booking requests are turned into a
+    tool call by direct() instead, so they skip the LLM altogether.
+    """
+
+    def __init__(self, threshold: float = 0.8):
+        self.threshold = threshold
+        self._rules = [(intent, re.compile(pattern)) for intent, pattern in SMALL_TALK_RULES]
+        self._lock = threading.Lock()
+        self.total = 0
+        self.counts = {"direct": 0, "end": 0, "supervisor": 0, "fallback": 0}
+        self.intents: dict[str, int] = {}
+
+    def score(self, query: str) -> PrefilterResult:
+        text = _normalize(query)
+        if not text:
+            return PrefilterResult(None, 0.0, "empty")
+
+        action_hits = len(_ACTION.findall(text))
+        intent_hits = len(_INTENT.findall(text))
+        entity_hits = len(_ENTITY.findall(text))
+        if (intent_hits or entity_hits) and _OFF_DOMAIN.search(text):
+            return PrefilterResult("supervisor", 0.5, "domain")
+        if action_hits and entity_hits:
+            return PrefilterResult("supervisor", 0.95, "domain")
+        if intent_hits and entity_hits:
+            return PrefilterResult("supervisor", 0.7, "domain")
+        if action_hits:
+            return PrefilterResult("supervisor", min(0.6 + 0.1 * action_hits, 0.85), "domain")
+        if intent_hits:
+            return PrefilterResult("supervisor", 0.6, "domain")
+
+        for intent, pattern in self._rules:
+            if pattern.fullmatch(text):
+                return PrefilterResult("end", 1.0, intent, canned_replies[intent])
+        if entity_hits:
+            return PrefilterResult("supervisor", 0.5, "domain")
+        return PrefilterResult(None, 0.0, "unknown")
+
+    def classify(self, query: str) -> PrefilterResult:
+        """Score the query and record the decision; route is None unless confidence meets the threshold."""
+        result = self.score(query)
+        if result.route is not None and result.confidence < self.threshold:
+            result = result._replace(route=None)
+        with self._lock:
+            self.total += 1
+            self.counts[result.route or "fallback"] += 1
+            if result.route is not None:
+                self.intents[result.intent] = self.intents.get(result.intent, 0) + 1
+        return result
+
+    def direct(self, query: str) -> Optional[DirectCall]:
+        """The tool call to run without the LLM; None leaves the query to classify()."""
+        return parse_direct_call(query)
+
+    def record_direct(self, call: DirectCall):
+        """Count a direct call whose tool succeeded; failed ones go through classify() and are counted there."""
+        with self._lock:
+            self.total += 1
+            self.counts["direct"] += 1
+            self.intents[f"direct_{call.intent}"] = self.intents.get(f"direct_{call.intent}", 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            handled = self.counts["direct"] + self.counts["end"] + self.counts["supervisor"]
+            return {
+                "threshold": self.threshold,
+                "total": self.total,
+                **self.counts,
+                "intents": dict(self.intents),
+                "hit_rate": handled / self.total if self.total else 0.0,
+            }
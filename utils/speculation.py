@@ -0,0 +1,139 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+from langchain_core.runnables import RunnableConfig
+from utils.metrics import MetricsCallbackHandler
+
+
+def speculative_config(config: Optional[RunnableConfig]) -> RunnableConfig:
+    """
+    Config for the speculative calls a node starts: the request's metrics
+    handlers and the node's metadata, but none of its other callbacks, so
+    the calls are counted against the request without being streamed.
+    """
+    config = config or {}
+    callbacks = config.get("callbacks")
+    handlers = callbacks if isinstance(callbacks, list) else getattr(callbacks, "handlers", None) or []
+    return {
+        "callbacks": [h for h in handlers if isinstance(h, MetricsCallbackHandler)],
+        "metadata": dict(config.get("metadata") or {}),
+    }
+
+
+class SpeculativeExecutor:
+    """
+    Thread pool for LLM calls that are started before it is known whether
+    their result will be used.
+
+    submit() starts a call; discard() gives up on one, cancelling it if it
+    has not started yet and otherwise letting it finish in the background
+    while its run time is counted as wasted. Calls are run without the
+    caller's callback context, so tokens of speculative branches are never
+    streamed to the client; pass them speculative_config() so the request's
+    metrics still count them.
+
+    spawn() and aaccept() are the event-loop counterparts: the call runs as
+    an asyncio task, and discarding it cancels the request in flight.
+    """
+
+    def __init__(self, max_workers: int = 8):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculation")
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.accepted = 0
+        self.discarded = 0
+        self.cancelled = 0
+        self.wasted_seconds = 0.0
+        self.worker_hits = 0
+        self.worker_misses = 0
+
+    def submit(self, fn, *args) -> Future:
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                future.elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.submitted += 1
+        future = self._pool.submit(timed)
+        future.elapsed = 0.0
+        return future
+
+    def spawn(self, coro) -> asyncio.Task:
+        async def timed():
+            started = time.perf_counter()
+            try:
+                return await coro
+            finally:
+                task.elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.submitted += 1
+        task = asyncio.create_task(timed(), context=contextvars.Context())
+        task.elapsed = 0.0
+        return task
+
+    def accept(self, future: Future):
+        result = future.result()
+        with self._lock:
+            self.accepted += 1
+        return result
+
+    async def aaccept(self, task: asyncio.Task):
+        result = await task
+        with self._lock:
+            self.accepted += 1
+        return result
+
+    def discard(self, future):
+        if future is None:
+            return
+        if isinstance(future, asyncio.Task):
+            if future.done():
+                self._wasted(future)
+            elif future.cancel():
+                with self._lock:
+                    self.cancelled += 1
+                future.add_done_callback(lambda task: self._add_wasted_seconds(task.elapsed))
+            return
+        if future.cancel():
+            with self._lock:
+                self.cancelled += 1
+            return
+
+        future.add_done_callback(self._wasted)
+
+    def _wasted(self, done):
+        with self._lock:
+            self.discarded += 1
+            self.wasted_seconds += done.elapsed
+
+    def _add_wasted_seconds(self, seconds: float):
+        with self._lock:
+            self.wasted_seconds += seconds
+
+    def record_worker(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.worker_hits += 1
+            else:
+                self.worker_misses += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            predictions = self.worker_hits + self.worker_misses
+            return {
+                "submitted": self.submitted,
+                "accepted": self.accepted,
+                "discarded": self.discarded,
+                "cancelled": self.cancelled,
+                "wasted_seconds": round(self.wasted_seconds, 3),
+                "worker_hits": self.worker_hits,
+                "worker_misses": self.worker_misses,
+                "worker_hit_rate": self.worker_hits / predictions if predictions else 0.0,
+            }
@@ -0,0 +1,120 @@
+import asyncio
+from typing import AsyncIterator, Callable, Optional
+import orjson
+from fastapi.responses import StreamingResponse
+
+SSE_HEARTBEAT = b": heartbeat\n\n"
+
+
+def encode(event: dict) -> bytes:
+    return orjson.dumps(event)
+
+
+async def coalesce(events: AsyncIterator[dict], window: float, max_chars: int,
+                   heartbeat: float = 0) -> AsyncIterator[Optional[dict]]:
+    """
+    Merge consecutive text events into one frame. A frame is flushed window
+    seconds after its first chunk, once it holds max_chars characters, or as
+    soon as any other event arrives, so tool and error events keep their
+    order. window 0 passes text through unmerged. With heartbeat > 0, None is
+    yielded whenever the stream has been idle that long.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for event in events:
+                queue.put_nowait(event)
+        except Exception as e:
+            queue.put_nowait(e)
+        finally:
+            queue.put_nowait(done)
+
+    loop = asyncio.get_running_loop()
+    task = asyncio.create_task(pump())
+    buffer: list[str] = []
+    size, deadline = 0, 0.0
+    try:
+        while True:
+            timeout = max(deadline - loop.time(), 0) if buffer else (heartbeat or None)
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                if buffer:
+                    yield {"type": "text", "content": "".join(buffer)}
+                    buffer, size = [], 0
+                else:
+                    yield None
+                continue
+            if item is done:
+                break
+            if isinstance(item, dict) and item.get("type") == "text" and window > 0:
+                if not buffer:
+                    deadline = loop.time() + window
+                buffer.append(item["content"])
+                size += len(item["content"])
+                if size >= max_chars:
+                    yield {"type": "text", "content": "".join(buffer)}
+                    buffer, size = [], 0
+                continue
+            if buffer:
+                yield {"type": "text", "content": "".join(buffer)}
+                buffer, size = [], 0
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        if buffer:
+            yield {"type": "text", "content": "".join(buffer)}
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+async def ndjson_stream(events: AsyncIterator[Optional[dict]]) -> AsyncIterator[bytes]:
+    try:
+        async for event in events:
+            if event is not None:
+                yield encode(event) + b"\n"
+    finally:
+        await events.aclose()
+
+
+async def sse_stream(events: AsyncIterator[Optional[dict]]) -> AsyncIterator[bytes]:
+    """Server-sent events with sequential ids, the event type as the SSE event name and None as a heartbeat comment."""
+    event_id = 0
+    try:
+        async for event in events:
+            if event is None:
+                yield SSE_HEARTBEAT
+                continue
+            event_id += 1
+            yield b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, event["type"].encode(), encode(event))
+    finally:
+        await events.aclose()
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that closes its body iterator however the response
+    ends, so a client that disconnects mid-stream stops the producer right
+    away instead of whenever the generator is garbage collected. on_close
+    runs after that, once the producer has stopped.
+    """
+
+    def __init__(self, content, *args, on_close: Optional[Callable[[], None]] = None, **kwargs):
+        super().__init__(content, *args, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self.body_iterator.aclose()
+            finally:
+                if self.on_close is not None:
+                    self.on_close()